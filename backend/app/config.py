@@ -2,8 +2,8 @@ import os
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
 import firebase_admin
-from firebase_admin import credentials, firestore, auth
-from google.cloud.firestore import Client
+from firebase_admin import credentials, firestore, firestore_async, auth
+from google.cloud.firestore import Client, AsyncClient
 from typing import Optional
 
 load_dotenv()
@@ -22,6 +22,69 @@ class Settings(BaseSettings):
     STRIPE_SECRET_KEY: Optional[str] = None
     STRIPE_WEBHOOK_SECRET: Optional[str] = None
 
+    # Feed Settings
+    # Keep the 'Available' posts in memory via a Firestore snapshot listener
+    FEED_CACHE_ENABLED: bool = False
+    # How often expired posts are flipped to 'Expired' in the background (0 disables)
+    EXPIRY_SWEEP_INTERVAL_SECONDS: int = 60
+    # Reservations not collected within this long are released back to the feed by the sweeper (0 disables)
+    RESERVATION_HOLD_SECONDS: int = 14400
+    # Receivers that can queue for a reserved post with ?waitlist=true (0 disables the waitlist)
+    WAITLIST_MAX_SIZE: int = 200
+
+    # Notification Settings
+    # Verified receivers within this distance of a new post get a push (0 disables)
+    NEW_POST_NOTIFY_RADIUS_KM: float = 10.0
+    # Multicast requests sent to FCM in parallel
+    NEW_POST_NOTIFY_WORKERS: int = 4
+
+    # Notification Outbox Settings
+    # SQLite file holding push notifications until they are delivered (empty to keep it in memory only)
+    NOTIFICATION_OUTBOX_PATH: Optional[str] = "notification_outbox.sqlite3"
+    NOTIFICATION_DISPATCH_INTERVAL_SECONDS: float = 1.0  # How often an idle dispatcher polls the outbox
+    NOTIFICATION_BATCH_SIZE: int = 100  # Messages per FCM send_each request (max 500)
+    NOTIFICATION_RATE_PER_SECOND: float = 50.0  # Cap shared by all API workers using the same outbox file (so per host); 0 for no cap
+    NOTIFICATION_MAX_ATTEMPTS: int = 8  # Transient failures before a message is marked 'failed'
+    NOTIFICATION_RETRY_BASE_SECONDS: float = 5.0  # Doubled after each failed attempt
+    NOTIFICATION_RETRY_MAX_SECONDS: float = 900.0
+
+    # Idempotency-Key Settings
+    # How long a stored response is replayed for retries with the same key (0 disables)
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    # How long a request holds its key before a retry may assume it died and run again
+    IDEMPOTENCY_LOCK_SECONDS: int = 60
+
+    # Geocoding Settings
+    GOOGLE_MAPS_GEOCODE_URL: str = "https://maps.googleapis.com/maps/api/geocode/json"
+    GEOCODE_CONNECT_TIMEOUT_SECONDS: float = 3.0
+    GEOCODE_READ_TIMEOUT_SECONDS: float = 5.0
+    GEOCODE_MAX_CONNECTIONS: int = 20  # Keep-alive pool size
+    GEOCODE_MAX_RETRIES: int = 3  # Retries of timeouts, 5xx and OVER_QUERY_LIMIT
+    GEOCODE_BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive failed lookups before failing fast
+    GEOCODE_BREAKER_RESET_SECONDS: float = 30.0  # How long to fail fast before trying again
+    # Create posts in the 'Geocoding' state and resolve addresses in the background
+    GEOCODING_DEFERRED: bool = False
+    GEOCODING_WORKERS: int = 4
+    GEOCODING_MAX_ATTEMPTS: int = 5  # Lookups while the API is unavailable before giving up
+    GEOCODING_RETRY_DELAY_SECONDS: float = 30.0  # Multiplied by the attempt number
+    # SQLite file backing the geocode cache (empty to keep it in memory only)
+    GEOCODE_CACHE_PATH: Optional[str] = "geocode_cache.sqlite3"
+    GEOCODE_CACHE_MAX_ENTRIES: int = 10000  # In-memory LRU size
+    GEOCODE_CACHE_TTL_SECONDS: int = 30 * 24 * 3600  # Addresses rarely move
+    GEOCODE_CACHE_NEGATIVE_TTL_SECONDS: int = 6 * 3600  # Addresses Google could not find
+
+    # Auth Settings
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000  # Verified ID tokens kept in memory (0 disables the cache)
+    # Also reject ID tokens revoked (or of disabled users) since they were issued; costs an Auth lookup per verification
+    AUTH_CHECK_REVOKED: bool = False
+    AUTH_REVOCATION_CHECK_SECONDS: int = 300  # With AUTH_CHECK_REVOKED, how long a cached token is trusted
+
+    # User Profile Cache
+    USER_CACHE_TTL_SECONDS: int = 60  # How long a profile is served from memory (0 disables the cache)
+    USER_CACHE_MAX_ENTRIES: int = 10000
+    # Invalidate cached profiles from a Firestore listener on 'users' (for multi-worker deployments)
+    USER_CACHE_LISTENER_ENABLED: bool = False
+
     # Configuration to handle .env file loading and ignore extra variables
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -31,38 +94,62 @@ class Settings(BaseSettings):
     )
 
 settings = Settings()
-db: Optional[Client] = None
+db: Optional[Client] = None  # Sync client for snapshot listeners and scripts
+async_db: Optional[AsyncClient] = None  # Used by request handlers
+_firebase_init_attempted = False
 
 # --- Firebase Initialization Logic ---
-try:
-    # We check the updated variable name here
-    key_path = settings.FIREBASE_SERVICE_ACCOUNT_KEY
-    
-    if key_path:
-        # Check if the file actually exists before trying to load it
-        if os.path.exists(key_path):
-            cred = credentials.Certificate(key_path)
-            try:
-                firebase_admin.get_app()
-            except ValueError:
-                firebase_admin.initialize_app(cred)
-            
-            db = firestore.client()
-            print("Firebase Admin SDK initialized successfully.")
+def init_firebase() -> bool:
+    """
+    Initializes the Firebase Admin SDK and the Firestore clients once.
+    Called by the app container at startup (and lazily by get_db() and
+    get_async_db() for scripts). Returns True if the clients are available.
+    """
+    global db, async_db, _firebase_init_attempted
+    if _firebase_init_attempted:
+        return db is not None
+    _firebase_init_attempted = True
+
+    try:
+        # We check the updated variable name here
+        key_path = settings.FIREBASE_SERVICE_ACCOUNT_KEY
+
+        if key_path:
+            # Check if the file actually exists before trying to load it
+            if os.path.exists(key_path):
+                cred = credentials.Certificate(key_path)
+                try:
+                    firebase_admin.get_app()
+                except ValueError:
+                    firebase_admin.initialize_app(cred)
+
+                db = firestore.client()
+                async_db = firestore_async.client()
+                print("Firebase Admin SDK initialized successfully.")
+            else:
+                print(f"Error: Firebase key file not found at path: {key_path}")
+                db = None
         else:
-            print(f"Error: Firebase key file not found at path: {key_path}")
-            db = None
-    else:
-        print("Warning: FIREBASE_SERVICE_ACCOUNT_KEY is not set in .env. Firebase Admin SDK not initialized.")
+            print("Warning: FIREBASE_SERVICE_ACCOUNT_KEY is not set in .env. Firebase Admin SDK not initialized.")
+
+    except Exception as e:
+        print(f"An unexpected error occurred during Firebase initialization: {e}")
+        db = None
+        async_db = None
 
-except Exception as e:
-    print(f"An unexpected error occurred during Firebase initialization: {e}")
-    db = None
+    return db is not None
 
 def get_db() -> Client:
+    init_firebase()
     if db is None:
         raise RuntimeError("Firestore database client is not initialized.")
     return db
 
+def get_async_db() -> AsyncClient:
+    init_firebase()
+    if async_db is None:
+        raise RuntimeError("Firestore async database client is not initialized.")
+    return async_db
+
 def get_auth():
     return auth
\ No newline at end of file
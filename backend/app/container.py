@@ -0,0 +1,204 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from google.cloud.firestore import AsyncClient, Client
+
+from app.config import settings, init_firebase, get_db, get_async_db
+from app.services.feed_cache import FeedCache
+from app.services.post_events import PostEventBroker
+from app.services.expiry_sweeper import ExpirySweeper
+from app.services.firebase_service import FirebaseService
+from app.services.google_maps import GoogleMapsService, get_http_client, close_http_client
+from app.services.geocoding_worker import GeocodingWorker
+from app.services.idempotency import IdempotencyStore
+from app.services.notification_outbox import NotificationDispatcher, NotificationOutbox
+from app.services.post_notifier import NewPostNotifier
+from app.services.push_tokens import PushTokenPruner
+from app.services.token_cache import TokenCache
+from app.services.user_cache import UserCache
+
+# Startup gives up on the Firestore warm-up call after this long
+WARM_UP_TIMEOUT_SECONDS = 10.0
+
+# A failed warm-up is retried by readiness probes at most this often
+WARM_UP_RETRY_SECONDS = 30.0
+
+
+class ServiceContainer:
+    """
+    Owns the app's long-lived clients, caches and background components
+    for the lifetime of the process. Built once by the FastAPI lifespan and
+    stored on app.state; the request dependencies in app/dependencies.py
+    hand out these instances, and each component is given the others it
+    uses, so there is exactly one of each per process.
+
+    start() initializes Firebase, builds the components, opens the
+    Firestore channel and the geocoding connection pool ahead of the first
+    request, and starts the enabled background components; stop() shuts
+    them down in reverse order.
+    """
+
+    def __init__(self):
+        self.db: Optional[Client] = None
+        self.async_db: Optional[AsyncClient] = None
+        self.firebase_service: Optional[FirebaseService] = None
+        self.maps_service: Optional[GoogleMapsService] = None
+        self.token_cache: Optional[TokenCache] = None
+        self.user_cache: Optional[UserCache] = None
+        self.push_token_pruner: Optional[PushTokenPruner] = None
+        self.feed_cache: Optional[FeedCache] = None
+        self.post_events: Optional[PostEventBroker] = None
+        self.post_notifier: Optional[NewPostNotifier] = None
+        self.geocoding_worker: Optional[GeocodingWorker] = None
+        self.notification_outbox: Optional[NotificationOutbox] = None
+        self.notification_dispatcher: Optional[NotificationDispatcher] = None
+        self.expiry_sweeper: Optional[ExpirySweeper] = None
+        self.idempotency_store: Optional[IdempotencyStore] = None
+        self.started_at: Optional[float] = None
+        self._firestore_ok = False
+        self._firestore_error: Optional[str] = None
+        self._last_warm_up: Optional[float] = None
+        self._warm_up_seconds: Optional[float] = None
+
+    async def start(self) -> None:
+        started = time.monotonic()
+        self._build_components()
+
+        # Loads the service-account key; keep the file I/O off the event loop
+        if await asyncio.to_thread(init_firebase):
+            self.db = get_db()
+            self.async_db = get_async_db()
+            self.firebase_service = FirebaseService(
+                self.async_db, self.maps_service, self.user_cache, self.push_token_pruner
+            )
+            await self._warm_up()
+
+        get_http_client()  # Geocoding connection pool
+        self._start_background_components()
+        self.started_at = time.monotonic()
+        print(f"Service container started in {self.started_at - started:.2f}s.")
+
+    def _build_components(self) -> None:
+        """Builds the shared components from settings. Firestore is reached through get_async_db when used."""
+        self.maps_service = GoogleMapsService.from_settings()
+        self.token_cache = TokenCache(
+            max_entries=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+            revocation_ttl_seconds=settings.AUTH_REVOCATION_CHECK_SECONDS if settings.AUTH_CHECK_REVOKED else None,
+        )
+        self.user_cache = UserCache(
+            ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+            max_entries=settings.USER_CACHE_MAX_ENTRIES,
+        )
+        self.push_token_pruner = PushTokenPruner(get_async_db, self.user_cache)
+        self.feed_cache = FeedCache()
+        self.post_events = PostEventBroker(self.maps_service)
+        self.post_notifier = NewPostNotifier(
+            get_async_db, settings.NEW_POST_NOTIFY_RADIUS_KM, self.maps_service, self.push_token_pruner
+        )
+        self.geocoding_worker = GeocodingWorker(get_async_db, self.maps_service, self.post_notifier)
+        self.notification_outbox = NotificationOutbox(settings.NOTIFICATION_OUTBOX_PATH)
+        self.notification_dispatcher = NotificationDispatcher(
+            self.notification_outbox, get_async_db, self.push_token_pruner
+        )
+        self.expiry_sweeper = ExpirySweeper(get_async_db, self.notification_outbox)
+        self.idempotency_store = IdempotencyStore(
+            get_async_db,
+            ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+            lock_seconds=settings.IDEMPOTENCY_LOCK_SECONDS,
+        )
+
+    async def _warm_up(self) -> None:
+        """One cheap Firestore call, so the gRPC channel and OAuth token exist before the first request."""
+        self._last_warm_up = time.monotonic()
+        try:
+            await asyncio.wait_for(
+                self.async_db.collection('foodPosts').limit(1).get(),
+                timeout=WARM_UP_TIMEOUT_SECONDS,
+            )
+            self._firestore_ok = True
+            self._firestore_error = None
+            self._warm_up_seconds = time.monotonic() - self._last_warm_up
+        except Exception as e:
+            self._firestore_ok = False
+            self._firestore_error = str(e) or type(e).__name__
+            print(f"Error warming up Firestore: {self._firestore_error}")
+
+    def _start_background_components(self) -> None:
+        if self.db is not None and settings.FEED_CACHE_ENABLED:
+            try:
+                # Live post streams share the feed cache's listener
+                self.post_events.start(asyncio.get_running_loop())
+                self.feed_cache.add_change_listener(self.post_events.on_feed_change)
+                self.feed_cache.start(FeedCache.available_posts_query(self.db))
+                print("Feed cache listener started.")
+            except Exception as e:
+                # The feed falls back to direct Firestore queries
+                print(f"Error starting feed cache: {e}")
+
+        if self.db is not None and settings.USER_CACHE_LISTENER_ENABLED and self.user_cache.enabled:
+            try:
+                self.user_cache.start_listener(self.db.collection('users'))
+                print("User cache listener started.")
+            except Exception as e:
+                # Cached profiles still expire after USER_CACHE_TTL_SECONDS
+                print(f"Error starting user cache listener: {e}")
+
+        if self.async_db is not None and settings.EXPIRY_SWEEP_INTERVAL_SECONDS > 0:
+            self.expiry_sweeper.start(settings.EXPIRY_SWEEP_INTERVAL_SECONDS)
+            print(f"Expiry sweeper started (every {settings.EXPIRY_SWEEP_INTERVAL_SECONDS}s).")
+
+        if self.async_db is not None and settings.GEOCODING_DEFERRED:
+            self.geocoding_worker.start(settings.GEOCODING_WORKERS)
+            print(f"Geocoding worker started ({settings.GEOCODING_WORKERS} workers).")
+
+        if self.async_db is not None:
+            self.notification_dispatcher.start(settings.NOTIFICATION_DISPATCH_INTERVAL_SECONDS)
+            print("Notification dispatcher started.")
+
+        if self.async_db is not None and self.post_notifier.enabled:
+            self.post_notifier.start(settings.NEW_POST_NOTIFY_WORKERS)
+            print(f"New post notifier started ({settings.NEW_POST_NOTIFY_RADIUS_KM} km, "
+                  f"{settings.NEW_POST_NOTIFY_WORKERS} workers).")
+
+    async def stop(self) -> None:
+        await self.geocoding_worker.stop()
+        await self.post_notifier.stop()
+        await self.notification_dispatcher.stop()
+        await self.expiry_sweeper.stop()
+        self.post_events.stop()
+        self.feed_cache.stop()
+        self.user_cache.stop_listener()
+        await close_http_client()
+        if self.async_db is not None:
+            self.async_db.close()
+        self.started_at = None
+        print("Service container stopped.")
+
+    # --- Health ---
+
+    def liveness(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "uptime_seconds": time.monotonic() - self.started_at if self.started_at else None,
+        }
+
+    async def readiness(self) -> Dict[str, Any]:
+        """Ready once started with a working Firestore connection."""
+        if (self.async_db is not None and not self._firestore_ok
+                and time.monotonic() - self._last_warm_up >= WARM_UP_RETRY_SECONDS):
+            await self._warm_up()
+
+        checks = {
+            "started": self.started_at is not None,
+            "firebase_initialized": self.async_db is not None,
+            "firestore": self._firestore_ok,
+        }
+        return {
+            "ready": all(checks.values()),
+            "checks": checks,
+            "firestore_error": self._firestore_error,
+            "warm_up_seconds": self._warm_up_seconds,
+            # Degraded but still serving (the feed falls back to Firestore queries)
+            "feed_cache_healthy": self.feed_cache.is_healthy() if self.feed_cache.enabled else None,
+        }
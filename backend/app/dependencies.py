@@ -1,19 +1,81 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from firebase_admin import auth
+from google.cloud.firestore import AsyncClient
+from app.config import settings
+from app.services.feed_cache import FeedCache
 from app.services.firebase_service import FirebaseService
+from app.services.geocoding_worker import GeocodingWorker
+from app.services.google_maps import GoogleMapsService
+from app.services.idempotency import IdempotencyStore
+from app.services.notification_outbox import NotificationOutbox
+from app.services.post_events import PostEventBroker
+from app.services.post_notifier import NewPostNotifier
+from app.services.token_cache import TokenCache
+from app.services.user_cache import UserCache
 from app.schemas import TokenData, UserInDB, UserRole, VerificationStatus, UserPublic
 from typing import Optional
 
 security_scheme = HTTPBearer()
 
-def get_firebase_service():
-    return FirebaseService()
+def get_firestore(request: Request) -> AsyncClient:
+    """The shared Firestore AsyncClient opened by the app's service container."""
+    db = request.app.state.container.async_db
+    if db is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Firestore is not initialized."
+        )
+    return db
+
+def get_firebase_service(request: Request) -> FirebaseService:
+    """The FirebaseService built once at startup by the app's service container."""
+    service = request.app.state.container.firebase_service
+    if service is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Firebase is not initialized."
+        )
+    return service
+
+# Shared components built by the app's service container at startup
+
+def get_maps_service(request: Request) -> GoogleMapsService:
+    return request.app.state.container.maps_service
+
+def get_token_cache(request: Request) -> TokenCache:
+    return request.app.state.container.token_cache
+
+def get_user_cache(request: Request) -> UserCache:
+    return request.app.state.container.user_cache
+
+def get_feed_cache(request: Request) -> FeedCache:
+    return request.app.state.container.feed_cache
+
+def get_post_events(request: Request) -> PostEventBroker:
+    return request.app.state.container.post_events
+
+def get_geocoding_worker(request: Request) -> GeocodingWorker:
+    return request.app.state.container.geocoding_worker
+
+def get_post_notifier(request: Request) -> NewPostNotifier:
+    return request.app.state.container.post_notifier
+
+def get_notification_outbox(request: Request) -> NotificationOutbox:
+    return request.app.state.container.notification_outbox
+
+def get_idempotency_store(request: Request) -> IdempotencyStore:
+    return request.app.state.container.idempotency_store
 
 async def get_current_user_data(
     creds: HTTPAuthorizationCredentials = Depends(security_scheme),
-    service: FirebaseService = Depends(get_firebase_service)
+    service: FirebaseService = Depends(get_firebase_service),
+    token_cache: TokenCache = Depends(get_token_cache)
 ) -> TokenData:
+    """
+    Verifies the bearer ID token. Verified claims are cached until the token
+    expires, so a token the app reuses is only verified once.
+    """
     if not creds:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -21,8 +83,12 @@ async def get_current_user_data(
         )
     token = creds.credentials
     try:
-        payload = service.verify_firebase_token(token)
-        
+        payload = token_cache.get(token) if settings.AUTH_TOKEN_CACHE_MAX_ENTRIES else None
+        if payload is None:
+            payload = await service.verify_firebase_token(token, check_revoked=settings.AUTH_CHECK_REVOKED)
+            if settings.AUTH_TOKEN_CACHE_MAX_ENTRIES:
+                token_cache.put(token, payload)
+
         uid = payload.get("uid")
         if not uid:
             # This should not happen with a valid Firebase token
@@ -44,17 +110,26 @@ async def get_current_user_data(
 
 async def get_current_user_from_db(
     token_data: TokenData = Depends(get_current_user_data),
-    service: FirebaseService = Depends(get_firebase_service)
+    service: FirebaseService = Depends(get_firebase_service),
+    user_cache: UserCache = Depends(get_user_cache)
 ) -> UserInDB:
+    """Loads the caller's profile, from the user cache when it is fresh."""
     try:
         # Use user_id (which is aliased to uid)
-        user_doc = service.get_user_by_uid(token_data.user_id) 
+        user_doc = user_cache.get(token_data.user_id)
         if user_doc is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User profile not found in Firestore. Please complete registration."
-            )
+            # Taken before the read, so a write that lands meanwhile keeps this result out of the cache
+            generation = user_cache.generation(token_data.user_id)
+            user_doc = await service.get_user_by_uid(token_data.user_id)
+            if user_doc is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User profile not found in Firestore. Please complete registration."
+                )
+            user_cache.put(user_doc, generation)
         return user_doc
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
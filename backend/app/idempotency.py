@@ -0,0 +1,134 @@
+from typing import Any, Dict, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.responses import Response
+
+from app.dependencies import get_current_user_data, get_idempotency_store
+from app.schemas import TokenData
+from app.services.idempotency import (
+    IN_PROGRESS, MISMATCH, REPLAY, IdempotencyStore,
+    request_fingerprint, scoped_key,
+)
+
+# Request header carrying the client's key for one logical operation
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# Response header set on responses replayed from the store
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+MAX_KEY_LENGTH = 255
+
+# Responses that mean "try again" rather than a result, so they are not stored
+UNSTORED_STATUS_CODES = {408, 425, 429}
+
+
+class IdempotentReplay(Exception):
+    """Raised by idempotency_key when a stored response should be returned instead of running the handler."""
+
+    def __init__(self, record: Dict[str, Any]):
+        self.record = record
+
+
+async def idempotent_replay_handler(request: Request, exc: IdempotentReplay) -> Response:
+    record = exc.record
+    return Response(
+        content=record.get("body") or b"",
+        status_code=record.get("status_code", status.HTTP_200_OK),
+        media_type=record.get("media_type"),
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+async def idempotency_key(
+    request: Request,
+    token_data: TokenData = Depends(get_current_user_data),
+    store: IdempotencyStore = Depends(get_idempotency_store)
+) -> Optional[str]:
+    """
+    Makes a mutating endpoint safe to retry. If the request has an
+    Idempotency-Key header, the first request with that key (per user) runs
+    the handler and its response is stored by IdempotencyMiddleware; later
+    requests with the key get the stored response without running the
+    handler again. Returns the scoped key, or None without a header.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None or not store.enabled:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters."
+        )
+
+    doc_id = scoped_key(token_data.user_id, key)
+    fingerprint = request_fingerprint(request.method, request.url.path, await request.body())
+    try:
+        outcome, record = await store.begin(doc_id, fingerprint)
+    except Exception as e:
+        # The store is unavailable: run the request as if no key was sent
+        store.record_error()
+        print(f"Error checking idempotency key: {e}")
+        return None
+
+    if outcome == REPLAY:
+        raise IdempotentReplay(record)
+    if outcome == IN_PROGRESS:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed.",
+            headers={"Retry-After": "1"}
+        )
+    if outcome == MISMATCH:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"This {IDEMPOTENCY_HEADER} was already used for a different request."
+        )
+
+    request.state.idempotency = (store, doc_id, fingerprint)
+    return doc_id
+
+
+class IdempotencyMiddleware:
+    """
+    Stores the response of each request that claimed an Idempotency-Key (see
+    idempotency_key) once it has been sent. Server errors, retryable
+    statuses and failed requests release the key instead, so a retry runs
+    the handler again.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        # Shared with request.state in the handler's dependencies
+        state = scope.setdefault("state", {})
+        response: Dict[str, Any] = {"status": None, "media_type": None, "body": []}
+
+        async def capture(message):
+            if "idempotency" in state:
+                if message["type"] == "http.response.start":
+                    response["status"] = message["status"]
+                    for name, value in message.get("headers", []):
+                        if name.lower() == b"content-type":
+                            response["media_type"] = value.decode("latin-1")
+                elif message["type"] == "http.response.body":
+                    response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            claim = state.get("idempotency")
+            if claim is not None:
+                # Finished with the store that claimed the key
+                store, doc_id, fingerprint = claim
+                code = response["status"]
+                if code is None or code >= 500 or code in UNSTORED_STATUS_CODES:
+                    await store.release(doc_id)
+                else:
+                    await store.complete(doc_id, fingerprint, code, b"".join(response["body"]),
+                                         response["media_type"])
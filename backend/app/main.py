@@ -1,14 +1,35 @@
+import asyncio
 import uvicorn
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.config import settings
-from app.routers import auth, posts, reservations
+from app.container import ServiceContainer
+from app.idempotency import IDEMPOTENCY_HEADER, REPLAYED_HEADER, IdempotencyMiddleware, IdempotentReplay, idempotent_replay_handler
+from app.pagination import NEXT_PAGE_TOKEN_HEADER
+from app.responses import SERVER_TIME_HEADER
+from app.routers import admin, auth, payments, posts, reservations
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # --- Startup ---
+    # Clients and background components are built once and shared by all requests
+    container = ServiceContainer()
+    app.state.container = container
+    await container.start()
+
+    yield
+
+    # --- Shutdown ---
+    await container.stop()
 
 app = FastAPI(
     title="FoodAid API",
     description="Backend API for the FoodAid surplus food distribution platform.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 origins = [
@@ -24,22 +45,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], # Allows all methods (GET, POST, PUT, etc.)
     allow_headers=["*"], # Allows all headers
+    expose_headers=[NEXT_PAGE_TOKEN_HEADER, SERVER_TIME_HEADER, "ETag", REPLAYED_HEADER], # Let clients read cursors and sync state
 )
 
+# Mutating endpoints that accept an Idempotency-Key store their response for retries
+app.add_middleware(IdempotencyMiddleware)
+app.add_exception_handler(IdempotentReplay, idempotent_replay_handler)
+
 # --- Include API Routers ---
 app.include_router(auth.router, prefix="/auth", tags=["Authentication & Users"])
 app.include_router(posts.router, prefix="/posts", tags=["Food Posts"])
 app.include_router(reservations.router, prefix="/reservations", tags=["Reservations"])
-# We will add routers for Admin, Notifications, and Payments in the next batches.
-# app.include_router(admin.router, prefix="/admin", tags=["Admin"])
+app.include_router(payments.router, prefix="/payments", tags=["Payments"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
+# We will add a router for Notifications in the next batches.
 # app.include_router(notifications.router, prefix="/notifications", tags=["Notifications"])
-# app.include_router(payments.router, prefix="/payments", tags=["Payments"])
 # ---------------------------
 
 @app.get("/", tags=["Root"])
 async def read_root():
     return {"message": "Welcome to the FoodAid API!"}
 
+@app.get("/health/live", tags=["Root"])
+async def read_liveness(request: Request):
+    """Liveness probe: the process is up and serving requests."""
+    return request.app.state.container.liveness()
+
+@app.get("/health/ready", tags=["Root"])
+async def read_readiness(request: Request):
+    """Readiness probe: 503 until startup is complete and Firestore is reachable."""
+    readiness = await request.app.state.container.readiness()
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+@app.get("/metrics", tags=["Root"])
+async def read_metrics(request: Request):
+    """Runtime counters for in-process caches and background workers."""
+    container = request.app.state.container
+    return {
+        "feed_cache": container.feed_cache.stats(),
+        "post_events": container.post_events.stats(),
+        "expiry_sweeper": container.expiry_sweeper.stats(),
+        "geocode_cache": container.maps_service.cache.stats(),
+        "geocoding": container.maps_service.stats(),
+        "geocoding_worker": container.geocoding_worker.stats(),
+        "post_notifier": container.post_notifier.stats(),
+        "push": container.push_token_pruner.stats(),
+        "notification_outbox": await asyncio.to_thread(container.notification_dispatcher.stats), # Reads the SQLite outbox
+        "auth_token_cache": container.token_cache.stats(),
+        "user_cache": container.user_cache.stats(),
+        "idempotency": container.idempotency_store.stats(),
+    }
+
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
@@ -0,0 +1,132 @@
+import base64
+import datetime
+import heapq
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from google.cloud.firestore_v1.base_query import BaseQuery as FirestoreQuery
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# Response header carrying the cursor for the next page (absent on the last page)
+NEXT_PAGE_TOKEN_HEADER = "X-Next-Page-Token"
+
+MAX_PAGE_SIZE = 100
+
+
+class InvalidPageToken(ValueError):
+    """Raised when a page token is malformed or does not belong to the query."""
+
+
+def encode_page_token(data: Dict[str, Any]) -> str:
+    """Encodes cursor data into an opaque, URL-safe page token."""
+    raw = json.dumps(data, separators=(",", ":"), default=_json_default).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_page_token(token: str, order: str) -> Dict[str, Any]:
+    """
+    Decodes a page token produced by encode_page_token.
+    Raises InvalidPageToken if the token is malformed or was issued for a different ordering.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise InvalidPageToken("Malformed page token.")
+
+    if not isinstance(data, dict) or data.get("o") != order or "id" not in data:
+        raise InvalidPageToken("Page token does not match this query.")
+    return data
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in page token")
+
+
+# --- Firestore ordering (e.g. created_at / timestamp, newest first) ---
+
+def apply_time_cursor(query: FirestoreQuery, field: str, page_token: Optional[str], limit: Optional[int]) -> FirestoreQuery:
+    """
+    Orders a query by `field` descending (document ID as tie-breaker) and
+    positions it after the cursor in page_token, using Firestore start_after.
+    """
+    query = query.order_by(field, direction=FirestoreQuery.DESCENDING).order_by(
+        FieldPath.document_id(), direction=FirestoreQuery.DESCENDING
+    )
+    if page_token:
+        cursor = decode_page_token(page_token, order=field)
+        try:
+            value = datetime.datetime.fromisoformat(cursor["v"])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidPageToken("Malformed page token.")
+        query = query.start_after({field: value, "__name__": cursor["id"]})
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def time_page_token(field: str, value: datetime.datetime, doc_id: str) -> str:
+    """Builds the next-page token for a query ordered with apply_time_cursor."""
+    return encode_page_token({"o": field, "v": value, "id": doc_id})
+
+
+# --- In-memory ordering (e.g. distance over a candidate set) ---
+
+def top_k_after(items: Iterable[Tuple[float, str, Any]], page_token: Optional[str],
+                limit: Optional[int], order: str = "distance") -> Tuple[List[Tuple[float, str, Any]], Optional[str]]:
+    """
+    Selects the next page of (key, id, payload) items in ascending (key, id)
+    order, using a bounded heap so only `limit + 1` items are ever held in it.
+    Returns the page and the token for the following page (or None).
+    """
+    if page_token:
+        cursor = decode_page_token(page_token, order=order)
+        try:
+            after = (float(cursor["v"]), str(cursor["id"]))
+        except (KeyError, TypeError, ValueError):
+            raise InvalidPageToken("Malformed page token.")
+        items = (item for item in items if (item[0], item[1]) > after)
+
+    if not limit:
+        return sorted(items, key=lambda item: (item[0], item[1])), None
+
+    page = heapq.nsmallest(limit + 1, items, key=lambda item: (item[0], item[1]))
+    next_token = None
+    if len(page) > limit:
+        page = page[:limit]
+        last_key, last_id, _ = page[-1]
+        next_token = encode_page_token({"o": order, "v": last_key, "id": last_id})
+    return page, next_token
+
+
+def newest_after(items: Iterable[Dict[str, Any]], field: str, page_token: Optional[str],
+                 limit: Optional[int], id_field: str = "post_id") -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    In-memory equivalent of apply_time_cursor for dicts already held in memory:
+    newest first by `field`, then by ID, with the same page token format so a
+    client can page across both code paths.
+    """
+    def sort_key(item):
+        return (item[field], item[id_field])
+
+    items = (item for item in items if item.get(field) is not None)
+    if page_token:
+        cursor = decode_page_token(page_token, order=field)
+        try:
+            before = (datetime.datetime.fromisoformat(cursor["v"]), str(cursor["id"]))
+        except (KeyError, TypeError, ValueError):
+            raise InvalidPageToken("Malformed page token.")
+        items = (item for item in items if sort_key(item) < before)
+
+    if not limit:
+        return sorted(items, key=sort_key, reverse=True), None
+
+    page = heapq.nlargest(limit + 1, items, key=sort_key)
+    next_token = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_token = time_page_token(field, last[field], last[id_field])
+    return page, next_token
@@ -0,0 +1,61 @@
+import datetime
+import hashlib
+from enum import Enum
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Request, Response, status
+from pydantic import BaseModel
+
+# Server clock at the time a feed response was built; clients pass it back as `since`
+SERVER_TIME_HEADER = "X-Server-Time"
+
+
+def _orjson_default(value: Any) -> Any:
+    # Firestore returns DatetimeWithNanoseconds, a datetime subclass orjson rejects
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Serializes trusted, already-shaped data straight to JSON bytes."""
+    return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def etag_for(body: bytes) -> str:
+    """Strong ETag derived from the response body."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Checks an If-None-Match header (possibly a list, possibly weak tags) against an ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def fast_json_response(request: Request, content: Any, headers: Optional[Dict[str, str]] = None,
+                       etag_content: Any = None) -> Response:
+    """
+    Serializes trusted, plain-dict content with orjson - skipping per-item
+    Pydantic validation and FastAPI's second serialization pass - and tags it
+    with an ETag. Returns 304 Not Modified without a body if the client's
+    If-None-Match already matches.
+
+    The ETag covers the whole body unless etag_content is given, for bodies
+    that carry fields (like the server time) that change on every request.
+    """
+    body = dumps(content)
+    etag = etag_for(body if etag_content is None else dumps(etag_content))
+    response_headers = dict(headers or {})
+    response_headers["ETag"] = etag
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=response_headers)
+    return Response(content=body, media_type="application/json", headers=response_headers)
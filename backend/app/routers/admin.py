@@ -3,7 +3,8 @@ from typing import List
 
 from app.schemas import UserPublic, VerificationUpdate, UserInDB
 from app.services.firebase_service import FirebaseService
-from app.dependencies import get_current_admin_user, get_firebase_service
+from app.services.notification_outbox import NotificationOutbox
+from app.dependencies import get_current_admin_user, get_firebase_service, get_notification_outbox
 
 router = APIRouter()
 
@@ -17,7 +18,7 @@ async def get_pending_verification_users(
     Only accessible by an Admin user.
     """
     try:
-        pending_users = service.get_pending_users()
+        pending_users = await service.get_pending_users()
         # Convert UserInDB objects to UserPublic
         return [UserPublic.model_validate(user.model_dump()) for user in pending_users]
     except Exception as e:
@@ -30,15 +31,16 @@ async def get_pending_verification_users(
 async def verify_user(
     update_data: VerificationUpdate,
     admin_user: UserInDB = Depends(get_current_admin_user),
-    service: FirebaseService = Depends(get_firebase_service)
+    service: FirebaseService = Depends(get_firebase_service),
+    outbox: NotificationOutbox = Depends(get_notification_outbox)
 ):
     """
     Updates a user's verification status (Approve or Reject).
-    Sends a push notification to the user upon update.
+    Queues a push notification to the user, delivered in the background.
     Only accessible by an Admin user.
     """
     try:
-        updated_user = service.update_user_verification_status(
+        updated_user = await service.update_user_verification_status(
             update_data.user_id,
             update_data.status,
             update_data.rejection_reason
@@ -50,14 +52,18 @@ async def verify_user(
                 detail=f"User with ID {update_data.user_id} not found."
             )
 
-        # Send push notification if the user has an FCM token
+        # Queue a push notification if the user has an FCM token
         if updated_user.fcm_token:
             title = "Account Verification Update"
             body = f"Your account has been {updated_user.verification_status.value}."
             if update_data.rejection_reason and updated_user.verification_status == updated_user.verification_status.REJECTED:
                 body += f" Reason: {update_data.rejection_reason}"
             
-            service.send_push_notification(title, body, updated_user.fcm_token)
+            # Only the latest status is sent if the admin changes it again before delivery
+            queued = await outbox.enqueue(updated_user.user_id, title, body, data={"type": "verification"},
+                                          coalesce_key="verification")
+            if queued is None:
+                await service.send_push_notification(title, body, updated_user.fcm_token)
 
         return UserPublic.model_validate(updated_user.model_dump())
 
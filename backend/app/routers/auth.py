@@ -19,7 +19,7 @@ async def register_new_user(
     """
     try:
         # 1. Create user in Firebase Authentication
-        user_record = service.create_user_in_auth(user_create)
+        user_record = await service.create_user_in_auth(user_create)
         uid = user_record.uid
 
         # 2. Prepare user data for Firestore
@@ -34,10 +34,10 @@ async def register_new_user(
         user_data_dict["verification_document_url"] = None
 
         # 3. Create user profile in Firestore (this also handles geocoding)
-        service.create_user_in_firestore(str(uid), user_data_dict)
+        await service.create_user_in_firestore(str(uid), user_data_dict)
 
         # 4. Retrieve the complete user profile from Firestore
-        user_in_db = service.get_user_by_uid(str(uid))
+        user_in_db = await service.get_user_by_uid(str(uid))
         
         if user_in_db:
             # Use model_validate to safely create the response model
@@ -82,7 +82,7 @@ async def update_fcm_token(
     if not current_user.user_id:
         raise HTTPException(status_code=403, detail="User ID not found.")
         
-    success = service.update_user_fcm_token(current_user.user_id, token_data.fcm_token)
+    success = await service.update_user_fcm_token(current_user.user_id, token_data.fcm_token)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
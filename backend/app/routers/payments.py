@@ -1,3 +1,4 @@
+import asyncio
 import stripe
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
 from google.cloud.firestore_v1.client import Client
@@ -8,6 +9,7 @@ from app.config import settings, get_db
 from app.dependencies import get_current_user_from_db
 from app.services.firebase_service import FirebaseService
 from app.dependencies import get_firebase_service # Corrected import
+from app.idempotency import idempotency_key
 
 router = APIRouter()
 
@@ -20,10 +22,12 @@ else:
 @router.post("/create-payment-intent")
 async def create_payment_intent(
     donation: DonationRequest,
-    current_user: UserInDB = Depends(get_current_user_from_db)
+    current_user: UserInDB = Depends(get_current_user_from_db),
+    idempotency: Optional[str] = Depends(idempotency_key)
 ):
     """
     Creates a Stripe Payment Intent for a donation.
+    A retry with the same Idempotency-Key returns the same Payment Intent.
     """
     if not stripe.api_key:
         raise HTTPException(
@@ -32,7 +36,9 @@ async def create_payment_intent(
         )
 
     try:
-        payment_intent = stripe.PaymentIntent.create(
+        # The Stripe SDK is blocking, so run it in a worker thread
+        payment_intent = await asyncio.to_thread(
+            stripe.PaymentIntent.create,
             amount=donation.amount, # Amount in cents
             currency=donation.currency,
             automatic_payment_methods={"enabled": True},
@@ -41,7 +47,9 @@ async def create_payment_intent(
                 "user_id": current_user.user_id,
                 "user_email": current_user.email,
                 "user_name": current_user.name
-            }
+            },
+            # Also dedupes on Stripe's side if our stored response was lost
+            **({"idempotency_key": idempotency} if idempotency else {})
         )
         return {"client_secret": payment_intent.client_secret}
     except Exception as e:
@@ -87,7 +95,7 @@ async def stripe_webhook(
     if event['type'] == 'payment_intent.succeeded':
         payment_intent = event['data']['object']
         # Log the successful payment
-        service.log_payment(payment_intent)
+        await service.log_payment(payment_intent)
     else:
         print(f"Unhandled event type: {event['type']}")
 
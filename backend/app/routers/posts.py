@@ -1,84 +1,210 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Optional, Union
+import asyncio
 import datetime
-from google.cloud.firestore_v1.client import Client
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+from google.cloud.firestore import AsyncClient
 
 from app.schemas import (
-    FoodPostCreate, FoodPostPublic, PostStatus,
-    UserInDB, UserRole, Coordinates, UserPublic
+    FoodPostCreate, FoodPostPublic, FoodPostDelta, FoodPostAddressUpdate, PostStatus,
+    UserInDB, UserRole, Coordinates, UserPublic, WaitlistEntry
 )
-from app.config import get_db
-from app.dependencies import get_current_verified_user, get_firebase_service
+from app.config import settings
+from app.pagination import (
+    NEXT_PAGE_TOKEN_HEADER, MAX_PAGE_SIZE, InvalidPageToken,
+    apply_time_cursor, time_page_token, top_k_after, newest_after
+)
+from app.dependencies import (
+    get_current_verified_user, get_firebase_service, get_firestore, get_maps_service,
+    get_feed_cache, get_post_events, get_geocoding_worker, get_post_notifier
+)
+from app.idempotency import idempotency_key
 from app.services.firebase_service import FirebaseService
 from app.services.google_maps import GoogleMapsService
+from app.services import geohash
+from app.services.feed_cache import FeedCache
+from app.services.post_events import PostEventBroker
+from app.services.geocoding_worker import GeocodingWorker
+from app.services.post_notifier import NewPostNotifier
+from app.services.reservations import (
+    user_snapshot, snapshot_updates, reserved_updates, new_reservation, waitlist_ref, waitlist_position
+)
+from app.responses import SERVER_TIME_HEADER, dumps, fast_json_response
 
 router = APIRouter()
 
-def get_maps_service():
-    return GoogleMapsService()
+# Number of nearest posts re-ranked with the exact geodesic distance when unpaged
+EXACT_DISTANCE_TOP_K = 50
+
+# Feed response fields that are not read from the post document itself
+_COMPUTED_FEED_FIELDS = {"post_id", "distance_km", "donor_details"}
+
+# Stored fields the feed always reads to filter, rank, page and hydrate
+_INTERNAL_FEED_FIELDS = ["expiry", "created_at", "coordinates", "donor_id"]
 
-@router.get("/", response_model=List[FoodPostPublic])
+# since= windows are widened by this much so writes that committed just after
+# the previous response was built are not missed (clients upsert, so repeats are harmless)
+DELTA_SYNC_OVERLAP = datetime.timedelta(seconds=5)
+
+# Attempts to reserve a post whose document keeps changing under us before giving up with 409
+RESERVE_MAX_ATTEMPTS = 5
+
+# Idle live streams send an SSE comment this often so proxies keep them open
+STREAM_KEEPALIVE_SECONDS = 15.0
+
+@router.get("/", response_model=Union[List[FoodPostPublic], FoodPostDelta])
 async def get_available_posts(
-    db: Client = Depends(get_db),
+    request: Request,
+    db: AsyncClient = Depends(get_firestore),
     maps_service: GoogleMapsService = Depends(get_maps_service),
     fb_service: FirebaseService = Depends(get_firebase_service), # Added for fetching donor details
+    feed_cache: FeedCache = Depends(get_feed_cache),
     lat: Optional[float] = Query(None, description="User's latitude for distance sorting."),
-    lng: Optional[float] = Query(None, description="User's longitude for distance sorting.")
+    lng: Optional[float] = Query(None, description="User's longitude for distance sorting."),
+    radius_km: Optional[float] = Query(None, gt=0, description="Only return posts within this distance (requires lat/lng)."),
+    exact_distance: bool = Query(False, description="Use exact geodesic distances for the nearest results."),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of posts to return."),
+    page_token: Optional[str] = Query(None, description=f"Cursor from the {NEXT_PAGE_TOKEN_HEADER} header of the previous page."),
+    fields: Optional[str] = Query(None, description="Comma-separated post fields to return (post_id is always included)."),
+    since: Optional[datetime.datetime] = Query(None, description=f"Return only changes after this time (the {SERVER_TIME_HEADER} of the last refresh).")
 ):
     """
     Gets all 'Available' posts that have not expired.
     If lat/lng are provided, results are sorted by distance.
+    If radius_km is also provided, only posts inside that radius are read,
+    using geohash-prefix range queries instead of a full collection scan.
+    Distances are haversine estimates unless exact_distance is set, in which
+    case the returned page is re-ranked by geodesic distance.
     Otherwise, sorted by creation date.
+    When limit is set, the next page's cursor is returned in the
+    X-Next-Page-Token response header.
+    If the feed cache is enabled and healthy, no Firestore reads are made
+    for the posts themselves.
+    With fields=, only those fields are read from Firestore and returned.
+    Posts are serialized straight from the stored data with orjson rather
+    than being validated into FoodPostPublic models one by one.
+
+    With since=, a FoodPostDelta is returned instead: posts that entered or
+    changed in the feed, and tombstones for posts that left it (reserved,
+    collected or expired). Every response carries an ETag and answers
+    If-None-Match with 304 Not Modified.
     """
+    if radius_km is not None and (lat is None or lng is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="radius_km requires both lat and lng."
+        )
+    if since is not None and page_token:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="since cannot be combined with page_token."
+        )
+
+    selected_fields = _parse_feed_fields(fields)
+
     try:
         now = datetime.datetime.now(datetime.timezone.utc)
         posts_ref = db.collection('foodPosts')
-        query = posts_ref.where("status", "==", PostStatus.AVAILABLE).where("expiry", ">", now)
+
+        # Project the documents down to what this response and the feed logic need
+        field_paths = None
+        if fields:
+            stored_fields = [f for f in selected_fields if f not in _COMPUTED_FEED_FIELDS]
+            field_paths = list(dict.fromkeys(stored_fields + _INTERNAL_FEED_FIELDS))
+
+        available_query = posts_ref.where("status", "==", PostStatus.AVAILABLE)
+        if field_paths:
+            available_query = available_query.select(field_paths)
 
         available_posts_data = []
+        removed_posts = []
+        next_page_token = None
         user_coords = None
         if lat is not None and lng is not None:
             user_coords = Coordinates(lat=lat, lng=lng)
 
-        donor_cache: dict[str, Optional[UserPublic]] = {}
-
-        for doc in query.stream():
-            post_data = doc.to_dict()
-            if not post_data:  # Skip if doc.to_dict() is None
-                continue
-                
-            post_data["post_id"] = doc.id
-
-            # Fetch and cache donor details
-            donor_id = post_data.get("donor_id")
-            if donor_id:
-                if donor_id not in donor_cache:
-                    donor_user = fb_service.get_user_by_uid(donor_id)
-                    donor_cache[donor_id] = UserPublic.model_validate(donor_user.model_dump()) if donor_user else None
-                post_data["donor_details"] = donor_cache[donor_id]
-
-            # Calculate distance if user coords are provided
+        if since is not None:
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=datetime.timezone.utc)
+            changed, removed_posts = await _get_feed_changes(posts_ref, field_paths, since, now)
             if user_coords:
-                post_coords_data = post_data.get("coordinates")
-                if post_coords_data:
-                    post_coords = Coordinates.model_validate(post_coords_data)
-                    distance = maps_service.calculate_distance_km(user_coords, post_coords)
-                    post_data["distance_km"] = distance
-                else:
-                    post_data["distance_km"] = float('inf')
-            
-            available_posts_data.append(post_data)
-
-        # Sort results
-        if user_coords:
-            available_posts_data.sort(key=lambda p: p.get("distance_km", float('inf')))
+                available_posts_data, _ = _rank_by_distance(
+                    maps_service, user_coords, changed, radius_km, exact_distance, None, None
+                )
+            else:
+                available_posts_data, _ = newest_after(changed, "created_at", None, None)
         else:
-            # Sort by created_at descending (newest first)
-            available_posts_data.sort(key=lambda p: p.get("created_at"), reverse=True)
-        
-        # Validate and return
-        return [FoodPostPublic.model_validate(post) for post in available_posts_data]
+            # Serve from the in-memory feed cache when its listener is healthy
+            use_cache = feed_cache.is_healthy()
+            if feed_cache.enabled and not use_cache:
+                feed_cache.record_fallback()
 
+            if user_coords:
+                prefixes = None
+                if radius_km is not None:
+                    prefixes = geohash.covering_prefixes(user_coords.lat, user_coords.lng, radius_km)
+
+                if use_cache:
+                    candidates = _drop_expired(feed_cache.snapshot(), now)
+                    if prefixes:
+                        prefix_tuple = tuple(prefixes)
+                        candidates = [p for p in candidates if (p.get("geohash") or "").startswith(prefix_tuple)]
+                elif prefixes:
+                    # One range query per covering cell. Expiry is checked below, since
+                    # Firestore only allows the range filter on 'geohash' here.
+                    cell_results = await asyncio.gather(*[
+                        _collect(
+                            available_query
+                            .where("geohash", ">=", prefix)
+                            .where("geohash", "<", prefix + geohash.PREFIX_RANGE_END)
+                        )
+                        for prefix in prefixes
+                    ])
+                    docs = [doc for cell_docs in cell_results for doc in cell_docs]
+                    candidates = _available_posts_from_docs(docs, now)
+                else:
+                    docs = await _collect(available_query.where("expiry", ">", now))
+                    candidates = _available_posts_from_docs(docs, now)
+
+                available_posts_data, next_page_token = _rank_by_distance(
+                    maps_service, user_coords, candidates, radius_km, exact_distance, page_token, limit
+                )
+            elif use_cache:
+                available_posts_data, next_page_token = newest_after(
+                    _drop_expired(feed_cache.snapshot(), now), "created_at", page_token, limit
+                )
+            else:
+                # Newest first, paged by Firestore itself. Expired posts are skipped
+                # after the read, so a page may hold fewer than `limit` posts.
+                query = apply_time_cursor(available_query, "created_at", page_token, limit)
+                docs = await _collect(query)
+                available_posts_data = _available_posts_from_docs(docs, now)
+                if limit and len(docs) == limit:
+                    last = docs[-1]
+                    next_page_token = time_page_token("created_at", last.get("created_at"), last.id)
+
+        # Fetch donor details for the returned page only, in one batched pass
+        if "donor_details" in selected_fields:
+            donors = await fb_service.get_users_by_uids([p.get("donor_id") for p in available_posts_data])
+            donors_json = {uid: user.model_dump(mode="json") if user else None for uid, user in donors.items()}
+            for post_data in available_posts_data:
+                post_data["donor_details"] = donors_json.get(post_data.get("donor_id"))
+
+        headers = {SERVER_TIME_HEADER: now.isoformat()}
+        if next_page_token:
+            headers[NEXT_PAGE_TOKEN_HEADER] = next_page_token
+
+        # Trusted Firestore data: project and serialize without building models
+        content = [{name: post.get(name) for name in selected_fields} for post in available_posts_data]
+        if since is not None:
+            # server_time changes on every call, so the ETag covers only the changes
+            delta = {"posts": content, "removed": removed_posts}
+            return fast_json_response(request, {**delta, "server_time": now}, headers, etag_content=delta)
+        return fast_json_response(request, content, headers)
+
+    except InvalidPageToken as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         print(f"Error fetching posts: {e}")
         raise HTTPException(
@@ -86,16 +212,180 @@ async def get_available_posts(
             detail=f"Error fetching posts: {e}"
         )
 
-@router.post("/", response_model=FoodPostPublic, status_code=status.HTTP_201_CREATED)
+def _rank_by_distance(maps_service: GoogleMapsService, user_coords: Coordinates, candidates: List[dict],
+                      radius_km: Optional[float], exact_distance: bool,
+                      page_token: Optional[str], limit: Optional[int]):
+    """
+    Orders candidate posts by distance from the user (one vectorized pass),
+    trims them to radius_km and selects the requested page.
+    Returns the page of posts, with distance_km set, and the next page token.
+    """
+    lats, lngs = maps_service.coordinate_arrays([p.get("coordinates") for p in candidates])
+    distances = maps_service.calculate_distances_km(user_coords, lats, lngs)
+
+    items = (
+        (float(distances[i]), post["post_id"], i)
+        for i, post in enumerate(candidates)
+        # Geohash cells over-cover the circle, so trim to the exact radius
+        if radius_km is None or distances[i] <= radius_km
+    )
+    page, next_page_token = top_k_after(items, page_token, limit)
+    indices = [i for _, _, i in page]
+
+    if exact_distance:
+        top_k = indices[:limit or EXACT_DISTANCE_TOP_K]
+        maps_service.refine_distances_km(user_coords, lats, lngs, distances, top_k)
+        indices = sorted(top_k, key=lambda i: distances[i]) + indices[len(top_k):]
+
+    posts = []
+    for i in indices:
+        post = candidates[i]
+        post["distance_km"] = float(distances[i])
+        posts.append(post)
+    return posts, next_page_token
+
+async def _get_feed_changes(posts_ref, field_paths: Optional[List[str]],
+                            since: datetime.datetime, now: datetime.datetime):
+    """
+    Finds feed changes after `since`: posts updated in the window, plus
+    Available posts whose expiry passed in the window without a write.
+    Returns (posts still in the feed, tombstones for posts that left it).
+    """
+    window_start = since - DELTA_SYNC_OVERLAP
+    changed_query = posts_ref.where("updated_at", ">", window_start)
+    expired_query = (
+        posts_ref.where("status", "==", PostStatus.AVAILABLE)
+        .where("expiry", ">", window_start)
+        .where("expiry", "<=", now)
+    )
+    if field_paths:
+        changed_query = changed_query.select(list(dict.fromkeys(field_paths + ["status", "updated_at"])))
+        expired_query = expired_query.select(["expiry"])
+
+    changed_docs, expired_docs = await asyncio.gather(_collect(changed_query), _collect(expired_query))
+
+    posts = []
+    removed: dict[str, dict] = {}
+    for doc in changed_docs:
+        post_data = doc.to_dict()
+        if not post_data:
+            continue
+        post_data["post_id"] = doc.id
+
+        expiry_time = post_data.get("expiry")
+        is_expired = bool(expiry_time and expiry_time <= now)
+        if post_data.get("status") == PostStatus.AVAILABLE and not is_expired:
+            posts.append(post_data)
+        else:
+            removed[doc.id] = {
+                "post_id": doc.id,
+                "status": PostStatus.EXPIRED if is_expired else post_data.get("status"),
+                "updated_at": post_data.get("updated_at"),
+            }
+
+    for doc in expired_docs:
+        if doc.id not in removed:
+            removed[doc.id] = {"post_id": doc.id, "status": PostStatus.EXPIRED, "updated_at": doc.get("expiry")}
+
+    return posts, list(removed.values())
+
+def _parse_feed_fields(fields: Optional[str]) -> List[str]:
+    """Validates the fields= projection. Defaults to every FoodPostPublic field."""
+    if not fields:
+        return list(FoodPostPublic.model_fields)
+
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in FoodPostPublic.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(FoodPostPublic.model_fields)}."
+        )
+    if "post_id" not in requested:
+        requested.insert(0, "post_id")
+    return requested
+
+async def _collect(query) -> list:
+    """Reads every document of an async query."""
+    return [doc async for doc in query.stream()]
+
+def _available_posts_from_docs(docs, now: datetime.datetime) -> List[dict]:
+    """Converts post snapshots to dicts, dropping empty and expired documents."""
+    posts = []
+    for doc in docs:
+        post_data = doc.to_dict()
+        if not post_data:  # Skip if doc.to_dict() is None
+            continue
+
+        post_data["post_id"] = doc.id
+        posts.append(post_data)
+    return _drop_expired(posts, now)
+
+def _drop_expired(posts: List[dict], now: datetime.datetime) -> List[dict]:
+    """Filters out posts whose expiry has passed (they may not be swept yet)."""
+    return [p for p in posts if not (p.get("expiry") and p["expiry"] <= now)]
+
+@router.get("/stream")
+async def stream_nearby_posts(
+    request: Request,
+    broker: PostEventBroker = Depends(get_post_events),
+    lat: float = Query(..., description="Subscriber's latitude."),
+    lng: float = Query(..., description="Subscriber's longitude."),
+    radius_km: float = Query(10.0, gt=0, le=200, description="Only stream posts within this distance.")
+):
+    """
+    Streams live post events near the subscriber as Server-Sent Events:
+    "new" and "updated" carry the post, "reserved" and "expired" only its
+    post_id; each includes distance_km.
+    A "resync" event means the client fell behind and events were dropped;
+    it should catch up with GET /posts/?since=... and keep listening.
+    Requires the feed cache, whose Firestore listener feeds every stream.
+    """
+    if not broker.running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Live post updates are not available."
+        )
+
+    subscription = broker.subscribe(Coordinates(lat=lat, lng=lng), radius_km)
+
+    async def event_stream():
+        try:
+            yield f"retry: {int(STREAM_KEEPALIVE_SECONDS * 1000)}\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.next_event(STREAM_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if event["type"] == "closed":
+                    break
+                yield f"event: {event['type']}\ndata: {dumps(event).decode()}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/", response_model=FoodPostPublic, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(idempotency_key)])
 async def create_new_post(
     post_data: FoodPostCreate,
     current_user: UserInDB = Depends(get_current_verified_user),
-    db: Client = Depends(get_db),
+    db: AsyncClient = Depends(get_firestore),
     maps_service: GoogleMapsService = Depends(get_maps_service),
-    fb_service: FirebaseService = Depends(get_firebase_service)
+    fb_service: FirebaseService = Depends(get_firebase_service),
+    geocoding_worker: GeocodingWorker = Depends(get_geocoding_worker),
+    post_notifier: NewPostNotifier = Depends(get_post_notifier)
 ):
     """
     Creates a new food post. Only accessible by verified Donors.
+    With deferred geocoding enabled, an address that is not already cached is
+    resolved in the background: the post is returned at once in the
+    'Geocoding' state and becomes 'Available' (or 'GeocodeFailed') later.
+    Nearby receivers are notified in the background once the post is Available.
     """
     if current_user.role != UserRole.DONOR:
         raise HTTPException(
@@ -104,29 +394,43 @@ async def create_new_post(
         )
 
     try:
-        # Geocode the provided address
-        coordinates = maps_service.get_coordinates_for_address(post_data.address)
-        if not coordinates:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Could not find coordinates for address: {post_data.address}. Please try a more specific address."
-            )
-
+        defer = settings.GEOCODING_DEFERRED and geocoding_worker.running
+        coordinates = None
+        cached, cached_coordinates = (await maps_service.cache.lookup(post_data.address)) if defer else (False, None)
+        if cached and cached_coordinates:
+            coordinates = cached_coordinates
+        elif not defer:
+            # Geocode the provided address
+            coordinates = await maps_service.get_coordinates_for_address(post_data.address)
+            if not coordinates:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Could not find coordinates for address: {post_data.address}. Please try a more specific address."
+                )
+
+        created_at = datetime.datetime.now(datetime.timezone.utc)
         new_post_data = post_data.model_dump()
         new_post_data.update({
             "donor_id": current_user.user_id,
-            "status": PostStatus.AVAILABLE,
-            "created_at": datetime.datetime.now(datetime.timezone.utc),
-            "coordinates": coordinates.model_dump(),
+            "status": PostStatus.AVAILABLE if coordinates else PostStatus.GEOCODING,
+            "created_at": created_at,
+            "updated_at": created_at,
+            "coordinates": coordinates.model_dump() if coordinates else None,
+            "geohash": geohash.encode(coordinates.lat, coordinates.lng) if coordinates else None,
             "receiver_id": None,
             "reserved_at": None,
             "donor_details": UserPublic.model_validate(current_user.model_dump()) # Add donor details on creation
         })
 
         # Add to Firestore
-        update_time, doc_ref = db.collection('foodPosts').add(new_post_data)
+        update_time, doc_ref = await db.collection('foodPosts').add(new_post_data)
         new_post_data["post_id"] = doc_ref.id
 
+        if not coordinates:
+            geocoding_worker.enqueue(doc_ref.id, post_data.address)
+        else:
+            post_notifier.enqueue(doc_ref.id, post_data.title, new_post_data["coordinates"], current_user.user_id)
+
         # Return the created post, validated by the response model
         return FoodPostPublic.model_validate(new_post_data)
 
@@ -139,24 +443,88 @@ async def create_new_post(
             detail=f"Error creating post: {e}"
         )
 
+@router.put("/{post_id}/address", response_model=FoodPostPublic)
+async def update_post_address(
+    post_id: str,
+    address_update: FoodPostAddressUpdate,
+    current_user: UserInDB = Depends(get_current_verified_user),
+    db: AsyncClient = Depends(get_firestore),
+    geocoding_worker: GeocodingWorker = Depends(get_geocoding_worker)
+):
+    """
+    Lets the donor correct the address of a post that could not be geocoded
+    (or is still waiting). The post goes back to 'Geocoding' and is resolved
+    in the background again.
+    """
+    if not geocoding_worker.running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Address updates are not available right now."
+        )
+
+    try:
+        post_ref = db.collection('foodPosts').document(post_id)
+        post_doc = await post_ref.get()
+
+        if not post_doc.exists:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "Post not found.")
+
+        post_data = post_doc.to_dict()
+        if post_data.get("donor_id") != current_user.user_id:
+            raise HTTPException(status.HTTP_403_FORBIDDEN, "You are not the owner of this post.")
+
+        if post_data.get("status") not in (PostStatus.GEOCODING, PostStatus.GEOCODE_FAILED):
+            raise HTTPException(
+                status.HTTP_400_BAD_REQUEST,
+                f"Only posts waiting for a valid address can be updated. Current status: {post_data.get('status')}"
+            )
+
+        update_data = {
+            "address": address_update.address,
+            "status": PostStatus.GEOCODING,
+            "geocode_error": None,
+            "updated_at": datetime.datetime.now(datetime.timezone.utc)
+        }
+        await post_ref.update(update_data)
+        geocoding_worker.enqueue(post_id, address_update.address)
+
+        post_data.update(update_data)
+        post_data["post_id"] = post_id
+        return FoodPostPublic.model_validate(post_data)
+
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        print(f"Error updating post address: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error updating post address: {e}"
+        )
+
 @router.get("/me", response_model=List[FoodPostPublic])
 async def get_my_posts(
+    response: Response,
     current_user: UserInDB = Depends(get_current_verified_user),
-    db: Client = Depends(get_db),
-    fb_service: FirebaseService = Depends(get_firebase_service) # Added
+    db: AsyncClient = Depends(get_firestore),
+    fb_service: FirebaseService = Depends(get_firebase_service), # Added
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of posts to return."),
+    page_token: Optional[str] = Query(None, description=f"Cursor from the {NEXT_PAGE_TOKEN_HEADER} header of the previous page.")
 ):
     """
-    Gets all posts created by the currently authenticated user (Donor).
+    Gets all posts created by the currently authenticated user (Donor),
+    newest first. Supports the same limit/page_token cursor as GET /posts.
     """
     try:
         posts_ref = db.collection('foodPosts')
         query = posts_ref.where("donor_id", "==", current_user.user_id)
+        query = apply_time_cursor(query, "created_at", page_token, limit)
 
         my_posts = []
         # Pre-fetch and cache donor's own details
         donor_details = UserPublic.model_validate(current_user.model_dump())
 
-        for doc in query.stream():
+        docs = [doc async for doc in query.stream()]
+        for doc in docs:
             post_data = doc.to_dict()
             if not post_data: # Safety check
                 continue
@@ -165,9 +533,14 @@ async def get_my_posts(
             post_data["donor_details"] = donor_details # Add self as donor
             my_posts.append(FoodPostPublic.model_validate(post_data))
 
-        my_posts.sort(key=lambda p: p.created_at, reverse=True)
+        if limit and len(docs) == limit:
+            last = docs[-1]
+            response.headers[NEXT_PAGE_TOKEN_HEADER] = time_page_token("created_at", last.get("created_at"), last.id)
+
         return my_posts
 
+    except InvalidPageToken as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         print(f"Error fetching user's posts: {e}")
         raise HTTPException(
@@ -175,15 +548,26 @@ async def get_my_posts(
             detail=f"Error fetching user's posts: {e}"
         )
 
-@router.put("/{post_id}/reserve", response_model=FoodPostPublic)
+@router.put(
+    "/{post_id}/reserve",
+    response_model=FoodPostPublic,
+    responses={status.HTTP_202_ACCEPTED: {"model": WaitlistEntry, "description": "Post is reserved; queued on its waitlist."}},
+    dependencies=[Depends(idempotency_key)]
+)
 async def reserve_post(
     post_id: str,
     current_user: UserInDB = Depends(get_current_verified_user),
-    db: Client = Depends(get_db),
-    fb_service: FirebaseService = Depends(get_firebase_service) # Added
+    db: AsyncClient = Depends(get_firestore),
+    fb_service: FirebaseService = Depends(get_firebase_service), # Added
+    waitlist: bool = Query(False, description="If the post is already reserved, join its waitlist instead of failing.")
 ):
     """
     Reserves an 'Available' food post. Only accessible by verified Receivers.
+
+    With waitlist=true, a receiver who finds the post reserved is queued in
+    arrival order (202 with their position) instead of getting a 409. When
+    the reservation is cancelled or its hold runs out, the post passes to
+    the first receiver in line.
     """
     if current_user.role != UserRole.RECEIVER:
         raise HTTPException(
@@ -191,55 +575,81 @@ async def reserve_post(
             detail="Only Receivers are allowed to reserve posts."
         )
 
+    arrived_at = datetime.datetime.now(datetime.timezone.utc)
     post_ref = db.collection('foodPosts').document(post_id)
     try:
-        post_doc = post_ref.get()
-        if not post_doc.exists:
-            raise HTTPException(status.HTTP_404_NOT_FOUND, "Food post not found.")
+        # Optimistic concurrency: the post update and the reservation record are
+        # committed together, and only if the post is unchanged since it was read.
+        # Racing receivers fail the precondition, re-read the post and get a 409.
+        donor_details: Optional[UserPublic] = None
+        left_waitlist = False
+        for _ in range(RESERVE_MAX_ATTEMPTS):
+            post_doc = await post_ref.get()
+            if not post_doc.exists:
+                raise HTTPException(status.HTTP_404_NOT_FOUND, "Food post not found.")
+
+            post_data = post_doc.to_dict()
+            if not post_data: # Safety check
+                 raise HTTPException(status.HTTP_404_NOT_FOUND, "Food post data is empty.")
 
-        post_data = post_doc.to_dict()
-        if not post_data: # Safety check
-             raise HTTPException(status.HTTP_404_NOT_FOUND, "Food post data is empty.")
+            if post_data.get("status") == PostStatus.RESERVED and post_data.get("receiver_id") == current_user.user_id:
+                if left_waitlist:
+                    break # Promoted from the waitlist entry we had just written
+                raise HTTPException(status.HTTP_409_CONFLICT, "You have already reserved this post.")
 
-        if post_data.get("status") != PostStatus.AVAILABLE:
-            raise HTTPException(status.HTTP_400_BAD_REQUEST, "This post is no longer available.")
+            if post_data.get("status") == PostStatus.RESERVED and waitlist and settings.WAITLIST_MAX_SIZE > 0:
+                entry = await _join_waitlist(db, post_ref, current_user, arrived_at)
+                if entry is not None:
+                    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=entry.model_dump(mode="json"))
+                left_waitlist = True
+                continue # Released while we were joining; reserve it directly instead
 
-        now = datetime.datetime.now(datetime.timezone.utc)
-        
-        # Check expiry
-        expiry_time = post_data.get("expiry")
-        if expiry_time and expiry_time <= now:
-            post_ref.update({"status": PostStatus.EXPIRED})
-            raise HTTPException(status.HTTP_400_BAD_REQUEST, "This post has expired.")
+            if post_data.get("status") != PostStatus.AVAILABLE:
+                raise HTTPException(status.HTTP_409_CONFLICT, "This post is no longer available.")
 
-        # Update post status
-        update_data = {
-            "status": PostStatus.RESERVED,
-            "receiver_id": current_user.user_id,
-            "reserved_at": now
-        }
-        post_ref.update(update_data)
+            now = datetime.datetime.now(datetime.timezone.utc)
 
-        # Create a reservation record
-        reservation_data = {
-            "post_id": post_id,
-            "receiver_id": current_user.user_id,
-            "donor_id": post_data.get("donor_id"),
-            "timestamp": now,
-            "status": "Active" # "Active", "Completed", "Cancelled"
-        }
-        db.collection('reservations').add(reservation_data)
+            # Check expiry
+            expiry_time = post_data.get("expiry")
+            if expiry_time and expiry_time <= now:
+                await post_ref.update({"status": PostStatus.EXPIRED, "updated_at": now})
+                raise HTTPException(status.HTTP_400_BAD_REQUEST, "This post has expired.")
+
+            # Update post status; the post points at its reservation so later transitions need no query
+            reservation_ref = db.collection('reservations').document()
+            update_data = reserved_updates(current_user.user_id, reservation_ref.id, now)
+
+            # Donor profile for the reservation's snapshot and the response (read once across retries)
+            donor_id = post_data.get("donor_id")
+            if donor_details is None and "donor_details" not in post_data and isinstance(donor_id, str):
+                donor_details = (await fb_service.get_users_by_uids([donor_id])).get(donor_id)
+
+            post_data.update(update_data)
+            reservation_data = new_reservation(
+                post_id, post_data, user_snapshot(current_user), donor_details or post_data.get("donor_details"), now
+            )
+
+            batch = db.batch()
+            batch.update(post_ref, update_data, option=db.write_option(last_update_time=post_doc.update_time))
+            batch.create(reservation_ref, reservation_data)
+            if settings.WAITLIST_MAX_SIZE > 0:
+                # A receiver who was told the post is free again reserves it from the waitlist
+                batch.delete(waitlist_ref(db, post_id).document(current_user.user_id))
+            try:
+                await batch.commit()
+                break
+            except FailedPrecondition:
+                continue # The post changed since it was read; re-check it
+        else:
+            raise HTTPException(status.HTTP_409_CONFLICT, "This post is being reserved by someone else. Please try again.")
 
         # Prepare response
-        post_data.update(update_data)
         post_data["post_id"] = post_id
-        
-        # Add donor details if not present
         if "donor_details" not in post_data:
-             donor_id = post_data.get("donor_id")
-             if donor_id:
-                donor_user = fb_service.get_user_by_uid(donor_id)
-                post_data["donor_details"] = UserPublic.model_validate(donor_user.model_dump()) if donor_user else None
+            donor_id = post_data.get("donor_id")
+            if donor_details is None and isinstance(donor_id, str):
+                donor_details = (await fb_service.get_users_by_uids([donor_id])).get(donor_id)
+            post_data["donor_details"] = donor_details
 
         return FoodPostPublic.model_validate(post_data)
 
@@ -248,11 +658,98 @@ async def reserve_post(
         print(f"Error reserving post: {e}")
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, f"Error reserving post: {e}")
 
+async def _join_waitlist(db: AsyncClient, post_ref, current_user: UserInDB,
+                         arrived_at: datetime.datetime) -> Optional[WaitlistEntry]:
+    """
+    Queues the receiver for a reserved post, keeping their place if they are
+    already waiting. Returns None (having left the queue) if the post is no
+    longer reserved once the entry is written: a release that found the
+    waitlist empty may have put it back on the feed, and nobody would hand
+    it to this entry. Checking the post after the write, while releases
+    check the waitlist after theirs (promote_late_waiter), means one side
+    always sees the other.
+    """
+    post_id = post_ref.id
+    entry_ref = waitlist_ref(db, post_id).document(current_user.user_id)
+    try:
+        await entry_ref.create({
+            "receiver_id": current_user.user_id,
+            "joined_at": arrived_at,
+            "receiver_details": user_snapshot(current_user) # Copied onto the reservation if promoted
+        })
+        joined_at, created = arrived_at, True
+    except AlreadyExists:
+        joined_at, created = (await entry_ref.get()).get("joined_at"), False
+
+    post_doc = await post_ref.get()
+    post_data = post_doc.to_dict() if post_doc.exists else None
+    if not post_data or post_data.get("status") != PostStatus.RESERVED or post_data.get("receiver_id") == current_user.user_id:
+        await entry_ref.delete()
+        return None
+
+    position = await waitlist_position(db, post_id, joined_at)
+    if created and position > settings.WAITLIST_MAX_SIZE:
+        await entry_ref.delete()
+        raise HTTPException(status.HTTP_409_CONFLICT, "The waitlist for this post is full.")
+    return WaitlistEntry(post_id=post_id, receiver_id=current_user.user_id, joined_at=joined_at, position=position)
+
+@router.get("/{post_id}/waitlist", response_model=WaitlistEntry)
+async def get_waitlist_position(
+    post_id: str,
+    current_user: UserInDB = Depends(get_current_verified_user),
+    db: AsyncClient = Depends(get_firestore)
+):
+    """
+    The caller's place in line for a post. 404 if they are not waiting for
+    it, 409 if the post is back on the feed and can be reserved directly.
+    """
+    try:
+        post_doc, entry_doc = [doc async for doc in db.get_all([
+            db.collection('foodPosts').document(post_id),
+            waitlist_ref(db, post_id).document(current_user.user_id)
+        ])]
+        if post_doc.id != post_id: # get_all does not preserve order
+            post_doc, entry_doc = entry_doc, post_doc
+        if not entry_doc.exists:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "You are not on the waitlist for this post.")
+
+        post_data = post_doc.to_dict() if post_doc.exists else None
+        if post_data and post_data.get("status") == PostStatus.AVAILABLE:
+            # Back on the feed: the caller can take it now (reserving clears the entry)
+            raise HTTPException(status.HTTP_409_CONFLICT, "This post is available again. Reserve it now.")
+        if not post_data or post_data.get("status") != PostStatus.RESERVED:
+            # Collected, expired or deleted: nothing left to wait for
+            await entry_doc.reference.delete()
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "This post is no longer available.")
+
+        joined_at = entry_doc.get("joined_at")
+        position = await waitlist_position(db, post_id, joined_at)
+        return WaitlistEntry(post_id=post_id, receiver_id=current_user.user_id, joined_at=joined_at, position=position)
+
+    except Exception as e:
+        if isinstance(e, HTTPException): raise e
+        print(f"Error fetching waitlist position: {e}")
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, f"Error fetching waitlist position: {e}")
+
+@router.delete("/{post_id}/waitlist", status_code=status.HTTP_204_NO_CONTENT)
+async def leave_waitlist(
+    post_id: str,
+    current_user: UserInDB = Depends(get_current_verified_user),
+    db: AsyncClient = Depends(get_firestore)
+):
+    """Removes the caller from a post's waitlist (no-op if they are not on it)."""
+    try:
+        await waitlist_ref(db, post_id).document(current_user.user_id).delete()
+        return
+    except Exception as e:
+        print(f"Error leaving waitlist: {e}")
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, f"Error leaving waitlist: {e}")
+
 @router.put("/{post_id}/collected", response_model=FoodPostPublic)
 async def mark_post_collected(
     post_id: str,
     current_user: UserInDB = Depends(get_current_verified_user),
-    db: Client = Depends(get_db),
+    db: AsyncClient = Depends(get_firestore),
     fb_service: FirebaseService = Depends(get_firebase_service) # Added
 ):
     """
@@ -261,7 +758,7 @@ async def mark_post_collected(
     """
     post_ref = db.collection('foodPosts').document(post_id)
     try:
-        post_doc = post_ref.get()
+        post_doc = await post_ref.get()
         if not post_doc.exists:
             raise HTTPException(status.HTTP_404_NOT_FOUND, "Food post not found.")
 
@@ -279,17 +776,33 @@ async def mark_post_collected(
         if post_data.get("status") != PostStatus.RESERVED:
             raise HTTPException(status.HTTP_400_BAD_REQUEST, "Only a 'Reserved' post can be 'Collected'.")
 
-        # Update post status
-        update_data = {"status": PostStatus.COLLECTED}
-        post_ref.update(update_data)
+        # Update post status, and mark the active reservation 'Completed' in the same commit
+        update_data = {
+            "status": PostStatus.COLLECTED,
+            "updated_at": datetime.datetime.now(datetime.timezone.utc)
+        }
+        batch = db.batch()
+        batch.update(post_ref, update_data, option=db.write_option(last_update_time=post_doc.update_time))
+        reservation_id = post_data.get("reservation_id")
+        if reservation_id:
+            # Reservations linked from the post always carry a snapshot
+            res_update = {"status": "Completed", **snapshot_updates(**update_data)}
+            batch.update(db.collection('reservations').document(reservation_id), res_update)
+        else:
+            # Posts reserved before reservation_id was stored: find the active reservation
+            res_query = db.collection('reservations').where("post_id", "==", post_id).where("status", "==", "Active")
+            res_docs = [doc async for doc in res_query.stream()]
+            if res_docs:
+                res_update = {"status": "Completed"}
+                if res_docs[0].to_dict().get("post_snapshot"):
+                    res_update.update(snapshot_updates(**update_data))
+                batch.update(res_docs[0].reference, res_update)
+        try:
+            await batch.commit()
+        except FailedPrecondition:
+            # Cancelled or released while we were checking it
+            raise HTTPException(status.HTTP_409_CONFLICT, "This post changed while it was being updated. Please try again.")
 
-        # Find the active reservation and mark it 'Completed'
-        res_query = db.collection('reservations').where("post_id", "==", post_id).where("status", "==", "Active")
-        res_docs = list(res_query.stream())
-        if res_docs:
-            res_doc_ref = res_docs[0].reference
-            res_doc_ref.update({"status": "Completed"})
-        
         # Prepare response
         post_data.update(update_data)
         post_data["post_id"] = post_id
@@ -298,7 +811,7 @@ async def mark_post_collected(
         if "donor_details" not in post_data:
              donor_id = post_data.get("donor_id")
              if donor_id:
-                donor_user = fb_service.get_user_by_uid(donor_id)
+                donor_user = await fb_service.get_user_by_uid(donor_id)
                 post_data["donor_details"] = UserPublic.model_validate(donor_user.model_dump()) if donor_user else None
         
         return FoodPostPublic.model_validate(post_data)
@@ -1,21 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from typing import List, Optional
-from google.cloud.firestore_v1.client import Client
-
-from app.schemas import ReservationPublic, UserInDB, FoodPostPublic, UserRole, UserPublic
-from app.config import get_db
-from app.dependencies import get_current_verified_user, get_firebase_service
+import asyncio
+import datetime
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud.firestore import AsyncClient
+
+from app.schemas import ReservationPublic, UserInDB, FoodPostPublic, PostStatus, UserRole, UserPublic
+from app.pagination import (
+    NEXT_PAGE_TOKEN_HEADER, MAX_PAGE_SIZE, InvalidPageToken,
+    apply_time_cursor, time_page_token
+)
+from app.dependencies import get_current_verified_user, get_firebase_service, get_firestore, get_notification_outbox
 from app.services.firebase_service import FirebaseService
+from app.services.notification_outbox import NotificationOutbox
+from app.services.reservations import (
+    POST_SNAPSHOT_FIELDS, post_from_snapshot, holds_post, add_release, next_in_line, notify_promoted,
+    promote_late_waiter, released_donor
+)
 
 router = APIRouter()
 
 @router.get("/me", response_model=List[ReservationPublic])
 async def get_my_reservations(
+    response: Response,
     current_user: UserInDB = Depends(get_current_verified_user),
-    db: Client = Depends(get_db),
-    fb_service: FirebaseService = Depends(get_firebase_service)
+    db: AsyncClient = Depends(get_firestore),
+    fb_service: FirebaseService = Depends(get_firebase_service),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of reservations to return."),
+    page_token: Optional[str] = Query(None, description=f"Cursor from the {NEXT_PAGE_TOKEN_HEADER} header of the previous page.")
 ):
-
+    """
+    Gets the current user's reservations (as Receiver or Donor), newest first.
+    Supports the same limit/page_token cursor as GET /posts.
+    """
     try:
         reservations_ref = db.collection('reservations')
         query = None
@@ -27,57 +44,150 @@ async def get_my_reservations(
         else:
             return [] # Admins see no reservations via this endpoint
 
+        query = apply_time_cursor(query, "timestamp", page_token, limit)
         my_reservations = []
 
-        post_cache: dict[str, Optional[FoodPostPublic]] = {}
-        user_cache: dict[str, Optional[UserPublic]] = {}
+        # 1. Collect reservations; posts come from each reservation's snapshot
+        reservations_data = []
+        legacy_post_ids = []
 
-        for doc in query.stream():
+        docs = [doc async for doc in query.stream()]
+        for doc in docs:
             res_data = doc.to_dict()
             if not res_data: # Safety check
                 continue
 
             res_data["reservation_id"] = doc.id
+            post_id = res_data.get("post_id")
+            res_data["post_details"] = post_from_snapshot(post_id, res_data.pop("post_snapshot", None)) if post_id else None
+            if post_id and res_data["post_details"] is None:
+                legacy_post_ids.append(post_id)
+            reservations_data.append(res_data)
+
+        # 2. Reservations made before snapshots were stored: read their posts in batches
+        posts_data = await fb_service.get_posts_by_ids(legacy_post_ids) if legacy_post_ids else {}
+
+        # 3. Hydrate every referenced user that was not snapshotted in one batched pass
+        user_ids = [
+            post_data.get("donor_id") for post_data in posts_data.values()
+            if post_data and "donor_details" not in post_data and isinstance(post_data.get("donor_id"), str)
+        ]
+        if current_user.role == UserRole.DONOR:
+            user_ids += [
+                r.get("receiver_id") for r in reservations_data
+                if not r.get("receiver_details") and isinstance(r.get("receiver_id"), str)
+            ]
+        users = await fb_service.get_users_by_uids(user_ids) if user_ids else {}
+
+        # 4. Assemble the response
+        post_cache: dict[str, Optional[FoodPostPublic]] = {}
+        for post_id, post_data in posts_data.items():
+            if not post_data:
+                post_cache[post_id] = None
+                continue
+            if "donor_details" not in post_data and isinstance(post_data.get("donor_id"), str):
+                post_data["donor_details"] = users.get(post_data["donor_id"])
+            post_cache[post_id] = FoodPostPublic.model_validate(post_data)
 
+        for res_data in reservations_data:
             post_id = res_data.get("post_id")
-            post_details: Optional[FoodPostPublic] = None
-            if post_id:
-                if post_id not in post_cache:
-                    post_ref = db.collection('foodPosts').document(post_id)
-                    post_doc = post_ref.get()
-                    if post_doc.exists:
-                        post_data = post_doc.to_dict()
-                        if post_data:
-                            post_data["post_id"] = post_doc.id
-
-                            donor_id = post_data.get("donor_id")
-                            
-                            if "donor_details" not in post_data and isinstance(donor_id, str):
-                                if donor_id not in user_cache:
-                                    donor = fb_service.get_user_by_uid(donor_id)
-                                    user_cache[donor_id] = UserPublic.model_validate(donor.model_dump()) if donor else None
-                                post_data["donor_details"] = user_cache[donor_id]
-
-                            post_cache[post_id] = FoodPostPublic.model_validate(post_data)
-                post_details = post_cache.get(post_id)
-            res_data["post_details"] = post_details
+            if res_data["post_details"] is None and post_id:
+                res_data["post_details"] = post_cache.get(post_id)
 
             if current_user.role == UserRole.DONOR:
                 receiver_id = res_data.get("receiver_id")
-                if isinstance(receiver_id, str):
-                    if receiver_id not in user_cache:
-                         receiver = fb_service.get_user_by_uid(receiver_id)
-                         user_cache[receiver_id] = UserPublic.model_validate(receiver.model_dump()) if receiver else None
-                    res_data["receiver_details"] = user_cache[receiver_id]
+                if not res_data.get("receiver_details") and isinstance(receiver_id, str):
+                    res_data["receiver_details"] = users.get(receiver_id)
+            else:
+                res_data.pop("receiver_details", None)
 
             my_reservations.append(ReservationPublic.model_validate(res_data))
 
-        my_reservations.sort(key=lambda r: r.timestamp, reverse=True)
+        if limit and len(docs) == limit:
+            last = docs[-1]
+            response.headers[NEXT_PAGE_TOKEN_HEADER] = time_page_token("timestamp", last.get("timestamp"), last.id)
+
         return my_reservations
 
+    except InvalidPageToken as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         print(f"Error fetching user's reservations: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching user's reservations: {e}"
-        )
\ No newline at end of file
+        )
+
+@router.put("/{reservation_id}/cancel", response_model=ReservationPublic)
+async def cancel_reservation(
+    reservation_id: str,
+    current_user: UserInDB = Depends(get_current_verified_user),
+    db: AsyncClient = Depends(get_firestore),
+    outbox: NotificationOutbox = Depends(get_notification_outbox)
+):
+    """
+    Cancels an active reservation and returns the post to the feed, or
+    passes it to the first receiver on its waitlist. Accessible by the
+    Receiver who made it or the Donor of the post. The post and the
+    reservations change in a single commit.
+    """
+    res_ref = db.collection('reservations').document(reservation_id)
+    try:
+        res_doc = await res_ref.get()
+        res_data = res_doc.to_dict() if res_doc.exists else None
+        if not res_data:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "Reservation not found.")
+
+        is_receiver = current_user.role == UserRole.RECEIVER and res_data.get("receiver_id") == current_user.user_id
+        is_donor = current_user.role == UserRole.DONOR and res_data.get("donor_id") == current_user.user_id
+        if not (is_receiver or is_donor):
+            raise HTTPException(status.HTTP_403_FORBIDDEN, "You are not authorized to cancel this reservation.")
+
+        if res_data.get("status") != "Active":
+            raise HTTPException(status.HTTP_409_CONFLICT, f"This reservation is already {res_data.get('status', 'closed').lower()}.")
+
+        post_id = res_data.get("post_id")
+        # The first receiver on the waitlist, if any, takes the post over in the same commit
+        post_doc, next_entry = await asyncio.gather(
+            db.collection('foodPosts').document(post_id).get(),
+            next_in_line(db, post_id)
+        )
+        post_data = post_doc.to_dict() if post_doc.exists else None
+        if not holds_post(reservation_id, res_data, post_data):
+            raise HTTPException(status.HTTP_409_CONFLICT, "This reservation no longer holds the post.")
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        reason = "receiver" if is_receiver else "donor"
+        batch = db.batch()
+        post_update = add_release(db, batch, post_doc, res_doc, reason, now, next_entry)
+        try:
+            await batch.commit()
+        except FailedPrecondition:
+            # Collected or released while we were checking it
+            raise HTTPException(status.HTTP_409_CONFLICT, "This reservation changed while it was being cancelled. Please try again.")
+        if post_update["status"] == PostStatus.RESERVED:
+            await notify_promoted(outbox, post_update["receiver_id"], post_id, post_data.get("title"))
+        elif post_update["status"] == PostStatus.AVAILABLE:
+            # Someone may have joined the waitlist after it was read above
+            await promote_late_waiter(db, outbox, post_id, released_donor(res_data, post_data), now)
+
+        # Prepare response
+        post_data.update(post_update)
+        snapshot = res_data.pop("post_snapshot", None)
+        if snapshot:
+            snapshot.update({k: v for k, v in post_update.items() if k in POST_SNAPSHOT_FIELDS})
+        res_data.update({
+            "reservation_id": reservation_id,
+            "status": "Cancelled",
+            "cancelled_at": now,
+            "cancel_reason": reason,
+            "post_details": post_from_snapshot(post_id, snapshot) or FoodPostPublic.model_validate({**post_data, "post_id": post_id}),
+        })
+        if not is_donor:
+            res_data.pop("receiver_details", None)
+        return ReservationPublic.model_validate(res_data)
+
+    except Exception as e:
+        if isinstance(e, HTTPException): raise e
+        print(f"Error cancelling reservation: {e}")
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, f"Error cancelling reservation: {e}")
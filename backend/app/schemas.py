@@ -15,6 +15,8 @@ class PostStatus(str, Enum):
     RESERVED = "Reserved"
     COLLECTED = "Collected"
     EXPIRED = "Expired"
+    GEOCODING = "Geocoding"  # Waiting for its address to be resolved
+    GEOCODE_FAILED = "GeocodeFailed"  # Address not found; the donor must correct it
 
 class VerificationStatus(str, Enum):
     PENDING = "Pending"
@@ -90,15 +92,22 @@ class FoodPostBase(BaseModel):
 class FoodPostCreate(FoodPostBase):
     pass
 
+class FoodPostAddressUpdate(BaseModel):
+    address: str = Field(..., min_length=1, description="Corrected pickup address.")
+
 class FoodPostInDB(FoodPostBase):
     post_id: str = Field(..., description="Unique ID of the post (document ID).")
     donor_id: str = Field(..., description="User ID of the donor.")
     status: PostStatus = Field(default=PostStatus.AVAILABLE, description="Current status of the post.")
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.now) # Corrected: default_factory
-    coordinates: Coordinates = Field(..., description="Geocoded location of the pickup address.")
+    coordinates: Optional[Coordinates] = Field(None, description="Geocoded location of the pickup address (None until geocoded).")
+    geohash: Optional[str] = Field(None, description="Geohash of the coordinates, used for radius queries.")
+    geocode_error: Optional[str] = Field(None, description="Why the address could not be geocoded, if it failed.")
 
     receiver_id: Optional[str] = Field(None, description="User ID of the receiver, if reserved.")
     reserved_at: Optional[datetime.datetime] = Field(None, description="Timestamp when the post was reserved.")
+    reservation_id: Optional[str] = Field(None, description="ID of the reservation holding the post, if reserved.")
+    updated_at: Optional[datetime.datetime] = Field(None, description="Timestamp of the last change to the post.")
     
     donor_details: Optional[UserPublic] = Field(None, description="Cached public details of the donor.")
 
@@ -108,6 +117,16 @@ class FoodPostPublic(FoodPostInDB):
     distance_km: Optional[float] = Field(None, description="Calculated distance from the user (if coords provided).")
     pass
 
+class PostTombstone(BaseModel):
+    post_id: str = Field(..., description="ID of the post that left the feed.")
+    status: PostStatus = Field(..., description="Status that removed it from the feed.")
+    updated_at: Optional[datetime.datetime] = Field(None, description="When the post changed.")
+
+class FoodPostDelta(BaseModel):
+    posts: List[FoodPostPublic] = Field(default_factory=list, description="Posts added to or changed in the feed.")
+    removed: List[PostTombstone] = Field(default_factory=list, description="Posts that are no longer available.")
+    server_time: datetime.datetime = Field(..., description="Pass as `since` on the next refresh.")
+
 #Reservation Models
 
 class Reservation(BaseModel):
@@ -117,6 +136,9 @@ class Reservation(BaseModel):
     donor_id: str
     timestamp: datetime.datetime = Field(default_factory=datetime.datetime.now) # Corrected: default_factory
     status: str = Field(default="Active") # 'Active', 'Completed', 'Cancelled'
+    hold_expires_at: Optional[datetime.datetime] = Field(None, description="When an uncollected reservation is released back to the feed.")
+    cancelled_at: Optional[datetime.datetime] = Field(None, description="When the reservation was cancelled or released.")
+    cancel_reason: Optional[str] = Field(None, description="'receiver', 'donor' or 'hold_expired'.")
     
     model_config = ConfigDict(extra='ignore')
 
@@ -125,6 +147,12 @@ class ReservationPublic(Reservation):
     post_details: Optional[FoodPostPublic] = Field(None, description="Details of the reserved post.")
     receiver_details: Optional[UserPublic] = Field(None, description="Public details of the receiver (for donors).")
 
+class WaitlistEntry(BaseModel):
+    post_id: str = Field(..., description="ID of the post being waited for.")
+    receiver_id: str = Field(..., description="User ID of the waiting receiver.")
+    joined_at: datetime.datetime = Field(..., description="When the receiver's reserve request arrived.")
+    position: int = Field(..., description="1-based place in line; 1 is promoted next.")
+
 # --- Payment Models ---
 
 class DonationRequest(BaseModel):
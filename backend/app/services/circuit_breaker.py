@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Fails fast while an upstream is degraded. After failure_threshold
+    consecutive failures the circuit opens and allow() returns False for
+    reset_timeout seconds; then a single trial call is let through
+    (half-open). Its success closes the circuit, its failure re-opens it.
+    A trial that ends without an outcome (cancelled) must call release();
+    one that never reports back is abandoned after reset_timeout, so the
+    circuit cannot stay half-open forever.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._trial_started_at: Optional[float] = None
+        self._times_opened = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self._reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """True if a call may go ahead. Counts the rejection otherwise."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and (not self._trial_in_flight
+                                       or self._clock() - self._trial_started_at >= self._reset_timeout):
+                self._trial_in_flight = True
+                self._trial_started_at = self._clock()
+                return True
+            self._rejected += 1
+            return False
+
+    def release(self) -> None:
+        """Ends an allowed call that has no outcome (e.g. it was cancelled), freeing the half-open trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == HALF_OPEN or self._consecutive_failures >= self._failure_threshold:
+                if state != OPEN:
+                    self._times_opened += 1
+                    print(f"Circuit '{self.name}' opened after {self._consecutive_failures} consecutive failures.")
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._consecutive_failures,
+                "times_opened": self._times_opened,
+                "rejected": self._rejected,
+            }
@@ -0,0 +1,250 @@
+import asyncio
+import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.api_core.exceptions import FailedPrecondition
+
+from app.config import settings
+from app.schemas import PostStatus
+from app.services.notification_outbox import NotificationOutbox
+from app.services.reservations import (
+    holds_post, add_release, next_in_line, notify_promoted, promote_late_waiter, released_donor
+)
+
+# Firestore limit for writes in a single batch; also the query page size
+SWEEP_BATCH_SIZE = 500
+
+# Each released hold writes the post and the reservation, plus a new
+# reservation and a waitlist delete when it passes to the next receiver
+HOLD_BATCH_SIZE = SWEEP_BATCH_SIZE // 4
+
+# Upper bound on pages per run so one huge backlog cannot monopolize a run
+MAX_PAGES_PER_SWEEP = 20
+
+
+class ExpirySweeper:
+    """
+    Flips 'Available' posts whose expiry has passed to 'Expired', so the
+    Available set (and every feed query and listener over it) only holds
+    live posts. Expired posts are read a page at a time, oldest expiry
+    first, and updated with one batched write per page.
+
+    Each run also releases reservations whose hold has run out without the
+    post being collected: the post goes back to the feed (or to the first
+    receiver on its waitlist) and the reservation is cancelled, all in the
+    same commit.
+
+    Runs periodically from the app lifespan via start(), or once from
+    scripts/sweep_expired_posts.py.
+    """
+
+    def __init__(self, db_factory: Callable[[], Any], outbox: NotificationOutbox,
+                 clock: Callable[[], datetime.datetime] = lambda: datetime.datetime.now(datetime.timezone.utc)):
+        self._db_factory = db_factory
+        self._outbox = outbox  # Receivers promoted off a waitlist are told through it
+        self._clock = clock
+        self._task: Optional[asyncio.Task] = None
+        self._interval_seconds: Optional[float] = None
+        self._runs = 0
+        self._swept_total = 0
+        self._last_run_at: Optional[datetime.datetime] = None
+        self._last_run_swept = 0
+        self._last_run_seconds: Optional[float] = None
+        self._last_lag_seconds: Optional[float] = None
+        self._max_lag_seconds = 0.0
+        self._released_total = 0
+        self._last_run_released = 0
+        self._errors = 0
+        self._error: Optional[str] = None
+
+    def expired_posts_query(self, db, now: datetime.datetime):
+        """Available posts past their expiry, oldest first (needs a status+expiry composite index)."""
+        return (
+            db.collection('foodPosts')
+            .where("status", "==", PostStatus.AVAILABLE)
+            .where("expiry", "<=", now)
+            .order_by("expiry")
+            .select(["expiry"])
+            .limit(SWEEP_BATCH_SIZE)
+        )
+
+    def expired_holds_query(self, db, now: datetime.datetime):
+        """Active reservations past their hold, oldest first (needs a status+hold_expires_at composite index)."""
+        return (
+            db.collection('reservations')
+            .where("status", "==", "Active")
+            .where("hold_expires_at", "<=", now)
+            .order_by("hold_expires_at")
+            .limit(HOLD_BATCH_SIZE)
+        )
+
+    async def _release_holds_page(self, db, now: datetime.datetime) -> Tuple[int, int]:
+        """Releases one page of expired holds. Returns (page size, holds released)."""
+        res_docs = [doc async for doc in self.expired_holds_query(db, now).stream()]
+        if not res_docs:
+            return 0, 0
+
+        post_ids = {doc.get("post_id") for doc in res_docs if doc.to_dict().get("post_id")}
+        posts_ref = db.collection('foodPosts')
+        post_docs = {doc.id: doc async for doc in db.get_all([posts_ref.document(pid) for pid in post_ids])}
+
+        held = []
+        stale = []
+        for res_doc in res_docs:
+            post_doc = post_docs.get(res_doc.to_dict().get("post_id"))
+            post_data = post_doc.to_dict() if post_doc is not None and post_doc.exists else None
+            if holds_post(res_doc.id, res_doc.to_dict(), post_data):
+                held.append((post_doc, res_doc))
+            else:
+                # The post moved on without this reservation; close it so it stops matching
+                stale.append(res_doc)
+
+        # Posts with a waitlist pass to the first receiver in line instead of the feed
+        heads = await asyncio.gather(*(next_in_line(db, post_doc.id) for post_doc, _ in held))
+        releases: List[Tuple[Any, Any, Any]] = [(post_doc, res_doc, head) for (post_doc, res_doc), head in zip(held, heads)]
+
+        post_updates = {}
+
+        def build_batch(items, stale_docs):
+            batch = db.batch()
+            for post_doc, res_doc, head in items:
+                post_updates[res_doc.id] = add_release(db, batch, post_doc, res_doc, "hold_expired", now, head)
+            for res_doc in stale_docs:
+                batch.update(res_doc.reference, {"status": "Cancelled", "cancelled_at": now, "cancel_reason": "hold_expired"})
+            return batch
+
+        try:
+            await build_batch(releases, stale).commit()
+            committed = releases
+        except FailedPrecondition:
+            # A post changed since it was read (e.g. just collected), which fails the
+            # whole batch; release one at a time so the rest still go through
+            committed = []
+            if stale:
+                await build_batch([], stale).commit()
+            for item in releases:
+                try:
+                    await build_batch([item], []).commit()
+                    committed.append(item)
+                except FailedPrecondition:
+                    continue
+
+        # Holds passed to the next receiver are announced to them; posts that went back to
+        # the feed may have gained a waiter since their waitlist was read
+        await asyncio.gather(*(
+            notify_promoted(self._outbox, head.id, post_doc.id, post_doc.to_dict().get("title"))
+            if post_updates[res_doc.id]["status"] == PostStatus.RESERVED
+            else promote_late_waiter(db, self._outbox, post_doc.id,
+                                     released_donor(res_doc.to_dict(), post_doc.to_dict()), now)
+            for post_doc, res_doc, head in committed
+            if post_updates[res_doc.id]["status"] != PostStatus.EXPIRED
+        ))
+        return len(res_docs), len(committed)
+
+    async def sweep_once(self, max_pages: int = MAX_PAGES_PER_SWEEP) -> int:
+        """Runs one sweep and returns the number of posts marked expired."""
+        started = self._clock()
+        swept = 0
+        released = 0
+        lag = None
+        try:
+            db = self._db_factory()
+            for _ in range(max_pages):
+                now = self._clock()
+                docs = [doc async for doc in self.expired_posts_query(db, now).stream()]
+                if not docs:
+                    break
+
+                if lag is None:
+                    # How long the oldest expired post had been waiting for a sweep
+                    lag = (now - docs[0].get("expiry")).total_seconds()
+
+                def build_batch(page):
+                    batch = db.batch()
+                    for doc in page:
+                        # Only expire the post as it was read; a reservation or edit since then wins
+                        batch.update(doc.reference, {"status": PostStatus.EXPIRED, "updated_at": now},
+                                     option=db.write_option(last_update_time=doc.update_time))
+                    return batch
+
+                try:
+                    await build_batch(docs).commit()
+                    swept += len(docs)
+                except FailedPrecondition:
+                    # One post changed since it was read, which fails the whole batch;
+                    # expire one at a time so the rest still go through
+                    for doc in docs:
+                        try:
+                            await build_batch([doc]).commit()
+                            swept += 1
+                        except FailedPrecondition:
+                            continue
+
+                # Swept posts no longer match, so the same query returns the next page
+                if len(docs) < SWEEP_BATCH_SIZE:
+                    break
+
+            for _ in range(max_pages if settings.RESERVATION_HOLD_SECONDS > 0 else 0):
+                page_size, page_released = await self._release_holds_page(db, self._clock())
+                released += page_released
+                if page_size < HOLD_BATCH_SIZE:
+                    break
+        except Exception as e:
+            self._errors += 1
+            self._error = str(e)
+            print(f"Error sweeping expired posts: {e}")
+        else:
+            self._error = None
+
+        self._runs += 1
+        self._swept_total += swept
+        self._released_total += released
+        self._last_run_at = started
+        self._last_run_swept = swept
+        self._last_run_released = released
+        self._last_run_seconds = (self._clock() - started).total_seconds()
+        self._last_lag_seconds = lag or 0.0
+        self._max_lag_seconds = max(self._max_lag_seconds, self._last_lag_seconds)
+        if swept:
+            print(f"Expiry sweep marked {swept} posts as expired (lag {self._last_lag_seconds:.0f}s).")
+        if released:
+            print(f"Expiry sweep released {released} uncollected reservations.")
+        return swept
+
+    async def _run(self, interval_seconds: float) -> None:
+        while True:
+            await self.sweep_once()
+            await asyncio.sleep(interval_seconds)
+
+    def start(self, interval_seconds: float) -> None:
+        """Starts sweeping every interval_seconds on the running event loop."""
+        if self._task is not None:
+            return
+        self._interval_seconds = interval_seconds
+        self._task = asyncio.create_task(self._run(interval_seconds))
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "interval_seconds": self._interval_seconds,
+            "runs": self._runs,
+            "swept_total": self._swept_total,
+            "last_run_at": self._last_run_at.isoformat() if self._last_run_at else None,
+            "last_run_swept": self._last_run_swept,
+            "released_total": self._released_total,
+            "last_run_released": self._last_run_released,
+            "last_run_seconds": self._last_run_seconds,
+            "last_lag_seconds": self._last_lag_seconds,
+            "max_lag_seconds": self._max_lag_seconds,
+            "errors": self._errors,
+            "error": self._error,
+        }
@@ -0,0 +1,178 @@
+import datetime
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.schemas import PostStatus
+
+# Minimum delay between attempts to re-attach a dropped listener
+RESTART_BACKOFF_SECONDS = 30.0
+
+
+class FeedCache:
+    """
+    In-process materialized view of the 'Available' foodPosts, kept current by
+    a Firestore on_snapshot listener. Requests read from memory instead of
+    querying Firestore; if the listener is not running, is_healthy() is False
+    and callers should fall back to the direct query.
+
+    The listener source is any object with an on_snapshot(callback) method
+    returning a handle with unsubscribe() - a Firestore Query in production,
+    or an in-memory stand-in in tests.
+
+    Other components can reuse the same listener through add_change_listener();
+    they are told about every post that enters, changes in or leaves the
+    feed after the initial snapshot.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._posts: Dict[str, Dict[str, Any]] = {}
+        self._source = None
+        self._watch = None
+        self._ready = False
+        self._last_snapshot_at: Optional[float] = None
+        self._last_read_time: Optional[datetime.datetime] = None
+        self._last_start_attempt: Optional[float] = None
+        self._snapshots_applied = 0
+        self._restarts = 0
+        self._fallbacks = 0
+        self._error: Optional[str] = None
+        self._change_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+    @staticmethod
+    def available_posts_query(db):
+        """The Firestore query mirrored by the cache."""
+        return db.collection('foodPosts').where("status", "==", PostStatus.AVAILABLE)
+
+    @property
+    def enabled(self) -> bool:
+        return self._source is not None
+
+    def add_change_listener(self, callback: Callable[[str, Dict[str, Any]], None]) -> None:
+        """
+        Registers callback(change_type, post) for incremental changes, where
+        change_type is "ADDED", "MODIFIED" or "REMOVED" and post is the
+        document data with post_id (its last known state for REMOVED).
+        Callbacks run on the Firestore watch thread and must not block.
+        """
+        self._change_listeners.append(callback)
+
+    def start(self, source) -> None:
+        """Attaches the snapshot listener. The first snapshot marks the cache ready."""
+        self._source = source
+        self._attach()
+
+    def stop(self) -> None:
+        """Detaches the listener and drops the cached posts."""
+        watch, self._watch = self._watch, None
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                print(f"Error stopping feed cache listener: {e}")
+        with self._lock:
+            self._posts.clear()
+            self._ready = False
+
+    def _attach(self) -> None:
+        self._last_start_attempt = self._clock()
+        try:
+            self._watch = self._source.on_snapshot(self._on_snapshot)
+            self._error = None
+        except Exception as e:
+            self._watch = None
+            self._error = str(e)
+            print(f"Error starting feed cache listener: {e}")
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        """Listener callback (runs on the Firestore watch thread)."""
+        applied = []
+        with self._lock:
+            # The first snapshot after (re)attaching replays the whole feed; it is not news
+            initial = not self._ready
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    post_data = self._posts.pop(doc.id, None)
+                    if post_data is not None:
+                        applied.append(("REMOVED", post_data))
+                    continue
+
+                post_data = doc.to_dict()
+                if post_data:
+                    post_data["post_id"] = doc.id
+                    self._posts[doc.id] = post_data
+                    applied.append((change.type.name, post_data))
+                else:
+                    self._posts.pop(doc.id, None)
+
+            self._ready = True
+            self._last_snapshot_at = self._clock()
+            self._last_read_time = read_time
+            self._snapshots_applied += 1
+
+        if initial:
+            return
+        for change_type, post_data in applied:
+            for callback in self._change_listeners:
+                try:
+                    callback(change_type, dict(post_data))
+                except Exception as e:
+                    print(f"Error in feed cache change listener: {e}")
+
+    def _listener_active(self) -> bool:
+        if self._watch is None:
+            return False
+        # google.cloud.firestore Watch exposes is_active; stand-ins may not
+        return bool(getattr(self._watch, "is_active", True))
+
+    def is_healthy(self) -> bool:
+        """
+        True if the listener is attached and has delivered its initial snapshot.
+        A dropped listener is re-attached here, at most once per backoff period.
+        """
+        if self._source is None:
+            return False
+
+        if not self._listener_active():
+            now = self._clock()
+            if self._last_start_attempt is None or now - self._last_start_attempt >= RESTART_BACKOFF_SECONDS:
+                print("Feed cache listener is not active. Restarting it.")
+                self.stop()
+                self._restarts += 1
+                self._attach()
+            return False
+
+        return self._ready
+
+    def record_fallback(self) -> None:
+        """Counts a request that had to be served by the direct Firestore query."""
+        self._fallbacks += 1
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Returns shallow copies of all cached posts (callers may mutate them)."""
+        with self._lock:
+            return [dict(post) for post in self._posts.values()]
+
+    def staleness_seconds(self) -> Optional[float]:
+        """Seconds since the listener last delivered a snapshot (None before the first one)."""
+        if self._last_snapshot_at is None:
+            return None
+        return self._clock() - self._last_snapshot_at
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._posts)
+        return {
+            "enabled": self.enabled,
+            "healthy": self._ready and self._listener_active(),
+            "size": size,
+            "staleness_seconds": self.staleness_seconds(),
+            "last_read_time": self._last_read_time.isoformat() if self._last_read_time else None,
+            "snapshots_applied": self._snapshots_applied,
+            "restarts": self._restarts,
+            "fallbacks": self._fallbacks,
+            "error": self._error,
+        }
@@ -1,21 +1,42 @@
 from firebase_admin import auth, firestore, messaging
-from app.config import get_db, get_auth
-from app.schemas import UserCreate, UserInDB, VerificationStatus, Coordinates
+from google.cloud.firestore import AsyncClient
+from app.config import get_async_db, get_auth
+from app.schemas import UserCreate, UserInDB, UserPublic, VerificationStatus, Coordinates
+from app.services import geohash
 from app.services.google_maps import GoogleMapsService
+from app.services.push_tokens import MULTICAST_CHUNK_SIZE, PushTokenPruner
+from app.services.user_cache import UserCache
 from typing import Optional, List, Dict, Any
+import asyncio
 import datetime
 
+# Documents fetched per get_all round trip
+GET_ALL_CHUNK_SIZE = 100
+
+# Only the fields needed to build a UserPublic are read for batched lookups
+USER_PUBLIC_FIELDS = [name for name in UserPublic.model_fields if name != "user_id"]
+
 class FirebaseService:
+    """
+    Data-access layer for Firestore, Firebase Auth and FCM.
+    Firestore calls go through the AsyncClient; Firebase Auth and FCM have no
+    async SDK, so those calls are offloaded to a worker thread.
+    """
 
-    def __init__(self):
-        self.db = get_db()
+    def __init__(self, db: Optional[AsyncClient], maps_service: GoogleMapsService,
+                 user_cache: Optional[UserCache] = None, pruner: Optional[PushTokenPruner] = None):
+        self.db = db or get_async_db()
         self.auth = get_auth()
-        self.maps_service = GoogleMapsService()
+        self.maps_service = maps_service
+        # Profiles cached for the auth dependencies; profile writes invalidate them (disabled if not given)
+        self.user_cache = user_cache or UserCache(ttl_seconds=0, max_entries=0)
+        self.pruner = pruner or PushTokenPruner(lambda: self.db, self.user_cache)
 
-    def create_user_in_auth(self, user_create: UserCreate) -> auth.UserRecord:
+    async def create_user_in_auth(self, user_create: UserCreate) -> auth.UserRecord:
         """Creates a new user in Firebase Authentication."""
         try:
-            user_record = self.auth.create_user(
+            user_record = await asyncio.to_thread(
+                self.auth.create_user,
                 email=user_create.email,
                 password=user_create.password,
                 display_name=user_create.name
@@ -27,7 +48,7 @@ class FirebaseService:
             print(f"Error creating user in auth: {e}")
             raise
 
-    def create_user_in_firestore(self, user_id: str, user_data: dict) -> None:
+    async def create_user_in_firestore(self, user_id: str, user_data: dict) -> None:
         """Creates a user document in the 'users' collection in Firestore."""
         try:
             user_ref = self.db.collection('users').document(user_id)
@@ -35,26 +56,31 @@ class FirebaseService:
             # Geocode address if provided
             address = user_data.get("address")
             if address: # Check if address is not None or empty
-                coordinates = self.maps_service.get_coordinates_for_address(address)
+                coordinates = await self.maps_service.get_coordinates_for_address(address)
                 if coordinates:
                     user_data["coordinates"] = coordinates.model_dump()
+                    # Indexes receivers for new-post notifications by proximity
+                    user_data["geohash"] = geohash.encode(coordinates.lat, coordinates.lng)
                 else:
                     user_data["coordinates"] = None
+                    user_data["geohash"] = None
                     print(f"Warning: Could not geocode address '{address}' for user {user_id}")
             else:
                  user_data["coordinates"] = None
+                 user_data["geohash"] = None
                  print(f"Warning: No address provided for user {user_id}. Skipping geocoding.")
 
-            user_ref.set(user_data)
+            await user_ref.set(user_data)
+            self.user_cache.invalidate(user_id)
         except Exception as e:
             print(f"Error creating user in firestore: {e}")
             raise
 
-    def get_user_by_uid(self, user_id: str) -> Optional[UserInDB]:
+    async def get_user_by_uid(self, user_id: str) -> Optional[UserInDB]:
         """Retrieves a user document from Firestore by their UID."""
         try:
             user_ref = self.db.collection('users').document(user_id)
-            doc = user_ref.get()
+            doc = await user_ref.get()
             if doc.exists:
                 user_data = doc.to_dict()
                 if user_data: # Ensure data is not empty
@@ -68,10 +94,64 @@ class FirebaseService:
             print(f"Error getting user by UID {user_id}: {e}")
             return None
 
-    def get_user_by_email(self, email: str) -> Optional[auth.UserRecord]:
+    async def get_users_by_uids(self, user_ids: List[str]) -> Dict[str, Optional[UserPublic]]:
+        """
+        Retrieves public profiles for many users with batched get_all calls
+        (one round trip per chunk) and a field mask. Missing or invalid users
+        map to None.
+        """
+        unique_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+        users: Dict[str, Optional[UserPublic]] = {uid: None for uid in unique_ids}
+        users_ref = self.db.collection('users')
+
+        for start in range(0, len(unique_ids), GET_ALL_CHUNK_SIZE):
+            chunk = unique_ids[start:start + GET_ALL_CHUNK_SIZE]
+            refs = [users_ref.document(uid) for uid in chunk]
+            try:
+                async for doc in self.db.get_all(refs, field_paths=USER_PUBLIC_FIELDS):
+                    if not doc.exists:
+                        continue
+                    user_data = doc.to_dict()
+                    if not user_data:
+                        continue
+                    user_data['user_id'] = doc.id
+                    try:
+                        users[doc.id] = UserPublic.model_validate(user_data)
+                    except Exception as e:
+                        print(f"Error validating user {doc.id}: {e}")
+            except Exception as e:
+                print(f"Error batch-fetching users {chunk}: {e}")
+
+        return users
+
+    async def get_posts_by_ids(self, post_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Retrieves many food post documents with batched get_all calls (one
+        round trip per chunk). Each found post includes its post_id; missing
+        posts map to None.
+        """
+        unique_ids = list(dict.fromkeys(pid for pid in post_ids if pid))
+        posts: Dict[str, Optional[Dict[str, Any]]] = {pid: None for pid in unique_ids}
+        posts_ref = self.db.collection('foodPosts')
+
+        for start in range(0, len(unique_ids), GET_ALL_CHUNK_SIZE):
+            chunk = unique_ids[start:start + GET_ALL_CHUNK_SIZE]
+            refs = [posts_ref.document(pid) for pid in chunk]
+            try:
+                async for doc in self.db.get_all(refs):
+                    post_data = doc.to_dict() if doc.exists else None
+                    if post_data:
+                        post_data['post_id'] = doc.id
+                        posts[doc.id] = post_data
+            except Exception as e:
+                print(f"Error batch-fetching posts {chunk}: {e}")
+
+        return posts
+
+    async def get_user_by_email(self, email: str) -> Optional[auth.UserRecord]:
         """Retrieves a user record from Firebase Auth by email."""
         try:
-            user_record = self.auth.get_user_by_email(email)
+            user_record = await asyncio.to_thread(self.auth.get_user_by_email, email)
             return user_record
         except auth.UserNotFoundError:
             return None
@@ -79,35 +159,40 @@ class FirebaseService:
             print(f"Error getting user by email {email}: {e}")
             return None
 
-    def verify_firebase_token(self, id_token: str) -> dict:
-        """Verifies a Firebase ID token and returns its decoded payload."""
+    async def verify_firebase_token(self, id_token: str, check_revoked: bool = False) -> dict:
+        """
+        Verifies a Firebase ID token and returns its decoded payload.
+        With check_revoked, also rejects revoked tokens and disabled users.
+        """
         try:
-            decoded_token = self.auth.verify_id_token(id_token)
+            # May fetch Google's public certificates, so keep it off the event loop
+            decoded_token = await asyncio.to_thread(self.auth.verify_id_token, id_token, check_revoked=check_revoked)
             return decoded_token
-        except auth.InvalidIdTokenError as e:
+        except (auth.InvalidIdTokenError, auth.UserDisabledError) as e:
             raise ValueError(f"Invalid ID Token: {e}")
         except Exception as e:
             print(f"Error verifying Firebase token: {e}")
             raise
 
-    def update_user_fcm_token(self, user_id: str, fcm_token: str) -> bool:
+    async def update_user_fcm_token(self, user_id: str, fcm_token: str) -> bool:
         """Updates or clears a user's FCM token in Firestore."""
         try:
             user_ref = self.db.collection('users').document(user_id)
-            user_ref.update({"fcm_token": fcm_token})
+            await user_ref.update({"fcm_token": fcm_token})
+            self.user_cache.invalidate(user_id)
             return True
         except Exception as e:
             print(f"Error updating FCM token for user {user_id}: {e}")
             return False
 
-    def get_pending_users(self) -> List[UserInDB]:
+    async def get_pending_users(self) -> List[UserInDB]:
         """Retrieves all users with a 'Pending' verification status."""
         try:
             users_ref = self.db.collection('users')
             query = users_ref.where("verification_status", "==", VerificationStatus.PENDING)
 
             pending_users = []
-            for doc in query.stream():
+            async for doc in query.stream():
                 user_data = doc.to_dict()
                 if user_data: # Safety check
                     user_data['user_id'] = doc.id
@@ -117,11 +202,11 @@ class FirebaseService:
             print(f"Error fetching pending users: {e}")
             return []
 
-    def update_user_verification_status(self, user_id: str, status: VerificationStatus, reason: Optional[str] = None) -> Optional[UserInDB]:
+    async def update_user_verification_status(self, user_id: str, status: VerificationStatus, reason: Optional[str] = None) -> Optional[UserInDB]:
         """Updates a user's verification status and rejection reason."""
         try:
             user_ref = self.db.collection('users').document(user_id)
-            doc = user_ref.get()
+            doc = await user_ref.get()
             if not doc.exists:
                 return None
 
@@ -132,15 +217,19 @@ class FirebaseService:
                 # Clear the reason if status is not 'Rejected'
                 update_data["verification_rejection_reason"] = None 
 
-            user_ref.update(update_data)
+            await user_ref.update(update_data)
+            self.user_cache.invalidate(user_id)
+            generation = self.user_cache.generation(user_id)
 
             # Return the updated user data
-            updated_doc = user_ref.get()
+            updated_doc = await user_ref.get()
             if updated_doc.exists:
                 user_data = updated_doc.to_dict()
                 if user_data:
                     user_data['user_id'] = updated_doc.id
-                    return UserInDB.model_validate(user_data)
+                    updated_user = UserInDB.model_validate(user_data)
+                    self.user_cache.put(updated_user, generation)  # Write-through: the next request sees the new status
+                    return updated_user
             return None
 
         except Exception as e:
@@ -148,7 +237,7 @@ class FirebaseService:
             return None
             
     # --- ADDED METHOD ---
-    def log_payment(self, payment_intent: Dict[str, Any]) -> None:
+    async def log_payment(self, payment_intent: Dict[str, Any]) -> None:
         """Logs a successful Stripe payment_intent to the 'donations' collection."""
         try:
             payment_id = payment_intent.get("id")
@@ -174,7 +263,7 @@ class FirebaseService:
                 "full_payment_intent_json": payment_intent # Store the whole object for auditing
             }
             
-            donation_ref.set(donation_data)
+            await donation_ref.set(donation_data)
             print(f"Successfully logged donation {payment_id}")
             
         except Exception as e:
@@ -183,24 +272,29 @@ class FirebaseService:
             pass
 
 
-    def get_user_fcm_tokens(self, user_ids: List[str]) -> List[str]:
-        """Retrieves a list of FCM tokens for a given list of user IDs."""
+    async def get_user_fcm_tokens(self, user_ids: List[str]) -> List[str]:
+        """
+        Retrieves the unique FCM tokens of the given users with batched
+        get_all calls that only read the fcm_token field.
+        """
+        unique_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
         tokens = []
         users_ref = self.db.collection('users')
 
-        for user_id in user_ids:
+        for start in range(0, len(unique_ids), GET_ALL_CHUNK_SIZE):
+            chunk = unique_ids[start:start + GET_ALL_CHUNK_SIZE]
+            refs = [users_ref.document(uid) for uid in chunk]
             try:
-                doc = users_ref.document(user_id).get()
-                if doc.exists:
-                    user_data = doc.to_dict()
+                async for doc in self.db.get_all(refs, field_paths=["fcm_token"]):
+                    user_data = doc.to_dict() if doc.exists else None
                     if user_data and user_data.get("fcm_token"):
                         tokens.append(user_data["fcm_token"])
             except Exception as e:
-                print(f"Error fetching fcm_token for user {user_id}: {e}")
-        return list(set(tokens)) # Return unique tokens
+                print(f"Error batch-fetching fcm_tokens for users {chunk}: {e}")
+        return list(dict.fromkeys(tokens)) # Return unique tokens
 
-    def send_push_notification(self, title: str, body: str, fcm_token: str):
-        """Sends a single push notification to a specific device token."""
+    async def send_push_notification(self, title: str, body: str, fcm_token: str):
+        """Sends a single push notification to a specific device token. A dead token is cleared from its user."""
         message = messaging.Message(
             notification=messaging.Notification(
                 title=title,
@@ -209,36 +303,42 @@ class FirebaseService:
             token=fcm_token,
         )
         try:
-            response = messaging.send(message)
+            response = await asyncio.to_thread(messaging.send, message)
             print(f"Successfully sent message: {response}")
+            await self.pruner.process_result(fcm_token, None)
             return response
         except Exception as e:
             print(f"Error sending push notification: {e}")
+            await self.pruner.process_result(fcm_token, e)
             return None
 
-    def send_multicast_push_notification(self, title: str, body: str, tokens: List[str]):
-        """Sends a push notification to multiple device tokens."""
+    async def send_multicast_push_notification(self, title: str, body: str, tokens: List[str]):
+        """
+        Sends a push notification to multiple device tokens, in chunks of
+        MULTICAST_CHUNK_SIZE. Tokens FCM reports as dead are cleared from
+        their users. Returns the number of successful sends.
+        """
         if not tokens:
             print("No tokens provided for multicast message.")
             return None
-            
-        unique_tokens = list(set(tokens)) # Ensure tokens are unique
 
-        message = messaging.MulticastMessage(
-            notification=messaging.Notification(
-                title=title,
-                body=body,
-            ),
-            tokens=unique_tokens,
-        )
-        try:
-            response = messaging.send_multicast(message)
-            print(f"Successfully sent multicast message: {response.success_count} successes, {response.failure_count} failures.")
-            if response.failure_count > 0:
-                for i, send_response in enumerate(response.responses):
-                    if not send_response.success:
-                        print(f"Failed to send to token {unique_tokens[i]}: {send_response.exception}")
-            return response
-        except Exception as e:
-            print(f"Error sending multicast push notification: {e}")
-            return None
\ No newline at end of file
+        unique_tokens = list(dict.fromkeys(tokens)) # Ensure tokens are unique
+        success_count = 0
+
+        for start in range(0, len(unique_tokens), MULTICAST_CHUNK_SIZE):
+            chunk = unique_tokens[start:start + MULTICAST_CHUNK_SIZE]
+            message = messaging.MulticastMessage(
+                notification=messaging.Notification(
+                    title=title,
+                    body=body,
+                ),
+                tokens=chunk,
+            )
+            try:
+                response = await asyncio.to_thread(messaging.send_each_for_multicast, message)
+                print(f"Successfully sent multicast message: {response.success_count} successes, {response.failure_count} failures.")
+                success_count += response.success_count
+                await self.pruner.process_response(chunk, response)
+            except Exception as e:
+                print(f"Error sending multicast push notification: {e}")
+        return success_count
@@ -0,0 +1,182 @@
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.schemas import Coordinates
+
+_WHITESPACE = re.compile(r"\s+")
+_SEPARATOR_SPACING = re.compile(r"\s*([,;])\s*")
+
+
+def normalize_address(address: str) -> str:
+    """
+    Cache key for an address: Unicode-normalized, case-folded, whitespace
+    collapsed and separators tidied, so "123  Pretorius St ,Pretoria." and
+    "123 pretorius st, pretoria" share an entry.
+    """
+    key = unicodedata.normalize("NFKC", address).casefold()
+    key = _WHITESPACE.sub(" ", key)
+    key = _SEPARATOR_SPACING.sub(r"\1 ", key)
+    return key.strip(" ,;.")
+
+
+class GeocodeCache:
+    """
+    Two-tier cache of geocoding results: an in-memory LRU in front of a
+    SQLite file, so results survive restarts and are shared by workers on
+    the same host. Failed lookups (no results) are cached too, for a shorter
+    TTL, so a bad address does not hit the API on every retry.
+
+    Lookups return (hit, coordinates): (True, None) is a cached failure.
+    Memory hits are answered inline; SQLite reads and commits (which wait on
+    fsync) run in a worker thread under their own lock, so the event loop
+    never waits on the disk.
+    """
+
+    def __init__(self, path: Optional[str], max_entries: int, ttl_seconds: float,
+                 negative_ttl_seconds: float, clock: Callable[[], float] = time.time):
+        self._path = path
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._negative_ttl_seconds = negative_ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()  # Memory tier and counters; never held across disk I/O
+        self._disk_lock = threading.Lock()  # The SQLite connection
+        # key -> (lat, lng, expires_at); lat/lng are None for a cached failure
+        self._memory: "OrderedDict[str, Tuple[Optional[float], Optional[float], float]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_error: Optional[str] = None
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._negative_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+    @property
+    def _has_disk(self) -> bool:
+        return bool(self._path) and self._disk_error is None
+
+    def _disk(self) -> Optional[sqlite3.Connection]:
+        """Opens the SQLite store on first use (call with _disk_lock held). Without it the cache is memory-only."""
+        if self._conn is None and self._path and self._disk_error is None:
+            try:
+                conn = sqlite3.connect(self._path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS geocodes ("
+                    "key TEXT PRIMARY KEY, lat REAL, lng REAL, expires_at REAL NOT NULL)"
+                )
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                self._disk_error = str(e)
+                print(f"Error opening geocode cache at '{self._path}': {e}. Using memory only.")
+        return self._conn
+
+    def _remember(self, key: str, entry: Tuple[Optional[float], Optional[float], float]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def _hit(self, entry) -> Tuple[bool, Optional[Coordinates]]:
+        lat, lng, _ = entry
+        if lat is None or lng is None:
+            self._negative_hits += 1
+            return True, None
+        return True, Coordinates(lat=lat, lng=lng)
+
+    async def lookup(self, address: str) -> Tuple[bool, Optional[Coordinates]]:
+        key = normalize_address(address)
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[2] > now:
+                    self._memory.move_to_end(key)
+                    self._memory_hits += 1
+                    return self._hit(entry)
+                del self._memory[key]
+
+        row = await asyncio.to_thread(self._read_disk, key) if self._has_disk else None
+        with self._lock:
+            if row is not None and row[2] > now:
+                self._remember(key, row)
+                self._disk_hits += 1
+                return self._hit(row)
+            self._misses += 1
+            return False, None
+
+    async def store(self, address: str, coordinates: Optional[Coordinates]) -> None:
+        """Caches a result; None records a failed lookup with the negative TTL."""
+        key = normalize_address(address)
+        if coordinates is None:
+            entry = (None, None, self._clock() + self._negative_ttl_seconds)
+        else:
+            entry = (coordinates.lat, coordinates.lng, self._clock() + self._ttl_seconds)
+
+        with self._lock:
+            self._remember(key, entry)
+            self._stores += 1
+        if self._has_disk:
+            await asyncio.to_thread(self._write_disk, key, entry)
+
+    def _read_disk(self, key: str) -> Optional[Tuple[Optional[float], Optional[float], float]]:
+        with self._disk_lock:
+            conn = self._disk()
+            if conn is None:
+                return None
+            try:
+                return conn.execute("SELECT lat, lng, expires_at FROM geocodes WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading geocode cache: {e}")
+                return None
+
+    def _write_disk(self, key: str, entry: Tuple[Optional[float], Optional[float], float]) -> None:
+        with self._disk_lock:
+            conn = self._disk()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO geocodes (key, lat, lng, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, *entry),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing geocode cache: {e}")
+
+    def purge_expired(self) -> int:
+        """Deletes expired rows from the SQLite store. Returns the number removed."""
+        with self._disk_lock:
+            conn = self._disk()
+            if conn is None:
+                return 0
+            cursor = conn.execute("DELETE FROM geocodes WHERE expires_at <= ?", (self._clock(),))
+            conn.commit()
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._memory)
+        lookups = self._memory_hits + self._disk_hits + self._misses
+        return {
+            "path": self._path,
+            "memory_entries": size,
+            "memory_hits": self._memory_hits,
+            "disk_hits": self._disk_hits,
+            "negative_hits": self._negative_hits,
+            "misses": self._misses,
+            "hit_ratio": (self._memory_hits + self._disk_hits) / lookups if lookups else None,
+            "stores": self._stores,
+            "evictions": self._evictions,
+            "disk_error": self._disk_error,
+        }
+
@@ -0,0 +1,158 @@
+import asyncio
+import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.config import settings
+from app.schemas import PostStatus
+from app.services import geohash
+from app.services.google_maps import GoogleMapsService
+from app.services.post_notifier import NewPostNotifier
+
+# Shown to the donor on posts whose address could not be found
+ADDRESS_NOT_FOUND_MESSAGE = "We could not find this address. Please correct it and resubmit."
+SERVICE_UNAVAILABLE_MESSAGE = "The address could not be checked right now. Please resubmit it."
+
+
+class GeocodingWorker:
+    """
+    Resolves addresses for posts created in the 'Geocoding' state, off the
+    request path. A pool of tasks drains an in-process queue; a resolved post
+    gets its coordinates and geohash and becomes 'Available', and nearby
+    receivers are told about it. An address the
+    API cannot find marks the post 'GeocodeFailed' with a message for the
+    donor. Upstream outages are retried later instead of blaming the address.
+
+    The queue is in memory, so start() re-queues any posts still waiting in
+    Firestore from before a restart.
+    """
+
+    def __init__(self, db_factory: Callable[[], Any], maps_service: GoogleMapsService, notifier: NewPostNotifier,
+                 clock: Callable[[], datetime.datetime] = lambda: datetime.datetime.now(datetime.timezone.utc)):
+        self._db_factory = db_factory
+        self._maps_service = maps_service
+        self._notifier = notifier
+        self._clock = clock
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retry_tasks: Set[asyncio.Task] = set()
+        self._resolved = 0
+        self._failed = 0
+        self._retried = 0
+        self._errors = 0
+        self._latencies: List[float] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, workers: int) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(workers)]
+        self._tasks.append(asyncio.create_task(self._recover()))
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks + list(self._retry_tasks), []
+        self._retry_tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queue = None
+
+    def enqueue(self, post_id: str, address: str, attempt: int = 0) -> bool:
+        """Queues a post for geocoding. Returns False if the worker is not running."""
+        if self._queue is None:
+            return False
+        self._queue.put_nowait((post_id, address, attempt, self._clock()))
+        return True
+
+    async def _recover(self) -> None:
+        try:
+            db = self._db_factory()
+            query = db.collection('foodPosts').where("status", "==", PostStatus.GEOCODING).select(["address"])
+            recovered = 0
+            async for doc in query.stream():
+                self.enqueue(doc.id, doc.get("address"))
+                recovered += 1
+            if recovered:
+                print(f"Re-queued {recovered} posts waiting for geocoding.")
+        except Exception as e:
+            self._errors += 1
+            print(f"Error re-queuing posts waiting for geocoding: {e}")
+
+    async def _retry_later(self, post_id: str, address: str, attempt: int) -> None:
+        await asyncio.sleep(settings.GEOCODING_RETRY_DELAY_SECONDS * (attempt + 1))
+        self.enqueue(post_id, address, attempt + 1)
+
+    async def _work(self) -> None:
+        while True:
+            post_id, address, attempt, queued_at = await self._queue.get()
+            try:
+                await self.process(post_id, address, attempt)
+                self._latencies.append((self._clock() - queued_at).total_seconds())
+                del self._latencies[:-1000]
+            except Exception as e:
+                self._errors += 1
+                print(f"Error geocoding post {post_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def process(self, post_id: str, address: str, attempt: int = 0) -> Optional[PostStatus]:
+        """Geocodes one post and records the outcome. Returns the post's new status (None if retried or skipped)."""
+        db = self._db_factory()
+        post_ref = db.collection('foodPosts').document(post_id)
+
+        coordinates = await self._maps_service.get_coordinates_for_address(address)
+        now = self._clock()
+
+        if coordinates is None:
+            # A cached miss means Google answered that the address does not exist
+            address_not_found, _ = await self._maps_service.cache.lookup(address)
+            if not address_not_found and attempt < settings.GEOCODING_MAX_ATTEMPTS - 1:
+                self._retried += 1
+                task = asyncio.create_task(self._retry_later(post_id, address, attempt))
+                self._retry_tasks.add(task)
+                task.add_done_callback(self._retry_tasks.discard)
+                return None
+            update = {
+                "status": PostStatus.GEOCODE_FAILED,
+                "geocode_error": ADDRESS_NOT_FOUND_MESSAGE if address_not_found else SERVICE_UNAVAILABLE_MESSAGE,
+                "updated_at": now,
+            }
+        else:
+            update = {
+                "status": PostStatus.AVAILABLE,
+                "coordinates": coordinates.model_dump(),
+                "geohash": geohash.encode(coordinates.lat, coordinates.lng),
+                "geocode_error": None,
+                "updated_at": now,
+            }
+
+        # Skip posts that were deleted, or whose address was changed while this lookup ran
+        post_doc = await post_ref.get(field_paths=["status", "address", "title", "donor_id"])
+        post_data = post_doc.to_dict() if post_doc.exists else None
+        if not post_data or post_data.get("status") != PostStatus.GEOCODING or post_data.get("address") != address:
+            return None
+
+        await post_ref.update(update)
+        if update["status"] == PostStatus.AVAILABLE:
+            self._resolved += 1
+            self._notifier.enqueue(post_id, post_data.get("title"), update["coordinates"], post_data.get("donor_id"))
+        else:
+            self._failed += 1
+        return update["status"]
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "waiting_to_retry": len(self._retry_tasks),
+            "resolved": self._resolved,
+            "failed": self._failed,
+            "retried": self._retried,
+            "errors": self._errors,
+            "p50_seconds": latencies[len(latencies) // 2] if latencies else None,
+            "max_seconds": latencies[-1] if latencies else None,
+        }
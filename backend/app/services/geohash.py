@@ -0,0 +1,146 @@
+import math
+from typing import List, Optional, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {char: i for i, char in enumerate(_BASE32)}
+
+# Full precision stored on documents (~4.8m x 4.8m cells). Any shorter
+# prefix of this string is the geohash of the same point at a lower precision.
+GEOHASH_PRECISION = 9
+
+# Upper bound used for prefix range queries ('~' sorts after every base32 char).
+PREFIX_RANGE_END = "~"
+
+_KM_PER_DEGREE_LAT = 110.574
+_KM_PER_DEGREE_LNG_EQUATOR = 111.320
+
+
+def encode(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encodes a latitude/longitude pair into a base32 geohash string."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even_bit = True  # Geohash bits alternate, starting with longitude
+
+    while len(geohash) < precision:
+        if even_bit:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if lng >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits = bits << 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+
+        even_bit = not even_bit
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+
+def decode_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """
+    Decodes a geohash into its bounding box.
+    Returns (min_lat, min_lng, max_lat, max_lng).
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even_bit = True
+
+    for char in geohash:
+        value = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lng_range if even_bit else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even_bit = not even_bit
+
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def cell_size_degrees(precision: int) -> Tuple[float, float]:
+    """Returns the (height, width) of a geohash cell in degrees at a given precision."""
+    total_bits = 5 * precision
+    lat_bits = total_bits // 2
+    lng_bits = total_bits - lat_bits
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def precision_for_radius(lat: float, radius_km: float) -> Optional[int]:
+    """
+    Picks the longest geohash precision whose cells are at least as large as
+    the search radius, so the centre cell plus its 8 neighbours always cover
+    the whole circle. Returns None if even precision 1 is too small.
+    """
+    radius_lat_deg = radius_km / _KM_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    radius_lng_deg = radius_km / (_KM_PER_DEGREE_LNG_EQUATOR * cos_lat)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_height, cell_width = cell_size_degrees(precision)
+        if cell_height >= radius_lat_deg and cell_width >= radius_lng_deg:
+            return precision
+    return None
+
+
+def neighbors(geohash: str) -> List[str]:
+    """Returns the (up to) 8 geohash cells surrounding the given cell."""
+    precision = len(geohash)
+    min_lat, min_lng, max_lat, max_lng = decode_bbox(geohash)
+    center_lat = (min_lat + max_lat) / 2
+    center_lng = (min_lng + max_lng) / 2
+    cell_height = max_lat - min_lat
+    cell_width = max_lng - min_lng
+
+    result = []
+    for d_lat in (-1, 0, 1):
+        for d_lng in (-1, 0, 1):
+            if d_lat == 0 and d_lng == 0:
+                continue
+            lat = center_lat + d_lat * cell_height
+            if lat > 90.0 or lat < -90.0:
+                continue  # No cells beyond the poles
+            lng = center_lng + d_lng * cell_width
+            # Wrap around the antimeridian
+            lng = ((lng + 180.0) % 360.0) - 180.0
+            neighbor = encode(lat, lng, precision)
+            if neighbor != geohash and neighbor not in result:
+                result.append(neighbor)
+    return result
+
+
+def covering_prefixes(lat: float, lng: float, radius_km: float) -> Optional[List[str]]:
+    """
+    Returns a small set of geohash prefixes whose cells together cover the
+    circle of `radius_km` around (lat, lng). Each prefix maps to one Firestore
+    range query: geohash >= prefix AND geohash < prefix + PREFIX_RANGE_END.
+    Returns None if the radius is too large to be covered efficiently, in
+    which case callers should fall back to an unfiltered query.
+    """
+    if radius_km <= 0:
+        return None
+
+    precision = precision_for_radius(lat, radius_km)
+    if precision is None:
+        return None
+
+    center = encode(lat, lng, precision)
+    return sorted({center, *neighbors(center)})
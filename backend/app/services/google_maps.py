@@ -1,50 +1,180 @@
-import requests
+import asyncio
+import random
+import httpx
+import numpy as np
 from app.config import settings
 from app.schemas import Coordinates
-from typing import Optional
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.geocode_cache import GeocodeCache
+from typing import Optional, Sequence, Tuple, Any, Dict
 from geopy.distance import geodesic
 
+# Mean Earth radius (IUGG), used by the haversine batch calculation
+EARTH_RADIUS_KM = 6371.0088
+
+# Upstream responses worth retrying: the same request may succeed shortly
+RETRYABLE_HTTP_STATUSES = {429, 500, 502, 503, 504}
+RETRYABLE_API_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+# Exponential backoff between retries: full jitter up to base * 2^attempt, capped
+BACKOFF_BASE_SECONDS = 0.25
+BACKOFF_MAX_SECONDS = 4.0
+
+# Keep-alive pool shared by all GoogleMapsService instances; closed by the app lifespan
+_http_client: Optional[httpx.AsyncClient] = None
+
+_geocode_counters = {"requests": 0, "retries": 0, "failures": 0}
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.GEOCODE_READ_TIMEOUT_SECONDS, connect=settings.GEOCODE_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=settings.GEOCODE_MAX_CONNECTIONS,
+                                max_keepalive_connections=settings.GEOCODE_MAX_CONNECTIONS),
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    global _http_client
+    client, _http_client = _http_client, None
+    if client is not None:
+        await client.aclose()
+
 class GoogleMapsService:
 
-    def __init__(self):
-        self.api_key = settings.GOOGLE_MAPS_API_KEY
-        self.geocode_url = "https://maps.googleapis.com/maps/api/geocode/json"
+    def __init__(self, cache: GeocodeCache, breaker: CircuitBreaker):
+        self.api_key = settings.GOOGLE_MAPS_SERVER_API_KEY
+        self.geocode_url = settings.GOOGLE_MAPS_GEOCODE_URL
+        self.cache = cache
+        self.breaker = breaker
+        self.max_retries = settings.GEOCODE_MAX_RETRIES
+
+    @classmethod
+    def from_settings(cls) -> "GoogleMapsService":
+        """
+        A service with its own geocode cache and circuit breaker, configured
+        from settings. The app builds one in its service container and
+        shares it; scripts build their own.
+        """
+        cache = GeocodeCache(
+            path=settings.GEOCODE_CACHE_PATH,
+            max_entries=settings.GEOCODE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.GEOCODE_CACHE_TTL_SECONDS,
+            negative_ttl_seconds=settings.GEOCODE_CACHE_NEGATIVE_TTL_SECONDS,
+        )
+        # Opens when the Geocoding API keeps failing, so requests stop waiting on it
+        breaker = CircuitBreaker(
+            "geocoding",
+            failure_threshold=settings.GEOCODE_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.GEOCODE_BREAKER_RESET_SECONDS,
+        )
+        return cls(cache, breaker)
+
+    def stats(self) -> Dict[str, Any]:
+        """Geocoding API call counters (shared by all instances) and this service's circuit."""
+        return {**_geocode_counters, "circuit": self.breaker.stats()}
 
-    def get_coordinates_for_address(self, address: str) -> Optional[Coordinates]:
+    async def get_coordinates_for_address(self, address: str) -> Optional[Coordinates]:
         """
-        Geocodes a string address using Google Maps API.
+        Geocodes a string address using Google Maps API, without blocking
+        the event loop. Results, including addresses Google could not find,
+        are cached by normalized address, so repeat addresses skip the API.
+        Calls share a keep-alive connection pool and time out; transient
+        failures (timeouts, 5xx, OVER_QUERY_LIMIT) are retried with
+        exponential backoff. If the API keeps failing (timeouts, connection
+        errors, 5xx or 429), the circuit opens and lookups return None
+        immediately until it recovers.
         Returns Coordinates or None.
         """
-        if not self.api_key:
-            print("Error: GOOGLE_MAPS_API_KEY is not set. Cannot geocode.")
-            return None
-            
         if not address:
             print("Warning: No address provided to geocode.")
             return None
 
+        hit, cached = await self.cache.lookup(address)
+        if hit:
+            return cached
+
+        if not self.api_key:
+            print("Error: GOOGLE_MAPS_SERVER_API_KEY is not set. Cannot geocode.")
+            return None
+
+        if not self.breaker.allow():
+            print(f"Geocoding skipped for address '{address}': the Google Maps API circuit is open.")
+            return None
+
         params = {
             "address": address,
             "key": self.api_key
         }
 
         try:
-            response = requests.get(self.geocode_url, params=params)
-            response.raise_for_status() # Raise an exception for bad status codes
-            data = response.json()
-
-            if data["status"] == "OK" and data.get("results"):
-                location = data["results"][0]["geometry"]["location"]
-                return Coordinates(lat=location["lat"], lng=location["lng"])
+            data = await self._request_geocode(params)
+        except httpx.HTTPStatusError as e:
+            _geocode_counters["failures"] += 1
+            if e.response.status_code < 500:
+                # The API answered and rejected this request (e.g. a malformed address);
+                # that says nothing about its health, so it does not count toward opening
+                self.breaker.record_success()
             else:
-                print(f"Geocoding failed for address '{address}'. Status: {data.get('status')}, Error: {data.get('error_message')}")
-                return None
-        except requests.RequestException as e:
+                self.breaker.record_failure()
             print(f"Error calling Google Maps API: {e}")
             return None
         except Exception as e:
-            print(f"An unexpected error occurred during geocoding: {e}")
+            _geocode_counters["failures"] += 1
+            self.breaker.record_failure()
+            print(f"Error calling Google Maps API: {e}")
             return None
+        except BaseException:
+            # Cancelled (client disconnect, timeout): not an upstream failure, but a
+            # half-open trial must still give up its slot or the circuit never closes
+            self.breaker.release()
+            raise
+
+        self.breaker.record_success()
+        if data["status"] == "OK" and data.get("results"):
+            location = data["results"][0]["geometry"]["location"]
+            coordinates = Coordinates(lat=location["lat"], lng=location["lng"])
+            await self.cache.store(address, coordinates)
+            return coordinates
+
+        print(f"Geocoding failed for address '{address}'. Status: {data.get('status')}, Error: {data.get('error_message')}")
+        if data.get("status") in ("ZERO_RESULTS", "OK"):
+            # The address itself is the problem; quota and key errors are not cached
+            await self.cache.store(address, None)
+        return None
+
+    async def _request_geocode(self, params: dict) -> dict:
+        """
+        Calls the Geocoding API, retrying transient failures. Returns the
+        decoded response, or raises once retries are exhausted or on a
+        non-retryable HTTP error.
+        """
+        client = get_http_client()
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                _geocode_counters["retries"] += 1
+                await asyncio.sleep(random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)))
+            _geocode_counters["requests"] += 1
+
+            try:
+                response = await client.get(self.geocode_url, params=params)
+            except httpx.TransportError as e:  # Timeouts, refused and dropped connections
+                error = f"{type(e).__name__}: {e}"
+                continue
+
+            if response.status_code in RETRYABLE_HTTP_STATUSES:
+                error = f"HTTP {response.status_code}"
+                continue
+            response.raise_for_status() # Other error statuses will not improve on retry
+
+            data = response.json()
+            if data.get("status") in RETRYABLE_API_STATUSES:
+                error = f"API status {data.get('status')}"
+                continue
+            return data
+
+        raise RuntimeError(f"Geocoding failed after {self.max_retries + 1} attempts ({error})")
 
     def calculate_distance_km(self, coord1: Coordinates, coord2: Coordinates) -> float:
         """
@@ -63,4 +193,59 @@ class GoogleMapsService:
             return distance
         except Exception as e:
             print(f"Error calculating distance: {e}")
-            return float('inf')
\ No newline at end of file
+            return float('inf')
+
+    @staticmethod
+    def coordinate_arrays(raw_coords: Sequence[Optional[Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Packs raw Firestore coordinate maps ({"lat": ..., "lng": ...}) or
+        Coordinates objects into contiguous latitude/longitude arrays.
+        Missing or malformed coordinates become NaN.
+        """
+        count = len(raw_coords)
+        lats = np.full(count, np.nan, dtype=np.float64)
+        lngs = np.full(count, np.nan, dtype=np.float64)
+
+        for i, coords in enumerate(raw_coords):
+            if not coords:
+                continue
+            try:
+                if isinstance(coords, Coordinates):
+                    lats[i], lngs[i] = coords.lat, coords.lng
+                else:
+                    lats[i], lngs[i] = float(coords["lat"]), float(coords["lng"])
+            except (KeyError, TypeError, ValueError):
+                continue  # Leave as NaN
+
+        return lats, lngs
+
+    def calculate_distances_km(self, origin: Coordinates, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """
+        Calculates haversine distances from one origin to N points in a single
+        vectorized pass. Points with NaN coordinates get a distance of infinity.
+        Returns an array of distances in kilometers.
+        """
+        if origin is None:
+            return np.full(len(lats), np.inf)
+
+        lat1 = np.radians(origin.lat)
+        lng1 = np.radians(origin.lng)
+        lat2 = np.radians(lats)
+        lng2 = np.radians(lngs)
+
+        a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2.0) ** 2
+        distances = 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+        return np.where(np.isnan(distances), np.inf, distances)
+
+    def refine_distances_km(self, origin: Coordinates, lats: np.ndarray, lngs: np.ndarray,
+                            distances: np.ndarray, indices: Sequence[int]) -> np.ndarray:
+        """
+        Replaces the haversine estimate with the exact geodesic distance for the
+        given indices only (e.g. the final top-K results), in place.
+        Returns the updated distances array.
+        """
+        for i in indices:
+            if np.isfinite(distances[i]):
+                distances[i] = self.calculate_distance_km(origin, Coordinates(lat=lats[i], lng=lngs[i]))
+        return distances
@@ -0,0 +1,142 @@
+import datetime
+import hashlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+# Outcomes of IdempotencyStore.begin
+PROCEED = "proceed"          # The caller owns the key and runs the handler
+REPLAY = "replay"            # A stored response exists; return it
+IN_PROGRESS = "in_progress"  # Another request with this key is still running
+MISMATCH = "mismatch"        # The key was used for a different request
+
+
+def scoped_key(user_id: str, key: str) -> str:
+    """Document ID for a client key; keys are scoped per user so they cannot collide or leak across accounts."""
+    return hashlib.sha256(f"{user_id}:{key}".encode("utf-8")).hexdigest()
+
+
+def request_fingerprint(method: str, path: str, body: bytes) -> str:
+    """Identifies the request a key was first used for, so reusing it for another is rejected."""
+    return hashlib.sha256(method.encode("utf-8") + b" " + path.encode("utf-8") + b"\n" + body).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Remembers the response to each mutating request sent with an
+    Idempotency-Key, in the 'idempotencyKeys' collection, so a client retry
+    gets the original response instead of running the handler again.
+
+    A record is created atomically in the 'in_progress' state before the
+    handler runs (concurrent retries see it and back off), then replaced by
+    the compact stored response. Records expire after ttl_seconds via the
+    expires_at field (configure it as a Firestore TTL policy so they are
+    also deleted). An 'in_progress' record whose lock has run out (the
+    process died mid-request) can be taken over by the next retry.
+    """
+
+    def __init__(self, db_factory: Callable[[], Any], ttl_seconds: float, lock_seconds: float,
+                 clock: Callable[[], datetime.datetime] = lambda: datetime.datetime.now(datetime.timezone.utc)):
+        self._db_factory = db_factory
+        self._ttl = datetime.timedelta(seconds=ttl_seconds)
+        self._lock = datetime.timedelta(seconds=lock_seconds)
+        self._clock = clock
+        self._started = 0
+        self._replayed = 0
+        self._in_progress = 0
+        self._mismatched = 0
+        self._stored = 0
+        self._released = 0
+        self._errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl.total_seconds() > 0
+
+    def _ref(self, doc_id: str):
+        return self._db_factory().collection('idempotencyKeys').document(doc_id)
+
+    async def begin(self, doc_id: str, fingerprint: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Claims the key for this request. Returns (outcome, stored record for REPLAY)."""
+        ref = self._ref(doc_id)
+        now = self._clock()
+        claim = {
+            "state": "in_progress",
+            "fingerprint": fingerprint,
+            "created_at": now,
+            "expires_at": now + self._lock,
+        }
+        try:
+            await ref.create(claim)
+            self._started += 1
+            return PROCEED, None
+        except AlreadyExists:
+            pass
+
+        doc = await ref.get()
+        record = doc.to_dict() if doc.exists else None
+        if record is None or record.get("expires_at") is None or record["expires_at"] <= now:
+            # Expired (awaiting TTL deletion) or abandoned mid-request: take it over,
+            # unless another retry gets there first
+            try:
+                if doc.exists:
+                    await ref.update(claim, option=self._db_factory().write_option(last_update_time=doc.update_time))
+                else:
+                    await ref.create(claim)
+                self._started += 1
+                return PROCEED, None
+            except (AlreadyExists, FailedPrecondition):
+                self._in_progress += 1
+                return IN_PROGRESS, None
+
+        if record.get("fingerprint") != fingerprint:
+            self._mismatched += 1
+            return MISMATCH, None
+        if record.get("state") != "completed":
+            self._in_progress += 1
+            return IN_PROGRESS, None
+        self._replayed += 1
+        return REPLAY, record
+
+    async def complete(self, doc_id: str, fingerprint: str, status_code: int,
+                       body: bytes, media_type: Optional[str]) -> None:
+        """Stores the response for replays."""
+        now = self._clock()
+        try:
+            await self._ref(doc_id).set({
+                "state": "completed",
+                "fingerprint": fingerprint,
+                "status_code": status_code,
+                "media_type": media_type,
+                "body": body,
+                "created_at": now,
+                "expires_at": now + self._ttl,
+            })
+            self._stored += 1
+        except Exception as e:
+            self._errors += 1
+            print(f"Error storing idempotent response: {e}")
+
+    async def release(self, doc_id: str) -> None:
+        """Drops an in-progress claim (the handler failed), so a retry runs it again."""
+        try:
+            await self._ref(doc_id).delete()
+            self._released += 1
+        except Exception as e:
+            self._errors += 1
+            print(f"Error releasing idempotency key: {e}")
+
+    def record_error(self) -> None:
+        self._errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "started": self._started,
+            "replayed": self._replayed,
+            "in_progress_rejections": self._in_progress,
+            "mismatches": self._mismatched,
+            "stored": self._stored,
+            "released": self._released,
+            "errors": self._errors,
+        }
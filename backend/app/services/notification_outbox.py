@@ -0,0 +1,463 @@
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from firebase_admin import messaging
+
+from app.config import settings
+from app.services.push_tokens import MULTICAST_CHUNK_SIZE, PushTokenPruner, is_dead_token_error
+
+# Message states
+PENDING = "pending"      # Waiting to be sent (or retried)
+SENDING = "sending"      # Claimed by a dispatcher until its lease runs out
+SENT = "sent"
+FAILED = "failed"        # Gave up after NOTIFICATION_MAX_ATTEMPTS; replay with scripts/notification_outbox.py
+DROPPED = "dropped"      # The user has no (live) FCM token
+COALESCED = "coalesced"  # Replaced by a newer message with the same coalesce key before it was sent
+
+# A claimed message is handed to another dispatcher if not settled within this long (e.g. the process died)
+SEND_LEASE_SECONDS = 60.0
+
+_COLUMNS = "id, user_id, coalesce_key, title, body, data, status, attempts, next_attempt_at, created_at, updated_at, last_error"
+
+
+class NotificationOutbox:
+    """
+    Durable queue of push notifications in a local SQLite file. Request
+    handlers enqueue() and return at once; NotificationDispatcher delivers
+    the messages in the background, and anything not yet delivered survives
+    a restart. Delivery is at least once: a message sent just before a crash
+    may be sent again.
+
+    Each message targets one user. Enqueuing a message with the same
+    (user_id, coalesce_key) as a pending one supersedes it, so a user only
+    gets the latest of a burst of updates about the same thing.
+
+    A commit waits on fsync, so code on the event loop uses enqueue() and
+    runs claim()/settle() in a worker thread; the other methods are for
+    scripts/notification_outbox.py.
+    """
+
+    def __init__(self, path: Optional[str], clock: Callable[[], float] = time.time):
+        self._path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._error: Optional[str] = None
+        self._enqueued = 0
+        self._coalesced = 0
+        self._on_enqueue: Optional[Callable[[], None]] = None
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """Opens the SQLite store on first use (in memory only if no path is set)."""
+        if self._conn is None and self._error is None:
+            try:
+                conn = sqlite3.connect(self._path or ":memory:", check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA busy_timeout=5000")  # The CLI may write to the same file
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS outbox ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, coalesce_key TEXT, "
+                    "title TEXT NOT NULL, body TEXT NOT NULL, data TEXT, status TEXT NOT NULL, "
+                    "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, "
+                    "created_at REAL NOT NULL, updated_at REAL NOT NULL, last_error TEXT)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+                conn.execute("CREATE INDEX IF NOT EXISTS outbox_coalesce ON outbox (user_id, coalesce_key, status)")
+                # Send budget shared by every dispatcher on this outbox (one per API worker)
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS send_budget ("
+                    "id INTEGER PRIMARY KEY CHECK (id = 1), tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+                )
+                self._conn = conn
+            except sqlite3.Error as e:
+                self._error = str(e)
+                print(f"Error opening notification outbox at '{self._path}': {e}")
+        return self._conn
+
+    def on_enqueue(self, callback: Optional[Callable[[], None]]) -> None:
+        """Registers a callback run after each enqueue (the dispatcher uses it to wake up early)."""
+        self._on_enqueue = callback
+
+    async def enqueue(self, user_id: str, title: str, body: str, data: Optional[Dict[str, str]] = None,
+                      coalesce_key: Optional[str] = None) -> Optional[int]:
+        """Stores a message for delivery. Returns its ID, or None if the outbox is unavailable."""
+        message_id = await asyncio.to_thread(self._insert, user_id, title, body, data, coalesce_key)
+        # Back on the event loop, where the dispatcher's wakeup event lives
+        if message_id is not None and self._on_enqueue is not None:
+            self._on_enqueue()
+        return message_id
+
+    def _insert(self, user_id: str, title: str, body: str, data: Optional[Dict[str, str]],
+                coalesce_key: Optional[str]) -> Optional[int]:
+        now = self._clock()
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return None
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                if coalesce_key is not None:
+                    cursor = conn.execute(
+                        "UPDATE outbox SET status = ?, updated_at = ? "
+                        "WHERE user_id = ? AND coalesce_key = ? AND status = ?",
+                        (COALESCED, now, user_id, coalesce_key, PENDING),
+                    )
+                    self._coalesced += cursor.rowcount
+                cursor = conn.execute(
+                    "INSERT INTO outbox (user_id, coalesce_key, title, body, data, status, attempts, "
+                    "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?)",
+                    (user_id, coalesce_key, title, body, json.dumps(data) if data else None, PENDING, now, now, now),
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                print(f"Error enqueuing notification for user {user_id}: {e}")
+                return None
+            self._enqueued += 1
+        return cursor.lastrowid
+
+    def claim(self, limit: int, rate_per_second: float = 0.0) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Takes up to `limit` due messages, oldest first, and leases them to the
+        caller for SEND_LEASE_SECONDS. Messages whose lease ran out are due again.
+
+        With a rate, claims draw on a token bucket stored in the outbox, so
+        all dispatchers sharing the file (every API worker on the host)
+        claim at most rate_per_second messages per second between them,
+        in bursts of up to one second's worth (at least one message, so
+        rates below 1 still send). Returns the messages and, if
+        messages are due but the budget is spent, the seconds until it
+        allows another claim (otherwise 0).
+        """
+        now = self._clock()
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return [], 0.0
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                tokens = None
+                if rate_per_second > 0:
+                    budget = conn.execute("SELECT tokens, updated_at FROM send_budget WHERE id = 1").fetchone()
+                    capacity = max(1.0, rate_per_second)
+                    tokens = capacity
+                    if budget is not None:
+                        tokens = min(capacity, budget[0] + max(0.0, now - budget[1]) * rate_per_second)
+                    limit = min(limit, int(tokens))
+                rows = conn.execute(
+                    f"SELECT {_COLUMNS} FROM outbox WHERE status IN (?, ?) AND next_attempt_at <= ? "
+                    "ORDER BY next_attempt_at, id LIMIT ?",
+                    (PENDING, SENDING, now, max(limit, 1)),
+                ).fetchall()
+                wait = 0.0
+                if limit < 1:
+                    # Spent: only report how long to wait if there is something to send
+                    wait = (1 - tokens) / rate_per_second if rows else 0.0
+                    rows = []
+                conn.executemany(
+                    "UPDATE outbox SET status = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                    [(SENDING, now + SEND_LEASE_SECONDS, now, row[0]) for row in rows],
+                )
+                if tokens is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO send_budget (id, tokens, updated_at) VALUES (1, ?, ?)",
+                        (tokens - len(rows), now),
+                    )
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+        return [self._row(row) for row in rows], wait
+
+    def settle(self, updates: Sequence[Dict[str, Any]]) -> None:
+        """Records the outcome of claimed messages in one transaction (id, status, attempts, next_attempt_at, last_error)."""
+        if not updates:
+            return
+        now = self._clock()
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? "
+                    "WHERE id = ? AND status = ?",
+                    [(u["status"], u["attempts"], u.get("next_attempt_at", now), u.get("last_error"), now, u["id"], SENDING)
+                     for u in updates],
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+
+    # --- Inspection and replay (scripts/notification_outbox.py) ---
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return {}
+            return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    def oldest_pending_seconds(self) -> Optional[float]:
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT MIN(created_at) FROM outbox WHERE status IN (?, ?)", (PENDING, SENDING)
+            ).fetchone()
+        return self._clock() - row[0] if row and row[0] is not None else None
+
+    def list_messages(self, status: Optional[str] = None, user_id: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent messages first, optionally filtered by status and user."""
+        query = f"SELECT {_COLUMNS} FROM outbox"
+        filters, params = [], []
+        if status:
+            filters.append("status = ?")
+            params.append(status)
+        if user_id:
+            filters.append("user_id = ?")
+            params.append(user_id)
+        if filters:
+            query += " WHERE " + " AND ".join(filters)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return []
+            rows = conn.execute(query, (*params, limit)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def replay(self, ids: Optional[Sequence[int]] = None, status: Optional[str] = None) -> int:
+        """
+        Queues messages for immediate delivery again with a fresh attempt
+        count: the given IDs, or every message in `status` (e.g. 'failed').
+        Returns the number of messages requeued.
+        """
+        now = self._clock()
+        if ids:
+            where, params = f"id IN ({','.join('?' * len(ids))})", list(ids)
+        elif status:
+            where, params = "status = ?", [status]
+        else:
+            return 0
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return 0
+            cursor = conn.execute(
+                f"UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ?, last_error = NULL, updated_at = ? "
+                f"WHERE {where}",
+                (PENDING, now, now, *params),
+            )
+            return cursor.rowcount
+
+    def purge(self, older_than_seconds: float, statuses: Sequence[str] = (SENT, COALESCED, DROPPED)) -> int:
+        """Deletes settled messages last updated more than older_than_seconds ago. Returns the number removed."""
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return 0
+            cursor = conn.execute(
+                f"DELETE FROM outbox WHERE status IN ({','.join('?' * len(statuses))}) AND updated_at <= ?",
+                (*statuses, self._clock() - older_than_seconds),
+            )
+            return cursor.rowcount
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        message = dict(zip([name.strip() for name in _COLUMNS.split(",")], row))
+        message["data"] = json.loads(message["data"]) if message["data"] else None
+        return message
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self._path,
+            "enqueued": self._enqueued,
+            "coalesced": self._coalesced,
+            "by_status": self.counts(),
+            "oldest_pending_seconds": self.oldest_pending_seconds(),
+            "error": self._error,
+        }
+
+
+class NotificationDispatcher:
+    """
+    Delivers the outbox in the background. Each round claims a batch of due
+    messages within the send budget shared through the outbox (see claim),
+    looks up the users' current FCM tokens in one batched read and sends
+    the batch with one send_each call. Transient failures are retried with
+    exponential backoff (with jitter) until NOTIFICATION_MAX_ATTEMPTS, then
+    marked 'failed' for replay. Dead tokens are pruned from their users and the message dropped.
+    """
+
+    def __init__(self, outbox: NotificationOutbox, db_factory: Callable[[], Any], pruner: PushTokenPruner,
+                 send: Optional[Callable[[List[messaging.Message]], Any]] = None,
+                 clock: Callable[[], float] = time.time):
+        self._outbox = outbox
+        self._db_factory = db_factory
+        self._send = send or messaging.send_each
+        self._pruner = pruner
+        self._clock = clock
+        self._rate_limited_seconds = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sent = 0
+        self._retried = 0
+        self._failed = 0
+        self._dropped = 0
+        self._errors = 0
+        self._error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self, interval_seconds: float) -> None:
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._outbox.on_enqueue(self._wakeup.set)
+        self._task = asyncio.create_task(self._run(interval_seconds))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._outbox.on_enqueue(None)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._wakeup = None
+
+    async def _run(self, interval_seconds: float) -> None:
+        while True:
+            try:
+                claimed = await self.dispatch_once()
+            except Exception as e:
+                self._errors += 1
+                self._error = str(e)
+                print(f"Error dispatching notifications: {e}")
+                claimed = 0
+            if claimed:
+                continue  # More may be due; the rate limit paces the rounds
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(settings.NOTIFICATION_RETRY_BASE_SECONDS * (2 ** (attempts - 1)),
+                    settings.NOTIFICATION_RETRY_MAX_SECONDS)
+        return delay * random.uniform(0.5, 1.0)  # Jitter, so failed batches do not retry in lockstep
+
+    def _retry_or_fail(self, message: Dict[str, Any], error: str) -> Dict[str, Any]:
+        attempts = message["attempts"] + 1
+        if attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            self._failed += 1
+            return {"id": message["id"], "status": FAILED, "attempts": attempts, "last_error": error}
+        self._retried += 1
+        return {"id": message["id"], "status": PENDING, "attempts": attempts, "last_error": error,
+                "next_attempt_at": self._clock() + self._retry_delay(attempts)}
+
+    async def _tokens_for(self, user_ids: List[str]) -> Dict[str, str]:
+        """Current FCM token per user, read with one get_all and a field mask."""
+        db = self._db_factory()
+        users_ref = db.collection('users')
+        refs = [users_ref.document(uid) for uid in dict.fromkeys(user_ids)]
+        tokens = {}
+        async for doc in db.get_all(refs, field_paths=["fcm_token"]):
+            user_data = doc.to_dict() if doc.exists else None
+            if user_data and user_data.get("fcm_token"):
+                tokens[doc.id] = user_data["fcm_token"]
+        return tokens
+
+    async def dispatch_once(self) -> int:
+        """Sends one batch of due messages. Returns the number of messages claimed."""
+        batch_size = max(1, min(settings.NOTIFICATION_BATCH_SIZE, MULTICAST_CHUNK_SIZE))
+        rate = settings.NOTIFICATION_RATE_PER_SECOND
+        claimed, wait = await asyncio.to_thread(self._outbox.claim, batch_size, rate)
+        while not claimed and wait > 0:
+            # This second's budget went to other dispatchers (or our last batch)
+            self._rate_limited_seconds += wait
+            await asyncio.sleep(wait)
+            claimed, wait = await asyncio.to_thread(self._outbox.claim, batch_size, rate)
+        if not claimed:
+            return 0
+
+        updates = []
+        try:
+            tokens = await self._tokens_for([m["user_id"] for m in claimed])
+        except Exception as e:
+            self._errors += 1
+            retries = [self._retry_or_fail(m, f"Token lookup failed: {e}") for m in claimed]
+            await asyncio.to_thread(self._outbox.settle, retries)
+            return len(claimed)
+
+        deliverable = []
+        for message in claimed:
+            if message["user_id"] in tokens:
+                deliverable.append(message)
+            else:
+                self._dropped += 1
+                updates.append({"id": message["id"], "status": DROPPED, "attempts": message["attempts"],
+                                "last_error": "User has no FCM token."})
+
+        if deliverable:
+            fcm_messages = [
+                messaging.Message(
+                    notification=messaging.Notification(title=m["title"], body=m["body"]),
+                    data=m["data"],
+                    token=tokens[m["user_id"]],
+                )
+                for m in deliverable
+            ]
+            try:
+                # The Admin SDK is blocking, so run it in a worker thread
+                response = await asyncio.to_thread(self._send, fcm_messages)
+            except Exception as e:
+                # The whole request failed (e.g. FCM unreachable): retry every message
+                self._errors += 1
+                updates += [self._retry_or_fail(m, str(e)) for m in deliverable]
+            else:
+                # Counts the deliveries and prunes dead tokens in one pass
+                await self._pruner.process_response([tokens[m["user_id"]] for m in deliverable], response)
+                for message, result in zip(deliverable, response.responses):
+                    if result.success:
+                        self._sent += 1
+                        updates.append({"id": message["id"], "status": SENT, "attempts": message["attempts"] + 1})
+                    elif is_dead_token_error(result.exception):
+                        self._dropped += 1
+                        updates.append({"id": message["id"], "status": DROPPED, "attempts": message["attempts"] + 1,
+                                        "last_error": str(result.exception)})
+                    else:
+                        updates.append(self._retry_or_fail(message, str(result.exception)))
+
+        await asyncio.to_thread(self._outbox.settle, updates)
+        return len(claimed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._outbox.stats(),
+            "running": self.running,
+            "sent": self._sent,
+            "retried": self._retried,
+            "failed": self._failed,
+            "dropped": self._dropped,
+            "errors": self._errors,
+            "last_error": self._error,
+            "rate_limited_seconds": self._rate_limited_seconds,
+        }
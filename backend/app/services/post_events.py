@@ -0,0 +1,171 @@
+import asyncio
+import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.schemas import Coordinates, FoodPostPublic
+from app.services.google_maps import GoogleMapsService
+
+# Events a subscriber may fall behind by before its backlog is dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Stored post fields included in "new" and "updated" events
+_EVENT_POST_FIELDS = [
+    name for name in FoodPostPublic.model_fields
+    if name not in ("donor_details", "distance_km")
+]
+
+
+class Subscription:
+    """
+    One connected client. Events are queued per connection so a slow reader
+    never delays the others; if its queue fills up, the backlog is replaced
+    with a single "resync" event telling the client to catch up with a delta
+    sync (GET /posts/?since=...) instead.
+    """
+
+    def __init__(self, coordinates: Coordinates, radius_km: float, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.coordinates = coordinates
+        self.radius_km = radius_km
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.delivered = 0
+        self.dropped = 0
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        """Queues an event without waiting. Returns False if the backlog had to be dropped."""
+        try:
+            self.queue.put_nowait(event)
+            self.delivered += 1
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.dropped += 1
+        self.queue.put_nowait({"type": "resync"})
+        return False
+
+    async def next_event(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Waits up to timeout seconds for the next event (None on timeout)."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class PostEventBroker:
+    """
+    Fans post changes out to live subscribers, each interested in a radius
+    around a point. It is fed from the feed cache's Firestore listener, so a
+    single listener serves every open stream in the process.
+
+    publish() is safe to call from any thread (the Firestore watch thread in
+    production); events are dispatched on the event loop passed to start().
+    """
+
+    def __init__(self, maps_service: GoogleMapsService,
+                 clock: Callable[[], datetime.datetime] = lambda: datetime.datetime.now(datetime.timezone.utc)):
+        self._maps_service = maps_service
+        self._clock = clock
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: List[Subscription] = []
+        # Subscriber positions as arrays, rebuilt lazily after (un)subscribes
+        self._lats: Optional[np.ndarray] = None
+        self._lngs: Optional[np.ndarray] = None
+        self._radii: Optional[np.ndarray] = None
+        self._events_published = 0
+        self._events_delivered = 0
+        self._resyncs = 0
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def stop(self) -> None:
+        """Ends every open stream and stops accepting events."""
+        for subscription in list(self._subscribers):
+            if subscription.queue.full():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait({"type": "closed"})
+        self._loop = None
+
+    def subscribe(self, coordinates: Coordinates, radius_km: float) -> Subscription:
+        subscription = Subscription(coordinates, radius_km)
+        self._subscribers.append(subscription)
+        self._lats = None
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        try:
+            self._subscribers.remove(subscription)
+            self._lats = None
+        except ValueError:
+            pass
+
+    def on_feed_change(self, change_type: str, post: Dict[str, Any]) -> None:
+        """FeedCache change listener: turns a feed change into a post event."""
+        if change_type == "ADDED":
+            event_type = "new"
+        elif change_type == "MODIFIED":
+            event_type = "updated"
+        else:
+            # The post left the 'Available' feed. Its last known state does not
+            # say why, but only a reservation or expiry takes it out before expiry
+            expiry = post.get("expiry")
+            event_type = "expired" if expiry is not None and expiry <= self._clock() else "reserved"
+        self.publish(event_type, post)
+
+    def publish(self, event_type: str, post: Dict[str, Any]) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._dispatch, event_type, post)
+
+    def _subscriber_arrays(self):
+        if self._lats is None:
+            self._lats = np.array([s.coordinates.lat for s in self._subscribers], dtype=float)
+            self._lngs = np.array([s.coordinates.lng for s in self._subscribers], dtype=float)
+            self._radii = np.array([s.radius_km for s in self._subscribers], dtype=float)
+        return self._lats, self._lngs, self._radii
+
+    def _dispatch(self, event_type: str, post: Dict[str, Any]) -> None:
+        """Runs on the event loop: delivers the event to every subscriber in range."""
+        self._events_published += 1
+        coords = post.get("coordinates") or {}
+        if not self._subscribers or coords.get("lat") is None or coords.get("lng") is None:
+            return
+
+        lats, lngs, radii = self._subscriber_arrays()
+        # Distance from the post to every subscriber in one vectorized pass
+        distances = self._maps_service.calculate_distances_km(Coordinates(**coords), lats, lngs)
+        in_range = np.nonzero(distances <= radii)[0]
+        if len(in_range) == 0:
+            return
+
+        if event_type in ("new", "updated"):
+            payload = {name: post.get(name) for name in _EVENT_POST_FIELDS}
+        else:
+            payload = {"post_id": post.get("post_id")}
+
+        subscribers = self._subscribers
+        for i in in_range:
+            event = {"type": event_type, "post": payload, "distance_km": float(distances[i])}
+            if subscribers[i].offer(event):
+                self._events_delivered += 1
+            else:
+                self._resyncs += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "subscribers": len(self._subscribers),
+            "events_published": self._events_published,
+            "events_delivered": self._events_delivered,
+            "resyncs": self._resyncs,
+        }
@@ -0,0 +1,225 @@
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from firebase_admin import messaging
+
+from app.schemas import Coordinates, UserRole, VerificationStatus
+from app.services import geohash
+from app.services.google_maps import GoogleMapsService
+from app.services.push_tokens import MULTICAST_CHUNK_SIZE, PushTokenPruner
+
+# Only what is needed to target a receiver is read from each user document
+RECEIVER_FIELDS = ["coordinates", "fcm_token"]
+
+
+class NewPostNotifier:
+    """
+    Tells verified receivers near a new post that it is available, off the
+    request path. enqueue() only queues the post; a pool of tasks finds the
+    receivers within NEW_POST_NOTIFY_RADIUS_KM with geohash range queries
+    over the 'users' collection (each user stores the geohash of its
+    coordinates, like posts do), gathers their FCM tokens from the same
+    reads and sends them the push in chunks of MULTICAST_CHUNK_SIZE tokens
+    via send_each_for_multicast. The chunks of one post are spread across
+    the pool, so a large fan-out is sent with `workers` requests in flight.
+    Tokens FCM reports as dead are pruned from their users.
+
+    Notifications are best effort: the queue is in memory, so posts still
+    queued when the process stops are not announced.
+    """
+
+    def __init__(self, db_factory: Callable[[], Any], radius_km: float, maps_service: GoogleMapsService,
+                 pruner: PushTokenPruner,
+                 send: Optional[Callable[[messaging.MulticastMessage], Any]] = None,
+                 clock: Callable[[], datetime.datetime] = lambda: datetime.datetime.now(datetime.timezone.utc)):
+        self._db_factory = db_factory
+        self._radius_km = radius_km
+        self._maps_service = maps_service
+        self._send = send or messaging.send_each_for_multicast
+        self._pruner = pruner
+        self._clock = clock
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._posts = 0
+        self._tokens = 0
+        self._chunks = 0
+        self._sent = 0
+        self._failed = 0
+        self._errors = 0
+        self._latencies: List[float] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self._radius_km > 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, workers: int) -> None:
+        if self._tasks or not self.enabled:
+            return
+        self._queue = asyncio.Queue()
+        # One thread per worker, so the shared default executor does not cap the requests in flight
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="post-notifier")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(workers)]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._queue = None
+        self._pending.clear()
+
+    async def join(self) -> None:
+        """Waits until every queued post has been fully sent."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def enqueue(self, post_id: str, title: str, coordinates: Dict[str, Any], donor_id: Optional[str] = None) -> bool:
+        """Queues the announcement of a newly available post. Returns False if the notifier is not running."""
+        if self._queue is None or not coordinates:
+            return False
+        self._queue.put_nowait(("post", post_id, (title, coordinates, donor_id), self._clock()))
+        return True
+
+    # --- Targeting ---
+
+    def receivers_query(self, db, prefix: Optional[str]):
+        """
+        Verified receivers, optionally within one geohash cell. Needs a
+        role+verification_status+geohash composite index.
+        """
+        query = (
+            db.collection('users')
+            .where("role", "==", UserRole.RECEIVER)
+            .where("verification_status", "==", VerificationStatus.APPROVED)
+        )
+        if prefix is not None:
+            query = (
+                query
+                .where("geohash", ">=", prefix)
+                .where("geohash", "<", prefix + geohash.PREFIX_RANGE_END)
+            )
+        return query.select(RECEIVER_FIELDS)
+
+    def select_tokens(self, origin: Coordinates, receivers: Iterable[Any],
+                      exclude_user_id: Optional[str] = None) -> List[str]:
+        """
+        Unique FCM tokens of the receivers (user documents, or dicts with a
+        user_id) within the radius of origin.
+        """
+        candidates = []
+        for receiver in receivers:
+            data = receiver.to_dict() if hasattr(receiver, "to_dict") else receiver
+            user_id = getattr(receiver, "id", None) or data.get("user_id")
+            if data and data.get("fcm_token") and user_id != exclude_user_id:
+                candidates.append(data)
+        if not candidates:
+            return []
+
+        lats, lngs = self._maps_service.coordinate_arrays([c.get("coordinates") for c in candidates])
+        distances = self._maps_service.calculate_distances_km(origin, lats, lngs)
+        return list(dict.fromkeys(
+            c["fcm_token"] for c, distance in zip(candidates, distances) if distance <= self._radius_km
+        ))
+
+    async def receiver_tokens(self, coordinates: Dict[str, Any], exclude_user_id: Optional[str] = None) -> List[str]:
+        """FCM tokens of the verified receivers within the radius of a point."""
+        db = self._db_factory()
+        origin = Coordinates.model_validate(coordinates)
+        prefixes = geohash.covering_prefixes(origin.lat, origin.lng, self._radius_km)
+        # One range query per covering cell; a radius too large for geohash cells reads all receivers
+        cell_results = await asyncio.gather(*[self._read_receivers(db, prefix) for prefix in (prefixes or [None])])
+        return self.select_tokens(origin, [doc for docs in cell_results for doc in docs], exclude_user_id)
+
+    async def _read_receivers(self, db, prefix: Optional[str]) -> list:
+        return [doc async for doc in self.receivers_query(db, prefix).stream()]
+
+    # --- Sending ---
+
+    @staticmethod
+    def build_message(post_id: str, title: str, tokens: List[str]) -> messaging.MulticastMessage:
+        return messaging.MulticastMessage(
+            notification=messaging.Notification(
+                title="New food available nearby",
+                body=title,
+            ),
+            data={"type": "new_post", "post_id": post_id},
+            tokens=tokens,
+        )
+
+    async def _fan_out(self, post_id: str, payload, queued_at: datetime.datetime) -> None:
+        title, coordinates, donor_id = payload
+        tokens = await self.receiver_tokens(coordinates, exclude_user_id=donor_id)
+        self._posts += 1
+        self._tokens += len(tokens)
+        if not tokens:
+            self._record_latency(queued_at)
+            return
+
+        # Queue the chunks so idle workers pick them up in parallel
+        chunks = [tokens[i:i + MULTICAST_CHUNK_SIZE] for i in range(0, len(tokens), MULTICAST_CHUNK_SIZE)]
+        self._pending[post_id] = {"remaining": len(chunks), "queued_at": queued_at}
+        for chunk in chunks:
+            self._queue.put_nowait(("chunk", post_id, (title, chunk), queued_at))
+
+    async def _send_chunk(self, post_id: str, payload) -> None:
+        title, tokens = payload
+        try:
+            # The Admin SDK is blocking, so run it in a worker thread
+            message = self.build_message(post_id, title, tokens)
+            response = await asyncio.get_running_loop().run_in_executor(self._executor, self._send, message)
+            self._chunks += 1
+            self._sent += response.success_count
+            self._failed += response.failure_count
+            await self._pruner.process_response(tokens, response)
+        finally:
+            pending = self._pending.get(post_id)
+            if pending is not None:
+                pending["remaining"] -= 1
+                if pending["remaining"] <= 0:
+                    del self._pending[post_id]
+                    self._record_latency(pending["queued_at"])
+
+    def _record_latency(self, queued_at: datetime.datetime) -> None:
+        self._latencies.append((self._clock() - queued_at).total_seconds())
+        del self._latencies[:-1000]
+
+    async def _work(self) -> None:
+        while True:
+            kind, post_id, payload, queued_at = await self._queue.get()
+            try:
+                if kind == "post":
+                    await self._fan_out(post_id, payload, queued_at)
+                else:
+                    await self._send_chunk(post_id, payload)
+            except Exception as e:
+                self._errors += 1
+                print(f"Error notifying receivers of post {post_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            "running": self.running,
+            "radius_km": self._radius_km,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "posts_notified": self._posts,
+            "tokens_targeted": self._tokens,
+            "multicast_requests": self._chunks,
+            "sent": self._sent,
+            "failed": self._failed,
+            "errors": self._errors,
+            "p50_seconds": latencies[len(latencies) // 2] if latencies else None,
+            "max_seconds": latencies[-1] if latencies else None,
+        }
@@ -0,0 +1,130 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from firebase_admin import exceptions, messaging
+from google.api_core.exceptions import FailedPrecondition
+
+from app.services.user_cache import UserCache
+
+# FCM limit for tokens in one multicast request
+MULTICAST_CHUNK_SIZE = 500
+
+# Firestore limit for values in an 'in' filter
+IN_QUERY_LIMIT = 30
+
+# Firestore limit for writes in a single batch
+WRITE_BATCH_SIZE = 500
+
+
+def is_dead_token_error(exc: Optional[BaseException]) -> bool:
+    """
+    True if FCM rejected the token itself (app uninstalled, token expired or
+    malformed, or registered to another sender), so sending to it again can
+    never succeed. Quota, outage and payload errors are not token errors.
+    """
+    if isinstance(exc, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+        return True
+    # INVALID_ARGUMENT also covers bad payloads, which would fail every token
+    return isinstance(exc, exceptions.InvalidArgumentError) and "registration token" in str(exc).lower()
+
+
+class PushTokenPruner:
+    """
+    Counts push deliveries and clears FCM tokens that FCM reports as dead
+    from the 'users' collection, so they are not sent to (and billed
+    against the quota) forever. The users holding a dead token are found
+    with 'in' queries on fcm_token and cleared with batched writes; a user
+    who has since registered a new token is left alone.
+    """
+
+    def __init__(self, db_factory: Callable[[], Any], user_cache: Optional[UserCache] = None):
+        self._db_factory = db_factory
+        self._user_cache = user_cache or UserCache(ttl_seconds=0, max_entries=0)  # Profiles to drop on prune
+        self._sent = 0
+        self._failed = 0
+        self._pruned = 0
+        self._errors = 0
+
+    async def process_response(self, tokens: List[str], response: Any) -> int:
+        """
+        Records a send_each_for_multicast response (responses are in token
+        order) and prunes the dead tokens. Returns the number of users whose
+        token was cleared.
+        """
+        self._sent += response.success_count
+        self._failed += response.failure_count
+        if not response.failure_count:
+            return 0
+        dead = [token for token, result in zip(tokens, response.responses)
+                if not result.success and is_dead_token_error(result.exception)]
+        return await self.prune(dead)
+
+    async def process_result(self, token: str, exc: Optional[BaseException]) -> int:
+        """Records a single send (exc is None on success) and prunes the token if it is dead."""
+        if exc is None:
+            self._sent += 1
+            return 0
+        self._failed += 1
+        return await self.prune([token]) if is_dead_token_error(exc) else 0
+
+    async def prune(self, tokens: Iterable[str]) -> int:
+        """Clears fcm_token on every user still holding one of the tokens. Returns the number of users updated."""
+        unique_tokens = list(dict.fromkeys(token for token in tokens if token))
+        if not unique_tokens:
+            return 0
+        try:
+            db = self._db_factory()
+            users_ref = db.collection('users')
+            docs = []
+            for start in range(0, len(unique_tokens), IN_QUERY_LIMIT):
+                chunk = unique_tokens[start:start + IN_QUERY_LIMIT]
+                query = users_ref.where("fcm_token", "in", chunk).select(["fcm_token"])
+                docs += [doc async for doc in query.stream()]
+
+            pruned = []
+            for start in range(0, len(docs), WRITE_BATCH_SIZE):
+                pruned += await self._clear_tokens(db, docs[start:start + WRITE_BATCH_SIZE])
+            for user_id in pruned:
+                self._user_cache.invalidate(user_id)
+
+            self._pruned += len(pruned)
+            if pruned:
+                print(f"Pruned dead FCM tokens from {len(pruned)} users.")
+            return len(pruned)
+        except Exception as e:
+            self._errors += 1
+            print(f"Error pruning dead FCM tokens: {e}")
+            return 0
+
+    async def _clear_tokens(self, db, docs) -> List[str]:
+        """Clears the tokens in one batch, unless a user was updated since it was read. Returns the cleared user IDs."""
+        def build_batch(items):
+            batch = db.batch()
+            for doc in items:
+                # Guards against wiping a token the user registered after the query
+                batch.update(doc.reference, {"fcm_token": None},
+                             option=db.write_option(last_update_time=doc.update_time))
+            return batch
+
+        try:
+            await build_batch(docs).commit()
+            return [doc.id for doc in docs]
+        except FailedPrecondition:
+            pass
+
+        # A changed user fails the whole batch; clear the rest one at a time
+        cleared = []
+        for doc in docs:
+            try:
+                await build_batch([doc]).commit()
+                cleared.append(doc.id)
+            except FailedPrecondition:
+                continue
+        return cleared
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sent": self._sent,
+            "failed": self._failed,
+            "pruned": self._pruned,
+            "errors": self._errors,
+        }
@@ -0,0 +1,227 @@
+import datetime
+from typing import Any, Dict, Optional, Union
+
+from google.api_core.exceptions import FailedPrecondition
+
+from app.config import settings
+from app.schemas import FoodPostPublic, PostStatus, UserInDB, UserPublic
+from app.services.notification_outbox import NotificationOutbox
+
+# Post fields copied onto a reservation when it is made, so listing
+# reservations does not read every referenced post
+POST_SNAPSHOT_FIELDS = [
+    "title", "description", "quantity", "address", "coordinates", "expiry", "image_url",
+    "donor_id", "status", "receiver_id", "reserved_at", "created_at", "updated_at",
+]
+
+
+def post_snapshot(post_data: Dict[str, Any],
+                  donor_details: Union[UserPublic, Dict[str, Any], None]) -> Dict[str, Any]:
+    """Compact copy of a post (and its donor's public profile) to store on a reservation."""
+    snapshot = {field: post_data[field] for field in POST_SNAPSHOT_FIELDS if field in post_data}
+    if isinstance(donor_details, UserPublic):
+        donor_details = donor_details.model_dump(mode="json")
+    snapshot["donor_details"] = donor_details
+    return snapshot
+
+
+def user_snapshot(user: UserInDB) -> Dict[str, Any]:
+    """Public profile of a user, as stored on a reservation."""
+    # Dumped directly: revalidating through UserPublic re-runs email validation on every reserve
+    return user.model_dump(mode="json", include=set(UserPublic.model_fields))
+
+
+def snapshot_updates(**fields: Any) -> Dict[str, Any]:
+    """Field paths that keep a reservation's post_snapshot in step with a post change."""
+    return {f"post_snapshot.{name}": value for name, value in fields.items() if name in POST_SNAPSHOT_FIELDS}
+
+
+def post_from_snapshot(post_id: str, snapshot: Optional[Dict[str, Any]]) -> Optional[FoodPostPublic]:
+    """
+    Rebuilds the reserved post from a reservation's snapshot. Returns None
+    if there is no usable snapshot (reservations made before snapshots were
+    stored, or before they carried created_at and description), in which
+    case the caller reads the post itself.
+    """
+    # FoodPostPublic would fill a missing created_at with the current time
+    if not snapshot or "title" not in snapshot or "created_at" not in snapshot:
+        return None
+    try:
+        return FoodPostPublic.model_validate({**snapshot, "post_id": post_id})
+    except Exception as e:
+        print(f"Error reading post snapshot for {post_id}: {e}")
+        return None
+
+
+def holds_post(res_id: str, res_data: Dict[str, Any], post_data: Optional[Dict[str, Any]]) -> bool:
+    """True if the reservation is active and the post is still reserved under it."""
+    if res_data.get("status") != "Active" or not post_data:
+        return False
+    if post_data.get("status") != PostStatus.RESERVED or post_data.get("receiver_id") != res_data.get("receiver_id"):
+        return False
+    # Posts reserved before reservation_id was stored only carry the receiver
+    return post_data.get("reservation_id") in (None, res_id)
+
+
+def reserved_updates(receiver_id: str, reservation_id: str, now: datetime.datetime) -> Dict[str, Any]:
+    """Post fields for a post reserved by receiver_id under reservation_id."""
+    return {
+        "status": PostStatus.RESERVED,
+        "receiver_id": receiver_id,
+        "reserved_at": now,
+        "reservation_id": reservation_id,
+        "updated_at": now,
+    }
+
+
+def new_reservation(post_id: str, post_data: Dict[str, Any], receiver_details: Optional[Dict[str, Any]],
+                    donor_details: Union[UserPublic, Dict[str, Any], None],
+                    now: datetime.datetime) -> Dict[str, Any]:
+    """
+    Reservation record for a post that has just been reserved (post_data
+    already holds the reserved state), with copies of the post and both
+    users so listing reservations needs no further reads.
+    """
+    reservation = {
+        "post_id": post_id,
+        "receiver_id": post_data.get("receiver_id"),
+        "donor_id": post_data.get("donor_id"),
+        "timestamp": now,
+        "status": "Active", # "Active", "Completed", "Cancelled"
+        "post_snapshot": post_snapshot(post_data, donor_details),
+        "receiver_details": receiver_details,
+    }
+    if settings.RESERVATION_HOLD_SECONDS > 0:
+        # Released (or passed on to the waitlist) by the expiry sweeper if not collected by then
+        reservation["hold_expires_at"] = now + datetime.timedelta(seconds=settings.RESERVATION_HOLD_SECONDS)
+    return reservation
+
+
+# --- Waitlist ---
+
+def waitlist_ref(db, post_id: str):
+    """Receivers queued for a reserved post, one document per receiver (keyed by UID)."""
+    return db.collection('foodPosts').document(post_id).collection('waitlist')
+
+
+async def next_in_line(db, post_id: str):
+    """The earliest waitlist entry for a post, or None if nobody is waiting."""
+    docs = await waitlist_ref(db, post_id).order_by("joined_at").order_by("__name__").limit(1).get()
+    return docs[0] if docs else None
+
+
+async def waitlist_position(db, post_id: str, joined_at: datetime.datetime) -> int:
+    """1-based position of an entry that joined at joined_at (one count aggregation)."""
+    result = await waitlist_ref(db, post_id).where("joined_at", "<", joined_at).count().get()
+    return int(result[0][0].value) + 1
+
+
+def released_donor(res_data: Dict[str, Any], post_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Donor profile to copy onto the reservation that takes over from a released one."""
+    return (res_data.get("post_snapshot") or {}).get("donor_details") or post_data.get("donor_details")
+
+
+def add_promotion(db, batch, post_id: str, post_data: Dict[str, Any], next_entry,
+                  donor_details: Union[UserPublic, Dict[str, Any], None], now: datetime.datetime) -> Dict[str, Any]:
+    """
+    Adds the writes that hand a post to the receiver of a waitlist entry (a
+    new reservation, and removing the entry) to a batch. Returns the post
+    update; the caller writes it under its own precondition.
+    """
+    reservation_ref = db.collection('reservations').document()
+    post_update = reserved_updates(next_entry.id, reservation_ref.id, now)
+    batch.create(reservation_ref, new_reservation(
+        post_id, {**post_data, **post_update}, next_entry.to_dict().get("receiver_details"), donor_details, now
+    ))
+    batch.delete(next_entry.reference)
+    return post_update
+
+
+async def notify_promoted(outbox: NotificationOutbox, receiver_id: str, post_id: str, title: Optional[str]) -> None:
+    """
+    Tells a receiver taken off the waitlist that the post is now held for
+    them, through the notification outbox. Without it the hold could run
+    out before they knew it existed and pass on to the next receiver.
+    """
+    body = f"\"{title or 'A food post'}\" is now reserved for you."
+    hold = settings.RESERVATION_HOLD_SECONDS
+    if hold > 0:
+        within = f"{hold // 3600} hours" if hold >= 7200 else f"{max(1, round(hold / 60))} minutes"
+        body += f" Collect it within {within} or it passes to the next in line."
+    try:
+        await outbox.enqueue(
+            receiver_id, "You're next in line", body,
+            data={"type": "waitlist_promoted", "post_id": post_id},
+            coalesce_key=f"waitlist:{post_id}"
+        )
+    except Exception as e:
+        print(f"Error queuing waitlist notification for user {receiver_id}: {e}")
+
+
+def add_release(db, batch, post_doc, res_doc, reason: str, now: datetime.datetime,
+                next_entry=None) -> Dict[str, Any]:
+    """
+    Adds the writes that end an active reservation to a batch and marks the
+    reservation 'Cancelled'. If a receiver is waiting (next_entry, from
+    next_in_line) the post passes straight to them under a new reservation
+    and their waitlist entry is removed; otherwise it goes back to
+    'Available', or 'Expired' if its expiry has passed meanwhile. The post
+    update only applies if the post is unchanged since it was read, so a
+    release never races a collection or another release. Returns the post
+    update.
+    """
+    post_data = post_doc.to_dict()
+    expiry = post_data.get("expiry")
+    expired = bool(expiry and expiry <= now)
+    res_data = res_doc.to_dict()
+
+    if next_entry is not None and not expired:
+        post_update = add_promotion(db, batch, post_doc.id, post_data, next_entry, released_donor(res_data, post_data), now)
+    else:
+        post_update = {
+            "status": PostStatus.EXPIRED if expired else PostStatus.AVAILABLE,
+            "receiver_id": None,
+            "reserved_at": None,
+            "reservation_id": None,
+            "updated_at": now,
+        }
+    batch.update(post_doc.reference, post_update, option=db.write_option(last_update_time=post_doc.update_time))
+
+    res_update = {"status": "Cancelled", "cancelled_at": now, "cancel_reason": reason}
+    if res_data.get("post_snapshot"):
+        res_update.update(snapshot_updates(**post_update))
+    batch.update(res_doc.reference, res_update)
+    return post_update
+
+
+async def promote_late_waiter(db, outbox: NotificationOutbox, post_id: str,
+                              donor_details: Union[UserPublic, Dict[str, Any], None],
+                              now: datetime.datetime) -> Optional[str]:
+    """
+    Hands a post that a release has just returned to the feed to a receiver
+    who joined the waitlist after the release read it. The join checks the
+    post after writing its entry and the release checks the waitlist after
+    writing the post, so one of them always sees the other. Returns the
+    promoted receiver's ID, or None if nobody was waiting or the post has
+    moved on (e.g. the late receiver reserved it directly).
+    """
+    entry = await next_in_line(db, post_id)
+    if entry is None:
+        return None
+    post_doc = await db.collection('foodPosts').document(post_id).get()
+    post_data = post_doc.to_dict() if post_doc.exists else None
+    if not post_data or post_data.get("status") != PostStatus.AVAILABLE:
+        return None
+    expiry = post_data.get("expiry")
+    if expiry and expiry <= now:
+        return None
+
+    batch = db.batch()
+    post_update = add_promotion(db, batch, post_id, post_data, entry, donor_details, now)
+    batch.update(post_doc.reference, post_update, option=db.write_option(last_update_time=post_doc.update_time))
+    try:
+        await batch.commit()
+    except FailedPrecondition:
+        return None
+    await notify_promoted(outbox, entry.id, post_id, post_data.get("title"))
+    return entry.id
@@ -0,0 +1,84 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Entries are dropped this long before the token's own exp, so a cached
+# token is never accepted after Firebase would reject it
+EXPIRY_MARGIN_SECONDS = 5.0
+
+
+def token_key(id_token: str) -> str:
+    """Cache key for a token; the raw bearer token is never kept in memory as a key."""
+    return hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified Firebase ID-token claims, keyed by a hash of the
+    token. An entry is valid until the token's exp. If revocation checking is
+    on, entries are also re-verified (including the revocation check) every
+    revocation_ttl_seconds, which bounds how long a revoked token is accepted.
+    """
+
+    def __init__(self, max_entries: int, revocation_ttl_seconds: Optional[float] = None,
+                 clock: Callable[[], float] = time.time):
+        self._max_entries = max_entries
+        self._revocation_ttl_seconds = revocation_ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (claims, valid_until)
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+
+    def get(self, id_token: str) -> Optional[Dict[str, Any]]:
+        key = token_key(id_token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            claims, valid_until = entry
+            if valid_until <= self._clock():
+                del self._entries[key]
+                self._expired += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return claims
+
+    def put(self, id_token: str, claims: Dict[str, Any]) -> None:
+        exp = claims.get("exp")
+        if not exp:
+            return
+        valid_until = exp - EXPIRY_MARGIN_SECONDS
+        if self._revocation_ttl_seconds is not None:
+            valid_until = min(valid_until, self._clock() + self._revocation_ttl_seconds)
+        if valid_until <= self._clock():
+            return
+
+        key = token_key(id_token)
+        with self._lock:
+            self._entries[key] = (claims, valid_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self._hits + self._misses
+        return {
+            "size": size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / lookups if lookups else None,
+            "expired": self._expired,
+            "evictions": self._evictions,
+        }
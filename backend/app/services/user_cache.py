@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.schemas import UserInDB
+
+
+class UserCache:
+    """
+    In-process TTL cache of user profiles (UserInDB) keyed by UID, so
+    authenticated requests do not re-read the user's document every time.
+
+    Writes that go through FirebaseService invalidate the entry in this
+    process. Other workers only see the change once their entry expires,
+    unless the optional Firestore listener is started: it invalidates the
+    entry of every user document that changes, in every worker.
+
+    Every invalidation also bumps the user's generation. A reader takes
+    generation() before reading the document and passes it to put(), which
+    drops the result if the user was invalidated while the read was in
+    flight, so a stale profile cannot be cached over a newer write.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[UserInDB, float]]" = OrderedDict()
+        # Invalidation count per UID; one int per user changed in this process
+        self._generations: Dict[str, int] = {}
+        self._watch = None
+        self._listener_ready = False
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._listener_invalidations = 0
+        self._stale_puts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl_seconds > 0 and self._max_entries > 0
+
+    def get(self, user_id: str) -> Optional[UserInDB]:
+        """Returns a copy of the cached profile, or None if absent or expired."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] <= self._clock():
+                if entry is not None:
+                    del self._entries[user_id]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._hits += 1
+            return entry[0].model_copy()
+
+    def generation(self, user_id: str) -> int:
+        """Current generation of user_id; take it before reading the document to put()."""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, user: UserInDB, generation: Optional[int] = None) -> None:
+        """Caches the profile, unless the user was invalidated since `generation` was taken."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and self._generations.get(user.user_id, 0) != generation:
+                self._stale_puts += 1
+                return
+            self._entries[user.user_id] = (user.model_copy(), self._clock() + self._ttl_seconds)
+            self._entries.move_to_end(user.user_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if self._entries.pop(user_id, None) is not None:
+                self._invalidations += 1
+
+    # --- Optional cross-worker invalidation ---
+
+    def start_listener(self, source) -> None:
+        """
+        Attaches an on_snapshot listener (e.g. to the 'users' collection).
+        Note the initial snapshot reads every matching document once.
+        """
+        try:
+            self._watch = source.on_snapshot(self._on_snapshot)
+        except Exception as e:
+            self._watch = None
+            print(f"Error starting user cache listener: {e}")
+
+    def stop_listener(self) -> None:
+        watch, self._watch = self._watch, None
+        self._listener_ready = False
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                print(f"Error stopping user cache listener: {e}")
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        """Listener callback (runs on the Firestore watch thread)."""
+        if not self._listener_ready:
+            # The initial snapshot lists every user; nothing has changed yet
+            self._listener_ready = True
+            return
+        with self._lock:
+            for change in changes:
+                user_id = change.document.id
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+                if self._entries.pop(user_id, None) is not None:
+                    self._listener_invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "size": size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / lookups if lookups else None,
+            "invalidations": self._invalidations,
+            "listener": self._watch is not None and bool(getattr(self._watch, "is_active", True)),
+            "listener_invalidations": self._listener_invalidations,
+            "stale_puts": self._stale_puts,
+        }
@@ -0,0 +1,244 @@
+"""
+Geocodes `users` and `foodPosts` documents whose `coordinates` are None
+(e.g. users whose address could not be geocoded at registration) and writes
+the results back with a Firestore BulkWriter.
+
+Documents are streamed a page at a time and geocoded by a bounded pool of
+workers behind a token-bucket rate limiter, so the Geocoding API quota is
+respected. After every page the writes are flushed and the checkpoint file
+is moved past the documents that are finished: resolved, or with an address
+that could not be found. It stops short of the first lookup that failed
+because the API was unavailable, so an interrupted or later run picks up
+from there and retries it.
+
+Resolved posts that were waiting for an address ('Geocoding' or
+'GeocodeFailed') become 'Available', or 'Expired' if their expiry passed
+while they waited.
+
+Usage:
+    python scripts/backfill_coordinates.py [--collections users foodPosts]
+        [--concurrency 8] [--rate 20] [--page-size 500]
+        [--checkpoint backfill_coordinates.checkpoint.json] [--restart] [--dry-run]
+"""
+import sys
+import os
+import argparse
+import asyncio
+import datetime
+import json
+import time
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from app.config import get_db
+    from app.schemas import PostStatus
+    from app.services import geohash
+    from app.services.google_maps import GoogleMapsService, close_http_client
+    from app.services.rate_limit import TokenBucket
+except ImportError as e:
+    print(f"Error importing app modules: {e}")
+    print("Make sure you are running this script from the root 'backend' folder or 'backend/scripts'.")
+    sys.exit(1)
+
+COLLECTIONS = ["users", "foodPosts"]
+
+# Posts in these states become visible once they have coordinates
+WAITING_FOR_ADDRESS = {PostStatus.GEOCODING.value, PostStatus.GEOCODE_FAILED.value}
+
+
+class Checkpoint:
+    """Last fully processed document ID per collection, persisted as JSON."""
+
+    def __init__(self, path, restart):
+        self.path = path
+        self.state = {}
+        if not restart and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+            print(f"↪️  Resuming from checkpoint {path}: {self.state}")
+
+    def last_id(self, collection):
+        return self.state.get(collection)
+
+    def save(self, collection, doc_id):
+        self.state[collection] = doc_id
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)  # Atomic, so a crash never leaves a torn file
+
+
+class Stats:
+    def __init__(self):
+        self.scanned = 0
+        self.resolved = 0
+        self.not_found = 0
+        self.no_address = 0
+        self.errors = 0
+        self.write_errors = 0
+
+
+def fetch_page(db, collection, after_id, page_size):
+    # Runs in a worker thread: the sync client blocks while a page streams in
+    query = (
+        db.collection(collection)
+        .where("coordinates", "==", None)
+        .order_by(FieldPath.document_id())
+        .select(["address", "status", "expiry"])
+        .limit(page_size)
+    )
+    if after_id:
+        query = query.start_after({"__name__": after_id})
+    return list(query.stream())
+
+
+async def geocode_doc(doc, collection, maps_service, bucket, writer, stats, dry_run):
+    """Geocodes one document. Returns False if the lookup should be retried on a later run."""
+    data = doc.to_dict() or {}
+    address = data.get("address")
+    if not address:
+        stats.no_address += 1
+        return True
+
+    # Wait out an open circuit instead of burning through the page as failures
+    while maps_service.breaker.state == "open":
+        await asyncio.sleep(1.0)
+
+    hit, _ = await maps_service.cache.lookup(address)
+    if not hit:
+        await bucket.acquire()  # Only real API calls count against the quota
+    coordinates = await maps_service.get_coordinates_for_address(address)
+
+    if coordinates is None:
+        address_not_found, _ = await maps_service.cache.lookup(address)
+        if address_not_found:
+            stats.not_found += 1
+            return True
+        stats.errors += 1
+        return False
+
+    update = {
+        "coordinates": coordinates.model_dump(),
+        "geohash": geohash.encode(coordinates.lat, coordinates.lng),
+    }
+    if collection == "foodPosts":
+        now = datetime.datetime.now(datetime.timezone.utc)
+        update["updated_at"] = now
+        if data.get("status") in WAITING_FOR_ADDRESS:
+            # A post that waited past its expiry must not reappear in the feed
+            expiry = data.get("expiry")
+            update["status"] = PostStatus.EXPIRED if expiry and expiry <= now else PostStatus.AVAILABLE
+            update["geocode_error"] = None
+
+    if not dry_run:
+        writer.update(doc.reference, update)
+    stats.resolved += 1
+    return True
+
+
+async def backfill_collection(db, collection, args, checkpoint, maps_service, bucket, writer, stats):
+    print(f"\n🌍 Backfilling coordinates on '{collection}'...")
+    after_id = checkpoint.last_id(collection)
+    pending = set()
+    retry_pending = False  # Set once a lookup failed; the checkpoint stays before it
+
+    while True:
+        docs = await asyncio.to_thread(fetch_page, db, collection, after_id, args.page_size)
+        if not docs:
+            break
+
+        tasks = []
+        for doc in docs:
+            stats.scanned += 1
+            if len(pending) >= args.concurrency:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            task = asyncio.create_task(
+                geocode_doc(doc, collection, maps_service, bucket, writer, stats, args.dry_run)
+            )
+            pending.add(task)
+            tasks.append(task)
+
+        if pending:
+            await asyncio.wait(pending)
+            pending = set()
+
+        # The checkpoint only covers the documents before the first one to retry
+        finished_id = None
+        for doc, task in zip(docs, tasks):
+            if retry_pending or task.exception() is not None or not task.result():
+                retry_pending = True
+                break
+            finished_id = doc.id
+
+        # Page done: make its writes durable before moving the checkpoint past it
+        if not args.dry_run:
+            await asyncio.to_thread(writer.flush)
+            if finished_id:
+                checkpoint.save(collection, finished_id)
+        after_id = docs[-1].id
+        print(f"   - {stats.scanned} scanned, {stats.resolved} resolved, "
+              f"{stats.not_found} not found, {stats.errors} errors (through {after_id})")
+
+        if len(docs) < args.page_size:
+            break
+
+    if retry_pending and not args.dry_run:
+        print("   ⚠️ Some lookups failed; the checkpoint stops before the first one. Run again to retry them.")
+
+
+async def backfill(args):
+    try:
+        db = get_db()
+    except Exception as e:
+        print(f"❌ Failed to connect to Firestore. Check your .env and Service Account Key.\nError: {e}")
+        return
+
+    stats = Stats()
+    checkpoint = Checkpoint(args.checkpoint, args.restart)
+    maps_service = GoogleMapsService.from_settings()
+    bucket = TokenBucket(rate=args.rate, capacity=args.concurrency)
+
+    writer = db.bulk_writer()
+
+    def on_write_error(failure, bulk_writer):
+        if failure.attempts < 5:
+            return True  # Retry
+        stats.write_errors += 1
+        print(f"   ⚠️ Write failed for {failure.operation.reference.path}: {failure.message}")
+        return False
+
+    writer.on_write_error(on_write_error)
+
+    started = time.perf_counter()
+    try:
+        for collection in args.collections:
+            await backfill_collection(db, collection, args, checkpoint, maps_service, bucket, writer, stats)
+    finally:
+        await asyncio.to_thread(writer.close)
+        await close_http_client()
+    elapsed = time.perf_counter() - started
+
+    print(f"\n✨ Done in {elapsed:.1f}s{' (dry run, nothing written)' if args.dry_run else ''}.")
+    print(f"   Scanned: {stats.scanned}, resolved: {stats.resolved}, not found: {stats.not_found}, "
+          f"no address: {stats.no_address}, geocoding errors: {stats.errors}, write errors: {stats.write_errors}")
+    print(f"   Throughput: {stats.scanned / elapsed if elapsed else 0:.1f} docs/s, "
+          f"time spent waiting on the rate limit: {bucket.waited_seconds:.1f}s")
+    print(f"   Geocoding API: {maps_service.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Geocode users and posts that have no coordinates.")
+    parser.add_argument("--collections", nargs="+", choices=COLLECTIONS, default=COLLECTIONS)
+    parser.add_argument("--concurrency", type=int, default=8, help="Geocoding requests in flight at once.")
+    parser.add_argument("--rate", type=float, default=20.0, help="Geocoding API requests per second.")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--checkpoint", default="backfill_coordinates.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over.")
+    parser.add_argument("--dry-run", action="store_true", help="Geocode but do not write anything.")
+    args = parser.parse_args()
+
+    asyncio.run(backfill(args))
@@ -0,0 +1,72 @@
+import sys
+import os
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from app.config import get_db
+    from app.services import geohash
+except ImportError as e:
+    print(f"Error importing app modules: {e}")
+    print("Make sure you are running this script from the root 'backend' folder or 'backend/scripts'.")
+    sys.exit(1)
+
+BATCH_SIZE = 500  # Firestore limit for writes in a single batch
+
+
+# Posts are found by geohash for the nearby feed, receivers for new-post notifications
+COLLECTIONS = ['foodPosts', 'users']
+
+
+def backfill_geohashes():
+    try:
+        db = get_db()
+    except Exception as e:
+        print(f"❌ Failed to connect to Firestore. Check your .env and Service Account Key.\nError: {e}")
+        return
+
+    for collection in COLLECTIONS:
+        backfill_collection(db, collection)
+
+
+def backfill_collection(db, collection):
+    print(f"\n🌍 Backfilling geohashes on '{collection}'...")
+
+    docs_ref = db.collection(collection)
+    batch = db.batch()
+    pending = 0
+    scanned = 0
+    updated = 0
+    skipped = 0
+
+    for doc in docs_ref.select(["coordinates", "geohash"]).stream():
+        scanned += 1
+        doc_data = doc.to_dict() or {}
+        coords = doc_data.get("coordinates")
+        if not coords or coords.get("lat") is None or coords.get("lng") is None:
+            skipped += 1
+            continue
+
+        expected = geohash.encode(coords["lat"], coords["lng"])
+        if doc_data.get("geohash") == expected:
+            continue
+
+        batch.update(doc.reference, {"geohash": expected})
+        pending += 1
+        updated += 1
+
+        if pending >= BATCH_SIZE:
+            batch.commit()
+            print(f"   - Committed {updated} updates so far ({scanned} scanned)")
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+
+    print(f"✨ Done with '{collection}'. Scanned: {scanned}, updated: {updated}, skipped (no coordinates): {skipped}")
+
+
+if __name__ == "__main__":
+    backfill_geohashes()
@@ -0,0 +1,121 @@
+"""
+Measures per-request auth overhead in get_current_user_data with and
+without the verified-token cache.
+
+Real Firebase verification needs Google's certificates, so tokens here are
+RS256 JWTs signed with a local key and verified by google.auth.jwt against
+its certificate - the same signature and claims checks firebase_admin runs
+on every call, run off the event loop as FirebaseService does. A session of
+`--tokens` users each making `--requests-per-token` requests is replayed
+through the dependency.
+
+Usage: python scripts/benchmark_auth.py [--tokens 50] [--requests-per-token 40]
+"""
+import sys
+import os
+import argparse
+import asyncio
+import datetime
+import statistics
+import time
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi.security import HTTPAuthorizationCredentials
+from google.auth import crypt, jwt
+
+from app.config import settings
+from app.dependencies import get_current_user_data
+from app.services.token_cache import TokenCache
+
+PROJECT_ID = "foodaid-benchmark"
+KEY_ID = "benchmark-key"
+
+
+def make_signing_material():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "benchmark")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name)
+        .public_key(key.public_key()).serial_number(1)
+        .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+    signer = crypt.RSASigner.from_string(key_pem, key_id=KEY_ID)
+    return signer, {KEY_ID: cert.public_bytes(serialization.Encoding.PEM).decode()}
+
+
+def make_token(signer, uid):
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}", "aud": PROJECT_ID,
+        "auth_time": now, "iat": now, "exp": now + 3600, "sub": uid, "user_id": uid,
+        "email": f"{uid}@example.com",
+    }
+    return jwt.encode(signer, payload).decode()
+
+
+class LocallyVerifyingService:
+    """Stands in for FirebaseService.verify_firebase_token with the same crypto work."""
+
+    def __init__(self, certs):
+        self.certs = certs
+        self.verifications = 0
+
+    async def verify_firebase_token(self, id_token, check_revoked=False):
+        self.verifications += 1
+        claims = await asyncio.to_thread(jwt.decode, id_token, certs=self.certs, audience=PROJECT_ID)
+        claims["uid"] = claims["sub"]
+        return claims
+
+
+async def replay(tokens, requests_per_token, service, cache):
+    latencies = []
+    for _ in range(requests_per_token):
+        for token in tokens:
+            creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+            started = time.perf_counter()
+            await get_current_user_data(creds, service, cache)
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(label, latencies, service):
+    latencies.sort()
+    print(f"{label:<18}{statistics.mean(latencies) * 1e6:>10.1f}{latencies[len(latencies) // 2] * 1e6:>10.1f}"
+          f"{latencies[int(len(latencies) * 0.99)] * 1e6:>10.1f}{service.verifications:>15}")
+
+
+async def main(n_tokens, requests_per_token):
+    signer, certs = make_signing_material()
+    tokens = [make_token(signer, f"user_{i}") for i in range(n_tokens)]
+
+    print(f"{n_tokens} tokens x {requests_per_token} requests each")
+    print(f"{'':<18}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'verifications':>15}")
+
+    settings.AUTH_TOKEN_CACHE_MAX_ENTRIES = 0
+    service = LocallyVerifyingService(certs)
+    report("no cache", await replay(tokens, requests_per_token, service, TokenCache(0)), service)
+
+    settings.AUTH_TOKEN_CACHE_MAX_ENTRIES = 10000
+    service = LocallyVerifyingService(certs)
+    cache = TokenCache(settings.AUTH_TOKEN_CACHE_MAX_ENTRIES)
+    report("token cache", await replay(tokens, requests_per_token, service, cache), service)
+    print(f"\nCache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark auth overhead with and without the token cache.")
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--requests-per-token", type=int, default=40)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.tokens, args.requests_per_token))
@@ -0,0 +1,59 @@
+"""
+Micro-benchmark of the GET /posts distance step: the per-post geopy path
+(Coordinates.model_validate + geodesic for every post) against the batch
+NumPy haversine path used by GoogleMapsService.calculate_distances_km.
+
+Usage: python scripts/benchmark_distance.py
+"""
+import sys
+import os
+import random
+import time
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.schemas import Coordinates
+from app.services.google_maps import GoogleMapsService
+
+REPEATS = 5
+
+
+def per_item_geopy(maps_service, origin, raw_coords):
+    distances = []
+    for coords in raw_coords:
+        post_coords = Coordinates.model_validate(coords)
+        distances.append(maps_service.calculate_distance_km(origin, post_coords))
+    return distances
+
+
+def batch_numpy(maps_service, origin, raw_coords):
+    lats, lngs = maps_service.coordinate_arrays(raw_coords)
+    return maps_service.calculate_distances_km(origin, lats, lngs)
+
+
+def best_of(fn, *args):
+    best = float("inf")
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+if __name__ == "__main__":
+    rng = random.Random(7)
+    maps_service = GoogleMapsService.from_settings()
+    origin = Coordinates(lat=-25.7479, lng=28.2293)
+
+    print(f"{'posts':>8}{'geopy ms':>12}{'numpy ms':>12}{'speedup':>10}{'max err m':>12}")
+    for n_posts in (100, 1_000, 5_000, 20_000):
+        raw_coords = [
+            {"lat": rng.uniform(-34.8, -22.1), "lng": rng.uniform(16.5, 32.9)}
+            for _ in range(n_posts)
+        ]
+        geopy_ms, exact = best_of(per_item_geopy, maps_service, origin, raw_coords)
+        numpy_ms, approx = best_of(batch_numpy, maps_service, origin, raw_coords)
+        max_error_m = max(abs(a - e) for a, e in zip(approx, exact)) * 1000
+        print(f"{n_posts:>8,}{geopy_ms:>12.2f}{numpy_ms:>12.2f}{geopy_ms / numpy_ms:>9.0f}x{max_error_m:>12.0f}")
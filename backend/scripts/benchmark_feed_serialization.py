@@ -0,0 +1,106 @@
+"""
+Compares CPU time and payload size of serializing a 1,000-post feed:
+the previous path (FoodPostPublic.model_validate per post, then FastAPI's
+response_model validation and JSON encoding) against the orjson fast path,
+with and without a fields= projection.
+
+Usage: python scripts/benchmark_feed_serialization.py
+"""
+import sys
+import os
+import datetime
+import json
+import random
+import time
+from typing import List
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pydantic import TypeAdapter
+
+from app.schemas import FoodPostPublic, UserPublic
+from app.responses import dumps
+
+N_POSTS = 1_000
+N_DONORS = 50
+REPEATS = 10
+PROJECTION = ["post_id", "title", "quantity", "expiry", "distance_km", "image_url"]
+
+
+def make_feed(rng):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    donors = [
+        UserPublic(
+            user_id=f"donor_{i}", email=f"donor{i}@example.com", role="Donor", name=f"Bakery {i}",
+            address=f"{i} Pretorius St, Pretoria", phone_number="+27123456789",
+            coordinates={"lat": -25.7479, "lng": 28.2293}, verification_status="Approved",
+        )
+        for i in range(N_DONORS)
+    ]
+    posts = []
+    for i in range(N_POSTS):
+        posts.append({
+            "post_id": f"post_{i}",
+            "donor_id": f"donor_{i % N_DONORS}",
+            "title": "Surplus Bread Loaves",
+            "description": "20 loaves of brown bread baked this morning. " * 4,
+            "quantity": "20 Loaves",
+            "address": "123 Pretorius St, Pretoria",
+            "expiry": now + datetime.timedelta(days=2),
+            "image_url": "https://placehold.co/600x400/orange/white?text=Bread",
+            "status": "Available",
+            "created_at": now,
+            "coordinates": {"lat": rng.uniform(-26, -25), "lng": rng.uniform(28, 29)},
+            "geohash": "ke7vb0000",
+            "receiver_id": None,
+            "reserved_at": None,
+            "distance_km": rng.uniform(0, 50),
+        })
+    return posts, {d.user_id: d for d in donors}
+
+
+def previous_path(posts, donors):
+    models = []
+    for post in posts:
+        data = dict(post)
+        data["donor_details"] = donors[post["donor_id"]]
+        models.append(FoodPostPublic.model_validate(data))
+    # FastAPI re-validates against response_model, then encodes
+    adapter = TypeAdapter(List[FoodPostPublic])
+    content = adapter.dump_python(adapter.validate_python(models), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(posts, donors, fields):
+    donors_json = {uid: d.model_dump(mode="json") for uid, d in donors.items()}
+    content = []
+    for post in posts:
+        if "donor_details" in fields:
+            post["donor_details"] = donors_json.get(post["donor_id"])
+        content.append({name: post.get(name) for name in fields})
+    return dumps(content)
+
+
+def best_of(fn, *args):
+    best = float("inf")
+    body = b""
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        body = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, len(body)
+
+
+if __name__ == "__main__":
+    posts, donors = make_feed(random.Random(1))
+    results = [
+        ("model_validate + response_model", best_of(previous_path, posts, donors)),
+        ("orjson, all fields", best_of(fast_path, [dict(p) for p in posts], donors, list(FoodPostPublic.model_fields))),
+        (f"orjson, fields={','.join(PROJECTION)}", best_of(fast_path, [dict(p) for p in posts], donors, PROJECTION)),
+    ]
+
+    print(f"{N_POSTS:,}-post feed (best of {REPEATS})")
+    print(f"{'path':<70}{'ms':>8}{'KiB':>10}")
+    for name, (ms, size) in results:
+        print(f"{name:<70}{ms:>8.2f}{size / 1024:>10.1f}")
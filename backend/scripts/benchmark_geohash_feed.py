@@ -0,0 +1,88 @@
+"""
+Compares documents read and query latency for the GET /posts feed with and
+without geohash radius queries, against an in-memory stand-in for a
+geohash-ordered Firestore index.
+
+Usage: python scripts/benchmark_geohash_feed.py [radius_km]
+"""
+import sys
+import os
+import bisect
+import math
+import random
+import time
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import geohash
+
+# Rough bounding box of South Africa
+MIN_LAT, MAX_LAT = -34.8, -22.1
+MIN_LNG, MAX_LNG = 16.5, 32.9
+QUERIES = 200
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    d_lat = math.radians(lat2 - lat1)
+    d_lng = math.radians(lng2 - lng1)
+    a = math.sin(d_lat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lng / 2) ** 2
+    return 6371.0088 * 2 * math.asin(math.sqrt(a))
+
+
+def build_index(n_posts, rng):
+    posts = []
+    for _ in range(n_posts):
+        lat = rng.uniform(MIN_LAT, MAX_LAT)
+        lng = rng.uniform(MIN_LNG, MAX_LNG)
+        posts.append((geohash.encode(lat, lng), lat, lng))
+    posts.sort()
+    return posts, [p[0] for p in posts]
+
+
+def full_scan(posts, lat, lng, radius_km):
+    hits = [p for p in posts if haversine_km(lat, lng, p[1], p[2]) <= radius_km]
+    return len(posts), len(hits)
+
+
+def geohash_scan(posts, keys, lat, lng, radius_km):
+    reads = 0
+    hits = 0
+    for prefix in geohash.covering_prefixes(lat, lng, radius_km) or []:
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + geohash.PREFIX_RANGE_END)
+        for p in posts[start:end]:
+            reads += 1
+            if haversine_km(lat, lng, p[1], p[2]) <= radius_km:
+                hits += 1
+    return reads, hits
+
+
+def run(n_posts, radius_km):
+    rng = random.Random(42)
+    posts, keys = build_index(n_posts, rng)
+    origins = [(rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LNG, MAX_LNG)) for _ in range(QUERIES)]
+
+    results = {}
+    for name, fn in (("full scan", lambda la, ln: full_scan(posts, la, ln, radius_km)),
+                     ("geohash", lambda la, ln: geohash_scan(posts, keys, la, ln, radius_km))):
+        total_reads = 0
+        total_hits = 0
+        start = time.perf_counter()
+        for lat, lng in origins:
+            reads, hits = fn(lat, lng)
+            total_reads += reads
+            total_hits += hits
+        elapsed_ms = (time.perf_counter() - start) * 1000 / QUERIES
+        results[name] = (total_reads / QUERIES, total_hits / QUERIES, elapsed_ms)
+
+    print(f"\n{n_posts:,} posts, radius {radius_km} km ({QUERIES} random queries)")
+    print(f"{'strategy':<12}{'reads/query':>14}{'matches/query':>16}{'ms/query':>12}")
+    for name, (reads, hits, ms) in results.items():
+        print(f"{name:<12}{reads:>14,.1f}{hits:>16,.1f}{ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    radius = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    for n in (10_000, 100_000):
+        run(n, radius)
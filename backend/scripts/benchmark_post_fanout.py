@@ -0,0 +1,181 @@
+"""
+Benchmarks the new-post push fan-out to `--receivers` receivers near one
+post, against a fake messaging backend (each multicast request blocks for
+`--latency` ms, like the Admin SDK waiting on FCM) and an in-memory
+stand-in for the geohash-ordered 'users' index.
+
+Reports the time the donor's request spends queuing the post, documents
+read to target receivers compared with scanning every receiver, and the
+fan-out time for different worker pool sizes.
+
+Usage: python scripts/benchmark_post_fanout.py [--receivers 50000] [--latency 150] [--failure-rate 0.02]
+"""
+import sys
+import os
+import argparse
+import asyncio
+import bisect
+import math
+import random
+import threading
+import time
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import geohash
+from app.services.google_maps import GoogleMapsService
+from app.services.post_notifier import MULTICAST_CHUNK_SIZE, NewPostNotifier
+from app.services.push_tokens import PushTokenPruner
+
+# Post in central Pretoria; targeted receivers live within TARGET_SPREAD_KM of it
+POST_COORDS = {"lat": -25.7479, "lng": 28.2293}
+RADIUS_KM = 10.0
+TARGET_SPREAD_KM = 8.0
+# Receivers elsewhere in South Africa that the index should never read
+OTHER_RECEIVERS = 200_000
+MIN_LAT, MAX_LAT = -34.8, -22.1
+MIN_LNG, MAX_LNG = 16.5, 32.9
+
+
+def haversine_km(a, b):
+    d_lat = math.radians(b["lat"] - a["lat"])
+    d_lng = math.radians(b["lng"] - a["lng"])
+    h = math.sin(d_lat / 2) ** 2 + math.cos(math.radians(a["lat"])) * math.cos(math.radians(b["lat"])) * math.sin(d_lng / 2) ** 2
+    return 6371.0088 * 2 * math.asin(math.sqrt(h))
+
+
+class FakeSendResponse:
+    def __init__(self, success):
+        self.success = success
+        self.exception = None if success else Exception("Requested entity was not found.")
+
+
+class FakeBatchResponse:
+    def __init__(self, responses):
+        self.responses = responses
+        self.success_count = sum(1 for r in responses if r.success)
+        self.failure_count = len(responses) - self.success_count
+
+
+class FakeMessaging:
+    """Stands in for messaging.send_each_for_multicast: blocks for `latency` seconds per request."""
+
+    def __init__(self, latency, failure_rate, seed=7):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def send_each_for_multicast(self, message):
+        if len(message.tokens) > MULTICAST_CHUNK_SIZE:
+            raise ValueError(f"tokens must not contain more than {MULTICAST_CHUNK_SIZE} tokens")
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            outcomes = [self.rng.random() >= self.failure_rate for _ in message.tokens]
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+        return FakeBatchResponse([FakeSendResponse(ok) for ok in outcomes])
+
+
+class IndexedNotifier(NewPostNotifier):
+    """Reads receivers from an in-memory list sorted by geohash instead of Firestore."""
+
+    def __init__(self, receivers, **kwargs):
+        super().__init__(lambda: None, RADIUS_KM, GoogleMapsService.from_settings(),
+                         PushTokenPruner(lambda: None), **kwargs)
+        self.receivers = receivers
+        self.keys = [r["geohash"] for r in receivers]
+        self.reads = 0
+
+    async def _read_receivers(self, db, prefix):
+        if prefix is None:
+            docs = self.receivers
+        else:
+            start = bisect.bisect_left(self.keys, prefix)
+            end = bisect.bisect_left(self.keys, prefix + geohash.PREFIX_RANGE_END)
+            docs = self.receivers[start:end]
+        self.reads += len(docs)
+        return docs
+
+
+def make_receivers(n_targeted, rng):
+    receivers = []
+    # Roughly 1 degree of latitude per 111 km; longitude scaled for Pretoria's latitude
+    lat_spread = TARGET_SPREAD_KM / 111.0
+    lng_spread = TARGET_SPREAD_KM / 100.0
+    for i in range(n_targeted):
+        while True:
+            d_lat, d_lng = rng.uniform(-1, 1), rng.uniform(-1, 1)
+            if d_lat ** 2 + d_lng ** 2 <= 1:
+                break
+        lat = POST_COORDS["lat"] + d_lat * lat_spread
+        lng = POST_COORDS["lng"] + d_lng * lng_spread
+        receivers.append((lat, lng, f"near_{i}"))
+    for i in range(OTHER_RECEIVERS):
+        lat, lng = rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LNG, MAX_LNG)
+        receivers.append((lat, lng, f"far_{i}"))
+
+    docs = [{
+        "user_id": uid,
+        "coordinates": {"lat": lat, "lng": lng},
+        "geohash": geohash.encode(lat, lng),
+        "fcm_token": f"token_{uid}",
+    } for lat, lng, uid in receivers]
+    docs.sort(key=lambda d: d["geohash"])
+    return docs
+
+
+async def fan_out(receivers, workers, latency, failure_rate):
+    backend = FakeMessaging(latency, failure_rate)
+    notifier = IndexedNotifier(receivers, send=backend.send_each_for_multicast)
+    notifier.start(workers)
+
+    started = time.perf_counter()
+    notifier.enqueue("benchmark_post", "Benchmark Bread Loaves", POST_COORDS, "benchmark_donor")
+    enqueue_us = (time.perf_counter() - started) * 1e6
+    await notifier.join()
+    elapsed = time.perf_counter() - started
+    await notifier.stop()
+    return notifier, backend, enqueue_us, elapsed
+
+
+async def main(n_receivers, latency_ms, failure_rate):
+    rng = random.Random(42)
+    print(f"🏗️  Building {n_receivers:,} receivers within {TARGET_SPREAD_KM} km of the post "
+          f"and {OTHER_RECEIVERS:,} elsewhere...")
+    receivers = make_receivers(n_receivers, rng)
+    latency = latency_ms / 1000
+    expected = sum(1 for r in receivers if haversine_km(POST_COORDS, r["coordinates"]) <= RADIUS_KM)
+    print(f"   {expected:,} receivers within {RADIUS_KM} km")
+
+    print(f"\n📨 Fan-out, fake FCM at {latency_ms:.0f} ms per multicast request, {failure_rate:.0%} failed tokens")
+    print(f"{'workers':>8}{'enqueue µs':>12}{'docs read':>12}{'requests':>10}{'in flight':>11}"
+          f"{'sent':>9}{'failed':>8}{'seconds':>9}")
+    for workers in (1, 4, 8, 16):
+        notifier, backend, enqueue_us, elapsed = await fan_out(receivers, workers, latency, failure_rate)
+        stats = notifier.stats()
+        print(f"{workers:>8}{enqueue_us:>12.1f}{notifier.reads:>12,}{backend.requests:>10,}"
+              f"{backend.max_in_flight:>11}{stats['sent']:>9,}{stats['failed']:>8,}{elapsed:>9.2f}")
+        if stats["tokens_targeted"] != expected or stats["errors"]:
+            print(f"❌ Targeted {stats['tokens_targeted']:,} tokens (expected {expected:,}), {stats['errors']} errors")
+
+    print(f"\n   Scanning every receiver instead would read {len(receivers):,} documents per post.")
+    print(f"   One request per token would take {n_receivers:,} requests "
+          f"(~{n_receivers * latency / 60:.0f} min sequentially at this latency).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="New-post push fan-out benchmark with a fake FCM backend.")
+    parser.add_argument("--receivers", type=int, default=50_000)
+    parser.add_argument("--latency", type=float, default=150.0, help="Fake FCM latency per multicast request (ms).")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="Share of tokens the fake backend rejects.")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.receivers, args.latency, args.failure_rate))
@@ -0,0 +1,150 @@
+"""
+Runs GoogleMapsService against a local fake Geocoding API to exercise the
+pooled client, retries and circuit breaker without touching Google:
+
+  1. healthy     - pooled keep-alive client vs. a new connection per call
+  2. flaky       - OVER_QUERY_LIMIT / 503 on 2 of every 3 requests (retries recover)
+  3. hung        - upstream never answers in time (bounded by the read timeout)
+  4. outage      - every request fails (circuit opens, later calls fail fast)
+  5. recovery    - upstream healthy again after the reset timeout (circuit closes)
+
+Usage: python scripts/fake_geocoder_harness.py
+"""
+import sys
+import os
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+from app.config import settings
+
+# Short timeouts so the hung-upstream scenario finishes quickly
+settings.GEOCODE_READ_TIMEOUT_SECONDS = 0.5
+settings.GEOCODE_CONNECT_TIMEOUT_SECONDS = 0.5
+
+from app.services import google_maps
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.geocode_cache import GeocodeCache
+from app.services.google_maps import GoogleMapsService
+
+BREAKER_RESET_SECONDS = 1.0
+
+
+class FakeGeocoder(BaseHTTPRequestHandler):
+    mode = "healthy"
+    requests = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with FakeGeocoder.lock:
+            FakeGeocoder.requests += 1
+            n = FakeGeocoder.requests
+        mode = FakeGeocoder.mode
+
+        if mode == "hung":
+            time.sleep(2.0)
+        if mode == "outage" or (mode == "flaky" and n % 3 == 1):
+            self._reply(503, {"status": "UNKNOWN_ERROR"})
+        elif mode == "flaky" and n % 3 == 2:
+            self._reply(200, {"status": "OVER_QUERY_LIMIT", "results": []})
+        else:
+            self._reply(200, {"status": "OK", "results": [{"geometry": {"location": {"lat": -25.7479, "lng": 28.2293}}}]})
+
+    def _reply(self, code, body):
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client timed out and hung up
+
+    def log_message(self, *args):
+        pass
+
+
+def make_service(url, breaker):
+    # Memory-only cache, and unique addresses below, so every lookup reaches the fake server
+    service = GoogleMapsService(cache=GeocodeCache(None, 1000, 3600, 3600), breaker=breaker)
+    service.geocode_url = url
+    service.api_key = "fake-key"
+    return service
+
+
+async def lookups(service, label, n):
+    FakeGeocoder.requests = 0
+    results = []
+    started = time.perf_counter()
+    for i in range(n):
+        call_started = time.perf_counter()
+        coords = await service.get_coordinates_for_address(f"{label} {i} Pretorius St, Pretoria")
+        results.append((coords is not None, time.perf_counter() - call_started))
+    elapsed = time.perf_counter() - started
+    ok = sum(1 for success, _ in results if success)
+    slowest = max(duration for _, duration in results) * 1000
+    print(f"   {label:<10} {ok}/{n} resolved, {FakeGeocoder.requests} upstream requests, "
+          f"{elapsed * 1000:.0f} ms total, slowest call {slowest:.0f} ms")
+    return results
+
+
+async def unpooled_lookups(url, n):
+    # What each lookup used to do: open a client (and connection) per call
+    started = time.perf_counter()
+    for i in range(n):
+        async with httpx.AsyncClient() as client:
+            await client.get(url, params={"address": f"unpooled {i}", "key": "fake-key"})
+    return (time.perf_counter() - started) * 1000
+
+
+async def run_harness():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGeocoder)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/maps/api/geocode/json"
+    print(f"🛰️  Fake Geocoding API listening on {url}\n")
+
+    breaker = CircuitBreaker("fake-geocoding", failure_threshold=3, reset_timeout=BREAKER_RESET_SECONDS)
+    service = make_service(url, breaker)
+
+    print("1. Healthy upstream")
+    FakeGeocoder.mode = "healthy"
+    await lookups(service, "warmup", 5)
+    await lookups(service, "healthy", 200)
+    print(f"   unpooled   200 calls with a new client each: {await unpooled_lookups(url, 200):.0f} ms total")
+
+    print("\n2. Flaky upstream (2 of every 3 requests fail)")
+    FakeGeocoder.mode = "flaky"
+    await lookups(service, "flaky", 20)
+
+    print("\n3. Hung upstream")
+    FakeGeocoder.mode = "hung"
+    await lookups(service, "hung", 1)
+    breaker.record_success()  # Start the outage scenario from a closed circuit
+
+    print("\n4. Outage")
+    FakeGeocoder.mode = "outage"
+    results = await lookups(service, "outage", 10)
+    fast = [duration for _, duration in results[3:]]
+    print(f"   circuit: {breaker.stats()}; calls after it opened took at most {max(fast) * 1000:.2f} ms")
+
+    print("\n5. Recovery")
+    FakeGeocoder.mode = "healthy"
+    await asyncio.sleep(BREAKER_RESET_SECONDS)
+    await lookups(service, "recovery", 5)
+    print(f"   circuit: {breaker.stats()}")
+
+    print(f"\n📊 {service.stats()}")
+    await google_maps.close_http_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_harness())
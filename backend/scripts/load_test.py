@@ -0,0 +1,66 @@
+"""
+Simple concurrency load test against a running API worker.
+
+Fires `--requests` GET requests at `--path` with `--concurrency` in flight at
+once and reports throughput and latency percentiles. Run the server with a
+single worker (e.g. `uvicorn app.main:app --workers 1`) to measure
+per-worker concurrency.
+
+Usage:
+    python scripts/load_test.py --url http://localhost:8000 --path "/posts/?limit=20" \
+        --concurrency 50 --requests 2000 [--token <Firebase ID token>]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def run_load_test(url: str, path: str, concurrency: int, total_requests: int, token: str = None):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    latencies = []
+    status_counts = {}
+    remaining = iter(range(total_requests))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, headers=headers, limits=limits, timeout=30.0) as client:
+
+        async def worker():
+            for _ in remaining:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    key = response.status_code
+                except httpx.HTTPError as e:
+                    key = type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                status_counts[key] = status_counts.get(key, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"Requests:     {len(latencies)} in {elapsed:.2f}s ({concurrency} concurrent)")
+    print(f"Throughput:   {len(latencies) / elapsed:.1f} req/s")
+    print(f"Latency (ms): mean {statistics.mean(latencies) * 1000:.1f}, "
+          f"p50 {percentile(0.50):.1f}, p95 {percentile(0.95):.1f}, p99 {percentile(0.99):.1f}")
+    print(f"Statuses:     {status_counts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency load test for the FoodAid API.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/posts/?limit=20")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--token", default=None, help="Firebase ID token for authenticated endpoints.")
+    args = parser.parse_args()
+
+    asyncio.run(run_load_test(args.url, args.path, args.concurrency, args.requests, args.token))
@@ -0,0 +1,118 @@
+"""
+Inspects and replays the push notification outbox (NOTIFICATION_OUTBOX_PATH).
+The outbox is a local SQLite file, so run this on the API host; a running
+API picks up replayed messages on its next poll.
+
+Usage:
+    python scripts/notification_outbox.py stats
+    python scripts/notification_outbox.py list [--status failed] [--user UID] [--limit 50]
+    python scripts/notification_outbox.py replay (--failed | --stuck | ID [ID ...])
+    python scripts/notification_outbox.py purge [--older-than-days 7]
+    python scripts/notification_outbox.py dispatch    # Deliver due messages once, without the API
+"""
+import sys
+import os
+import argparse
+import asyncio
+import datetime
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from app.config import settings, get_async_db, init_firebase
+    from app.services.notification_outbox import (
+        FAILED, SENDING, NotificationDispatcher, NotificationOutbox,
+    )
+    from app.services.push_tokens import PushTokenPruner
+except ImportError as e:
+    print(f"Error importing app modules: {e}")
+    print("Make sure you are running this script from the root 'backend' folder or 'backend/scripts'.")
+    sys.exit(1)
+
+
+def _time(timestamp):
+    if timestamp is None:
+        return "-"
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def show_stats(outbox):
+    counts = outbox.counts()
+    print(f"📬 Outbox at '{settings.NOTIFICATION_OUTBOX_PATH}'")
+    if not counts:
+        print("   Empty.")
+    for status, count in sorted(counts.items()):
+        print(f"   {status:<10} {count:>8,}")
+    oldest = outbox.oldest_pending_seconds()
+    if oldest is not None:
+        print(f"   Oldest undelivered message: {oldest:,.0f}s old")
+
+
+def list_messages(outbox, status, user_id, limit):
+    messages = outbox.list_messages(status=status, user_id=user_id, limit=limit)
+    if not messages:
+        print("No messages found.")
+        return
+    print(f"{'id':>8}  {'status':<10}{'tries':>6}  {'created (UTC)':<20}{'next attempt':<20}user / title / last error")
+    for m in messages:
+        print(f"{m['id']:>8}  {m['status']:<10}{m['attempts']:>6}  {_time(m['created_at']):<20}"
+              f"{_time(m['next_attempt_at']):<20}{m['user_id']} / {m['title']}")
+        if m["last_error"]:
+            print(f"{'':>46}⚠️  {m['last_error']}")
+
+
+async def dispatch(outbox):
+    if not init_firebase():
+        print("❌ Failed to initialize Firebase. Check your .env and Service Account Key.")
+        sys.exit(1)
+    dispatcher = NotificationDispatcher(outbox, get_async_db, PushTokenPruner(get_async_db))
+    total = 0
+    while True:
+        claimed = await dispatcher.dispatch_once()
+        if not claimed:
+            break
+        total += claimed
+    stats = dispatcher.stats()
+    print(f"✨ Processed {total} messages: {stats['sent']} sent, {stats['retried']} to retry, "
+          f"{stats['failed']} failed, {stats['dropped']} dropped.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and replay the push notification outbox.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Messages per status.")
+    list_parser = commands.add_parser("list", help="Most recent messages.")
+    list_parser.add_argument("--status", help="pending, sending, sent, failed, dropped or coalesced.")
+    list_parser.add_argument("--user", help="Only messages to this user ID.")
+    list_parser.add_argument("--limit", type=int, default=50)
+    replay_parser = commands.add_parser("replay", help="Queue messages for immediate delivery again.")
+    replay_parser.add_argument("ids", nargs="*", type=int)
+    replay_parser.add_argument("--failed", action="store_true", help="Replay every message that gave up.")
+    replay_parser.add_argument("--stuck", action="store_true", help="Replay messages claimed by a dispatcher that died.")
+    purge_parser = commands.add_parser("purge", help="Delete sent, coalesced and dropped messages.")
+    purge_parser.add_argument("--older-than-days", type=float, default=7.0)
+    commands.add_parser("dispatch", help="Deliver due messages once, without the API.")
+    args = parser.parse_args()
+
+    outbox = NotificationOutbox(settings.NOTIFICATION_OUTBOX_PATH)
+    if args.command == "stats":
+        show_stats(outbox)
+    elif args.command == "list":
+        list_messages(outbox, args.status, args.user, args.limit)
+    elif args.command == "replay":
+        if not (args.ids or args.failed or args.stuck):
+            replay_parser.error("give message IDs, --failed or --stuck")
+        replayed = 0
+        if args.ids:
+            replayed += outbox.replay(ids=args.ids)
+        if args.failed:
+            replayed += outbox.replay(status=FAILED)
+        if args.stuck:
+            replayed += outbox.replay(status=SENDING)
+        print(f"🔁 Requeued {replayed} messages.")
+    elif args.command == "purge":
+        purged = outbox.purge(args.older_than_days * 86400)
+        print(f"🧹 Deleted {purged} settled messages older than {args.older_than_days:g} days.")
+    elif args.command == "dispatch":
+        asyncio.run(dispatch(outbox))
@@ -0,0 +1,137 @@
+"""
+Fires `--receivers` simultaneous reserves at one Available post and checks
+that exactly one wins, every other receiver gets a clean 409, and exactly
+one reservation record is written. Reports latency percentiles per outcome.
+
+Runs against the Firestore emulator, never a real project: start it with
+`firebase emulators:start --only firestore` (or `gcloud emulators firestore
+start`) and set FIRESTORE_EMULATOR_HOST, e.g. localhost:8080. The reserve
+endpoint is called directly, so no server or ID tokens are needed.
+
+Usage: FIRESTORE_EMULATOR_HOST=localhost:8080 python scripts/reserve_contention_harness.py [--receivers 200] [--rounds 5]
+"""
+import sys
+import os
+import argparse
+import asyncio
+import datetime
+import statistics
+import time
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import HTTPException
+from google.cloud.firestore import AsyncClient
+
+from app.routers.posts import reserve_post
+from app.schemas import UserInDB, UserRole, VerificationStatus
+from app.services.firebase_service import FirebaseService
+from app.services.google_maps import GoogleMapsService
+
+PROJECT_ID = "foodaid-emulator"
+DONOR_ID = "contention_donor"
+
+
+def make_receiver(i):
+    return UserInDB(
+        user_id=f"contention_receiver_{i}",
+        email=f"receiver{i}@example.com",
+        role=UserRole.RECEIVER,
+        name=f"Receiver {i}",
+        address="456 Church St, Pretoria",
+        verification_status=VerificationStatus.APPROVED,
+    )
+
+
+async def seed_post(db, round_no):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    _, post_ref = await db.collection('foodPosts').add({
+        "donor_id": DONOR_ID,
+        "title": f"Contention Test Post {round_no}",
+        "description": "One post, many receivers.",
+        "quantity": "1 Box",
+        "address": "123 Pretorius St, Pretoria",
+        "coordinates": {"lat": -25.7479, "lng": 28.2293},
+        "expiry": now + datetime.timedelta(hours=2),
+        "status": "Available",
+        "created_at": now,
+        "updated_at": now,
+    })
+    return post_ref
+
+
+async def timed_reserve(post_id, receiver, db, fb_service):
+    started = time.perf_counter()
+    try:
+        await reserve_post(post_id, receiver, db, fb_service, waitlist=False)
+        outcome = 200
+    except HTTPException as e:
+        outcome = e.status_code
+    return outcome, time.perf_counter() - started
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return (f"p50 {latencies[len(latencies) // 2] * 1000:.1f}, "
+            f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f}, "
+            f"p99 {p99 * 1000:.1f}, max {latencies[-1] * 1000:.1f}")
+
+
+async def run_round(db, fb_service, receivers, round_no):
+    post_ref = await seed_post(db, round_no)
+    results = await asyncio.gather(*(timed_reserve(post_ref.id, r, db, fb_service) for r in receivers))
+
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    reservations = [doc async for doc in db.collection('reservations').where("post_id", "==", post_ref.id).stream()]
+    post = (await post_ref.get()).to_dict()
+    winners = [r.user_id for r, (outcome, _) in zip(receivers, results) if outcome == 200]
+
+    ok = (outcomes.get(200) == 1 and outcomes.get(409) == len(receivers) - 1
+          and len(reservations) == 1 and post.get("receiver_id") == winners[0]
+          and reservations[0].get("receiver_id") == winners[0])
+    print(f"{'✅' if ok else '❌'} Round {round_no}: outcomes {outcomes}, reservations written {len(reservations)}")
+    return ok, results
+
+
+async def main(n_receivers, rounds):
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        print("❌ FIRESTORE_EMULATOR_HOST is not set. This harness only runs against the Firestore emulator.")
+        sys.exit(1)
+
+    db = AsyncClient(project=PROJECT_ID)
+    await db.collection('users').document(DONOR_ID).set({
+        "email": "donor@example.com", "role": "Donor", "name": "Contention Donor",
+        "address": "123 Pretorius St, Pretoria", "verification_status": "Approved",
+    })
+    fb_service = FirebaseService(db, GoogleMapsService.from_settings())
+    receivers = [make_receiver(i) for i in range(n_receivers)]
+
+    print(f"🚀 {n_receivers} simultaneous reserves per post, {rounds} rounds")
+    all_ok = True
+    won, lost = [], []
+    for round_no in range(1, rounds + 1):
+        ok, results = await run_round(db, fb_service, receivers, round_no)
+        all_ok = all_ok and ok
+        won += [latency for outcome, latency in results if outcome == 200]
+        lost += [latency for outcome, latency in results if outcome == 409]
+
+    print("\nLatency (ms)")
+    if won:
+        print(f"   Winners: mean {statistics.mean(won) * 1000:.1f}, {percentiles(won)}")
+    if lost:
+        print(f"   409s:    mean {statistics.mean(lost) * 1000:.1f}, {percentiles(lost)}")
+    db.close()
+    sys.exit(0 if all_ok else 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent reserve harness for the Firestore emulator.")
+    parser.add_argument("--receivers", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.receivers, args.rounds))
@@ -11,6 +11,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 try:
     from app.config import get_db
     from app.schemas import UserRole, PostStatus, VerificationStatus
+    from app.services import geohash
 except ImportError as e:
     print(f"Error importing app modules: {e}")
     print("Make sure you are running this script from the root 'backend' folder or 'backend/scripts'.")
@@ -82,7 +83,9 @@ def seed_database():
         "expiry": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=2),
         "status": PostStatus.AVAILABLE.value,
         "created_at": datetime.datetime.now(datetime.timezone.utc),
+        "updated_at": datetime.datetime.now(datetime.timezone.utc),
         "coordinates": {"lat": -25.7479, "lng": 28.2293},
+        "geohash": geohash.encode(-25.7479, 28.2293),
         "image_url": "https://placehold.co/600x400/orange/white?text=Bread",
         "donor_details": { # Cache donor details
             "name": donor_data['name'],
@@ -0,0 +1,163 @@
+"""
+Exercises the live post stream fan-out without Firestore: an in-memory
+event source stands in for the snapshot listener, feeding a FeedCache and a
+PostEventBroker the same way the app lifespan wires them. Opens
+`--subscribers` simulated subscribers around Pretoria, publishes
+`--events` post changes at `--rate` per second from a background thread
+(as the Firestore watch thread would) and reports fan-out latency and
+delivery counts. `--rate 0` publishes in a single burst. A share of
+subscribers read slowly to show per-connection backpressure: they get a
+"resync" event instead of holding up everyone else.
+
+Usage: python scripts/stream_harness.py [--subscribers 1000] [--events 200] [--rate 100] [--slow 0.05]
+"""
+import sys
+import os
+import argparse
+import asyncio
+import datetime
+import random
+import statistics
+import threading
+import time
+from types import SimpleNamespace
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.schemas import Coordinates
+from app.services.feed_cache import FeedCache
+from app.services.google_maps import GoogleMapsService
+from app.services.post_events import PostEventBroker
+
+CENTER = (-25.7479, 28.2293)
+
+
+class InMemoryPostSource:
+    """Stand-in for the Firestore query: replays changes to on_snapshot callbacks."""
+
+    def __init__(self):
+        self._callback = None
+
+    def on_snapshot(self, callback):
+        self._callback = callback
+        callback([], [], datetime.datetime.now(datetime.timezone.utc))  # Initial (empty) snapshot
+        return SimpleNamespace(unsubscribe=lambda: None, is_active=True)
+
+    def emit(self, change_type, post_id, data):
+        doc = SimpleNamespace(id=post_id, to_dict=lambda: dict(data))
+        change = SimpleNamespace(type=SimpleNamespace(name=change_type), document=doc)
+        self._callback([], [change], datetime.datetime.now(datetime.timezone.utc))
+
+
+def make_post(rng, i):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return {
+        "donor_id": f"donor_{i % 20}",
+        "title": "Surplus Bread Loaves",
+        "description": "20 loaves of brown bread baked this morning.",
+        "quantity": "20 Loaves",
+        "address": "123 Pretorius St, Pretoria",
+        "expiry": now + datetime.timedelta(days=1),
+        "status": "Available",
+        "created_at": now,
+        "updated_at": now,
+        "coordinates": {"lat": CENTER[0] + rng.uniform(-0.2, 0.2), "lng": CENTER[1] + rng.uniform(-0.2, 0.2)},
+    }
+
+
+async def consume(subscription, latencies, counts, slow):
+    while True:
+        event = await subscription.next_event(timeout=2.0)
+        if event is None or event["type"] == "closed":
+            return
+        counts[event["type"]] = counts.get(event["type"], 0) + 1
+        if latencies is not None and event["type"] in ("new", "updated"):
+            # updated_at is stamped just before the change is emitted
+            latencies.append((datetime.datetime.now(datetime.timezone.utc) - event["post"]["updated_at"]).total_seconds())
+        if slow:
+            await asyncio.sleep(0.05)
+
+
+def publish_events(source, n_events, rate, rng):
+    # Runs on its own thread, like the Firestore watch thread
+    live = []
+    for i in range(n_events):
+        if rate:
+            time.sleep(1.0 / rate)
+        roll = rng.random()
+        if live and roll < 0.2:
+            post_id, data = live.pop(rng.randrange(len(live)))
+            data = dict(data, status="Reserved")
+            source.emit("REMOVED", post_id, data)
+        elif live and roll < 0.3:
+            post_id, data = rng.choice(live)
+            data.update(quantity="10 Loaves", updated_at=datetime.datetime.now(datetime.timezone.utc))
+            source.emit("MODIFIED", post_id, data)
+        else:
+            post_id, data = f"post_{i}", make_post(rng, i)
+            data["updated_at"] = datetime.datetime.now(datetime.timezone.utc)
+            live.append((post_id, data))
+            source.emit("ADDED", post_id, data)
+
+
+async def run_harness(n_subscribers, n_events, rate, slow_share):
+    rng = random.Random(7)
+    source = InMemoryPostSource()
+    cache = FeedCache()
+    broker = PostEventBroker(GoogleMapsService.from_settings())
+    broker.start(asyncio.get_running_loop())
+    cache.add_change_listener(broker.on_feed_change)
+    cache.start(source)
+
+    latencies = []
+    fast_counts, slow_counts = {}, {}
+    tasks = []
+    subscriptions = []
+    for i in range(n_subscribers):
+        coords = Coordinates(lat=CENTER[0] + rng.uniform(-0.2, 0.2), lng=CENTER[1] + rng.uniform(-0.2, 0.2))
+        subscription = broker.subscribe(coords, radius_km=rng.choice([5.0, 10.0, 25.0]))
+        slow = rng.random() < slow_share
+        subscriptions.append(subscription)
+        if slow:
+            tasks.append(asyncio.create_task(consume(subscription, None, slow_counts, slow)))
+        else:
+            tasks.append(asyncio.create_task(consume(subscription, latencies, fast_counts, slow)))
+    print(f"📡 {n_subscribers} subscribers connected.")
+
+    started = time.perf_counter()
+    publisher = threading.Thread(target=publish_events, args=(source, n_events, rate, rng))
+    publisher.start()
+    while publisher.is_alive():
+        await asyncio.sleep(0.01)
+    publish_elapsed = time.perf_counter() - started
+
+    # Let queued events drain, then close the streams
+    await asyncio.sleep(0.5)
+    broker.stop()
+    await asyncio.gather(*tasks)
+    for subscription in subscriptions:
+        broker.unsubscribe(subscription)
+    cache.stop()
+
+    latencies.sort()
+    stats = broker.stats()
+    print(f"✅ Published {n_events} changes in {publish_elapsed * 1000:.1f} ms")
+    print(f"   Broker: {stats}")
+    print(f"   Fast subscribers received: {fast_counts}")
+    print(f"   Slow subscribers received: {slow_counts}")
+    if latencies:
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"   Fan-out latency, fast subscribers (ms): mean {statistics.mean(latencies) * 1000:.2f}, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:.2f}, p99 {p99 * 1000:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fan-out harness for the live post stream.")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=100.0, help="Changes per second (0 for one burst).")
+    parser.add_argument("--slow", type=float, default=0.05, help="Share of subscribers that read slowly.")
+    args = parser.parse_args()
+
+    asyncio.run(run_harness(args.subscribers, args.events, args.rate, args.slow))
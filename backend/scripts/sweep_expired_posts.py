@@ -0,0 +1,52 @@
+"""
+Marks 'Available' posts whose expiry has passed as 'Expired' and releases
+reservations whose hold has run out, using the same sweeper the API runs in
+the background. Useful from cron when the API runs
+with EXPIRY_SWEEP_INTERVAL_SECONDS=0, or to clear a large backlog at once.
+
+Usage: python scripts/sweep_expired_posts.py [--max-pages 1000] [--loop 60]
+"""
+import sys
+import os
+import argparse
+import asyncio
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from app.config import get_async_db, settings
+    from app.services.expiry_sweeper import ExpirySweeper
+    from app.services.notification_outbox import NotificationOutbox
+except ImportError as e:
+    print(f"Error importing app modules: {e}")
+    print("Make sure you are running this script from the root 'backend' folder or 'backend/scripts'.")
+    sys.exit(1)
+
+
+async def sweep(max_pages: int, loop_seconds: float):
+    # Receivers promoted off a waitlist are queued here for the API's dispatcher
+    sweeper = ExpirySweeper(get_async_db, NotificationOutbox(settings.NOTIFICATION_OUTBOX_PATH))
+    while True:
+        print("🧹 Sweeping expired posts on 'foodPosts'...")
+        swept = await sweeper.sweep_once(max_pages=max_pages)
+        stats = sweeper.stats()
+        if stats["error"]:
+            print(f"❌ Sweep failed: {stats['error']}")
+        else:
+            print(f"✨ Marked {swept} posts as expired in {stats['last_run_seconds']:.2f}s "
+                  f"(oldest was {stats['last_lag_seconds']:.0f}s overdue).")
+            print(f"   Released {stats['last_run_released']} uncollected reservations.")
+
+        if not loop_seconds:
+            return
+        await asyncio.sleep(loop_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mark expired food posts as 'Expired'.")
+    parser.add_argument("--max-pages", type=int, default=1000, help="Pages of 500 posts to sweep per run.")
+    parser.add_argument("--loop", type=float, default=0, help="Repeat every N seconds instead of running once.")
+    args = parser.parse_args()
+
+    asyncio.run(sweep(args.max_pages, args.loop))
@@ -0,0 +1,142 @@
+"""
+Simulates a high-demand post with the waitlist: `--receivers` receivers
+arrive within `--spread` ms of each other and all call reserve with
+waitlist=true. Checks that exactly one wins, everyone else is queued (no
+409s for clients to retry on) with positions matching their arrival order,
+and that cancellations and an expired hold promote receivers strictly in
+that order, each in a single commit.
+
+Runs against the Firestore emulator, never a real project (see
+scripts/reserve_contention_harness.py for setup). The endpoints are called
+directly, so no server or ID tokens are needed.
+
+Usage: FIRESTORE_EMULATOR_HOST=localhost:8080 python scripts/waitlist_simulation.py [--receivers 300] [--promotions 20]
+"""
+import sys
+import os
+import argparse
+import asyncio
+import datetime
+import random
+import statistics
+import time
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import HTTPException
+from google.cloud.firestore import AsyncClient
+
+from app.config import settings
+from app.routers.posts import reserve_post
+from app.routers.reservations import cancel_reservation
+from app.services.expiry_sweeper import ExpirySweeper
+from app.services.firebase_service import FirebaseService
+from app.services.google_maps import GoogleMapsService
+from app.services.notification_outbox import NotificationOutbox
+from reserve_contention_harness import PROJECT_ID, DONOR_ID, make_receiver, seed_post, percentiles
+
+
+async def arrive(post_id, receiver, delay, db, fb_service):
+    await asyncio.sleep(delay)
+    started = time.perf_counter()
+    try:
+        response = await reserve_post(post_id, receiver, db, fb_service, waitlist=True)
+        outcome = getattr(response, "status_code", 200)
+    except HTTPException as e:
+        outcome = e.status_code
+    return receiver, outcome, started, time.perf_counter() - started
+
+
+async def holder_of(db, post_ref):
+    post = (await post_ref.get()).to_dict()
+    return post.get("receiver_id"), post.get("reservation_id")
+
+
+async def simulate(db, n_receivers, promotions, spread_ms, rng):
+    settings.WAITLIST_MAX_SIZE = max(settings.WAITLIST_MAX_SIZE, n_receivers)
+    fb_service = FirebaseService(db, GoogleMapsService.from_settings())
+    outbox = NotificationOutbox(None)  # In memory: promotions are queued but not sent
+    receivers = {r.user_id: r for r in (make_receiver(i) for i in range(n_receivers))}
+    post_ref = await seed_post(db, "waitlist")
+
+    print(f"🚀 {n_receivers} receivers arriving within {spread_ms} ms, waitlist=true")
+    delays = {uid: rng.uniform(0, spread_ms / 1000) for uid in receivers}
+    results = await asyncio.gather(*(
+        arrive(post_ref.id, receiver, delays[uid], db, fb_service) for uid, receiver in receivers.items()
+    ))
+
+    outcomes = {}
+    for _, outcome, _, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    queued = [doc async for doc in db.collection('foodPosts').document(post_ref.id)
+              .collection('waitlist').order_by("joined_at").stream()]
+    ok = outcomes.get(200) == 1 and outcomes.get(202) == n_receivers - 1 and len(queued) == n_receivers - 1
+    print(f"{'✅' if ok else '❌'} Outcomes {outcomes}, {len(queued)} receivers queued")
+
+    # The queue must follow the order requests were issued in, however long
+    # each one then spent losing the race and retrying
+    issued_at = {receiver.user_id: started for receiver, _, started, _ in results}
+    expected = [doc.id for doc in queued]
+    by_arrival = sorted(expected, key=lambda uid: issued_at[uid])
+    inversions = sum(1 for a, b in zip(by_arrival, expected) if a != b)
+    print(f"   Queue positions differing from arrival order: {inversions}")
+
+    # Cancel the holder repeatedly: each cancel must hand the post to the head of the line
+    mismatches = 0
+    cancel_latencies = []
+    for i in range(min(promotions, len(expected))):
+        holder, reservation_id = await holder_of(db, post_ref)
+        started = time.perf_counter()
+        await cancel_reservation(reservation_id, receivers[holder], db, outbox)
+        cancel_latencies.append(time.perf_counter() - started)
+        new_holder, _ = await holder_of(db, post_ref)
+        mismatches += new_holder != expected[i]
+    print(f"{'✅' if not mismatches else '❌'} {len(cancel_latencies)} cancellations promoted the next in line "
+          f"({mismatches} out of order)")
+
+    # An expired hold promotes the next receiver the same way
+    promoted_by_sweep = None
+    if settings.RESERVATION_HOLD_SECONDS > 0 and len(expected) > len(cancel_latencies):
+        later = datetime.timedelta(seconds=settings.RESERVATION_HOLD_SECONDS + 60)
+        sweeper = ExpirySweeper(lambda: db, outbox, clock=lambda: datetime.datetime.now(datetime.timezone.utc) + later)
+        # Keep the post itself from expiring during the simulated wait
+        await post_ref.update({"expiry": datetime.datetime.now(datetime.timezone.utc) + later * 2})
+        await sweeper.sweep_once()
+        promoted_by_sweep, _ = await holder_of(db, post_ref)
+        sweep_ok = promoted_by_sweep == expected[len(cancel_latencies)]
+        mismatches += not sweep_ok
+        print(f"{'✅' if sweep_ok else '❌'} Expired hold promoted {promoted_by_sweep}")
+
+    joins = [latency for _, outcome, _, latency in results if outcome == 202]
+    print("\nLatency (ms)")
+    if joins:
+        print(f"   Waitlist joins: mean {statistics.mean(joins) * 1000:.1f}, {percentiles(joins)}")
+    if cancel_latencies:
+        print(f"   Cancel + promote: mean {statistics.mean(cancel_latencies) * 1000:.1f}, {percentiles(cancel_latencies)}")
+    return ok and not inversions and not mismatches
+
+
+async def main(n_receivers, promotions, spread_ms):
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        print("❌ FIRESTORE_EMULATOR_HOST is not set. This simulation only runs against the Firestore emulator.")
+        sys.exit(1)
+
+    db = AsyncClient(project=PROJECT_ID)
+    await db.collection('users').document(DONOR_ID).set({
+        "email": "donor@example.com", "role": "Donor", "name": "Contention Donor",
+        "address": "123 Pretorius St, Pretoria", "verification_status": "Approved",
+    })
+    ok = await simulate(db, n_receivers, promotions, spread_ms, random.Random(21))
+    db.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Waitlist simulation for the Firestore emulator.")
+    parser.add_argument("--receivers", type=int, default=300)
+    parser.add_argument("--promotions", type=int, default=20, help="Cancellations to replay.")
+    parser.add_argument("--spread", type=float, default=200.0, help="Window receivers arrive in (ms).")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.receivers, args.promotions, args.spread))
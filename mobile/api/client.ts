@@ -29,4 +29,43 @@ client.interceptors.request.use(async (config) => {
   return Promise.reject(error);
 });
 
+/**
+ * A fresh key for one logical create/reserve action. Reuse the same key when
+ * retrying that action so the server returns the original result instead of
+ * doing it twice.
+ */
+export const newIdempotencyKey = (): string =>
+  `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+
+// Lost responses, server errors and "still processing this key" (409 with Retry-After)
+const isRetryable = (error: unknown): boolean => {
+  if (!axios.isAxiosError(error)) return false;
+  const response = error.response;
+  if (!response) return true;
+  return response.status >= 500 || (response.status === 409 && response.headers['retry-after'] !== undefined);
+};
+
+/**
+ * Runs one user action (a form submit, a tap on reserve) under a single
+ * Idempotency-Key, created here once and passed to every attempt, so a
+ * retry after a lost response gets the original result instead of a
+ * duplicate post or a 409. Create it when the user acts, not per request.
+ *
+ * Example: withIdempotencyKey((key) => createNewPost(postData, key))
+ */
+export const withIdempotencyKey = async <T>(
+  action: (idempotencyKey: string) => Promise<T>,
+  retries: number = 2
+): Promise<T> => {
+  const idempotencyKey = newIdempotencyKey();
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await action(idempotencyKey);
+    } catch (error) {
+      if (attempt >= retries || !isRetryable(error)) throw error;
+      await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** attempt));
+    }
+  }
+};
+
 export default client;
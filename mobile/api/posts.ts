@@ -1,31 +1,141 @@
 
 import client from './client';
-import { FoodPostResponse, FoodPostCreate } from '@/types/api';
+import { FoodPostResponse, FoodPostCreate, FoodPostDelta, WaitlistEntry } from '@/types/api';
+
+// Last full feed and the validators needed to refresh it cheaply
+let feedCache: { posts: FoodPostResponse[]; etag?: string; serverTime?: string } | null = null;
+
+// The server's feed order: newest first by created_at, then by post ID (both descending)
+const compareFeedOrder = (a: FoodPostResponse, b: FoodPostResponse): number => {
+  const byTime = Date.parse(b.created_at) - Date.parse(a.created_at);
+  if (byTime !== 0) return byTime;
+  // Same millisecond: ISO strings of one format still order the sub-millisecond part
+  if (a.created_at !== b.created_at) return a.created_at < b.created_at ? 1 : -1;
+  return a.post_id < b.post_id ? 1 : a.post_id > b.post_id ? -1 : 0;
+};
 
 /**
  * Fetches all "Available" food posts.
+ * Sends If-None-Match so an unchanged feed comes back as an empty 304.
  * Corresponds to: GET /api/v1/posts/
  */
 export const getAvailablePosts = async (): Promise<FoodPostResponse[]> => {
-  const { data } = await client.get<FoodPostResponse[]>('/api/v1/posts/');
-  return data;
+  const headers = feedCache?.etag ? { 'If-None-Match': feedCache.etag } : undefined;
+  const response = await client.get<FoodPostResponse[]>('/api/v1/posts/', {
+    headers,
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+  if (response.status === 304 && feedCache) {
+    return feedCache.posts;
+  }
+  feedCache = {
+    posts: response.data,
+    etag: response.headers['etag'],
+    serverTime: response.headers['x-server-time'],
+  };
+  return response.data;
+};
+
+/**
+ * Refreshes the feed by fetching only posts that changed since the last sync,
+ * merging them into the cached list and dropping removed ones. The merged
+ * list is re-sorted into the server's order, so changed posts do not keep
+ * stale positions and new ones are not just appended.
+ * Falls back to a full fetch when there is nothing to sync from.
+ * Corresponds to: GET /api/v1/posts/?since={server_time}
+ */
+export const refreshAvailablePosts = async (): Promise<FoodPostResponse[]> => {
+  if (!feedCache?.serverTime) {
+    return getAvailablePosts();
+  }
+  const { data } = await client.get<FoodPostDelta>('/api/v1/posts/', {
+    params: { since: feedCache.serverTime },
+  });
+
+  const byId = new Map(feedCache.posts.map((post) => [post.post_id, post]));
+  data.removed.forEach((tombstone) => byId.delete(tombstone.post_id));
+  data.posts.forEach((post) => byId.set(post.post_id, post));
+
+  // The merged list no longer matches the ETag of the last full response
+  feedCache = { posts: Array.from(byId.values()).sort(compareFeedOrder), serverTime: data.server_time };
+  return feedCache.posts;
 };
 
 /**
  * Creates a new food post.
+ * idempotencyKey identifies the submit, not the request: pass the same key
+ * to every retry (see withIdempotencyKey) so the post is only created once.
  * Corresponds to: POST /api/v1/posts/
  */
-export const createNewPost = async (postData: FoodPostCreate): Promise<FoodPostResponse> => {
-  const { data } = await client.post<FoodPostResponse>('/api/v1/posts/', postData);
+export const createNewPost = async (
+  postData: FoodPostCreate,
+  idempotencyKey: string
+): Promise<FoodPostResponse> => {
+  const { data } = await client.post<FoodPostResponse>('/api/v1/posts/', postData, {
+    headers: { 'Idempotency-Key': idempotencyKey },
+  });
   return data;
 };
 
 /**
  * Reserves a food post.
+ * Pass the same idempotencyKey to every retry of one tap (see withIdempotencyKey)
+ * so a lost response is not reported as a 409.
  * Corresponds to: PUT /api/v1/posts/{post_id}/reserve
  */
-export const reservePost = async (postId: string): Promise<FoodPostResponse> => {
-  const { data } = await client.put<FoodPostResponse>(`/api/v1/posts/${postId}/reserve`);
+export const reservePost = async (
+  postId: string,
+  idempotencyKey: string
+): Promise<FoodPostResponse> => {
+  const { data } = await client.put<FoodPostResponse>(`/api/v1/posts/${postId}/reserve`, undefined, {
+    headers: { 'Idempotency-Key': idempotencyKey },
+  });
+  return data;
+};
+
+/**
+ * Reserves a food post, or joins its waitlist if it is already reserved.
+ * Returns the post if reserved, or the caller's place in line (HTTP 202).
+ * Pass the same idempotencyKey to every retry of one tap (see withIdempotencyKey).
+ * Corresponds to: PUT /api/v1/posts/{post_id}/reserve?waitlist=true
+ */
+export const reserveOrJoinWaitlist = async (
+  postId: string,
+  idempotencyKey: string
+): Promise<FoodPostResponse | WaitlistEntry> => {
+  const { data } = await client.put<FoodPostResponse | WaitlistEntry>(
+    `/api/v1/posts/${postId}/reserve`, undefined,
+    { params: { waitlist: true }, headers: { 'Idempotency-Key': idempotencyKey } }
+  );
+  return data;
+};
+
+/**
+ * The caller's place in line for a post.
+ * Fails with 409 if the post is available again (reserve it now), and 404 if
+ * the caller is not waiting or the post was collected, expired or deleted.
+ * Corresponds to: GET /api/v1/posts/{post_id}/waitlist
+ */
+export const getWaitlistPosition = async (postId: string): Promise<WaitlistEntry> => {
+  const { data } = await client.get<WaitlistEntry>(`/api/v1/posts/${postId}/waitlist`);
+  return data;
+};
+
+/**
+ * Leaves a post's waitlist.
+ * Corresponds to: DELETE /api/v1/posts/{post_id}/waitlist
+ */
+export const leaveWaitlist = async (postId: string): Promise<void> => {
+  await client.delete(`/api/v1/posts/${postId}/waitlist`);
+};
+
+/**
+ * Corrects the address of a post that could not be geocoded.
+ * The post goes back to "Geocoding" while the new address is resolved.
+ * Corresponds to: PUT /api/v1/posts/{post_id}/address
+ */
+export const updatePostAddress = async (postId: string, address: string): Promise<FoodPostResponse> => {
+  const { data } = await client.put<FoodPostResponse>(`/api/v1/posts/${postId}/address`, { address });
   return data;
 };
 
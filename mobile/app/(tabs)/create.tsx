@@ -4,7 +4,7 @@ import { View, Text, Button } from 'react-native';
 
 export default function CreatePostScreen() {
   const handleCreate = () => {
-    // TODO: Implement form logic and call createNewPost()
+    // TODO: Implement form logic and call withIdempotencyKey((key) => createNewPost(postData, key))
   };
 
   return (
@@ -9,6 +9,8 @@ export enum PostStatus {
   RESERVED = "Reserved",
   COLLECTED = "Collected",
   EXPIRED = "Expired",
+  GEOCODING = "Geocoding",          // Address is being resolved
+  GEOCODE_FAILED = "GeocodeFailed", // Address not found; the donor must correct it
 }
 
 export interface FoodPostResponse {
@@ -25,6 +27,31 @@ export interface FoodPostResponse {
   // These fields are optional and added upon reservation
   receiver_id?: string;
   reserved_at?: string;
+  reservation_id?: string; // Pass to PUT /reservations/{id}/cancel
+  updated_at?: string;
+  geocode_error?: string; // Set when status is GEOCODE_FAILED
+}
+
+// Returned with 202 by PUT /posts/{post_id}/reserve?waitlist=true when the post is already reserved
+export interface WaitlistEntry {
+  post_id: string;
+  receiver_id: string;
+  joined_at: string;
+  position: number; // 1 is promoted next
+}
+
+// A post that left the feed since the client's last sync
+export interface PostTombstone {
+  post_id: string;
+  status: PostStatus;
+  updated_at?: string;
+}
+
+// Response of GET /posts/?since=... (delta sync)
+export interface FoodPostDelta {
+  posts: FoodPostResponse[];
+  removed: PostTombstone[];
+  server_time: string;
 }
 
 export interface FoodPostCreate {